@@ -0,0 +1,65 @@
+"""Production serving profile: gunicorn with threaded WSGI workers.
+
+    gunicorn -c gunicorn.conf.py
+
+Every setting can be overridden from the environment. ``GUNICORN_ASGI=1``
+serves ``strikeforce.asgi`` through uvicorn workers instead. It is opt-in:
+the views are sync, so under ASGI each request pays a hop to a worker thread,
+and streamed exports are collected in memory before the first byte is sent.
+Compare the two with ``python manage.py loadtest_catalog`` before switching.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "strikeforce.settings")
+# Workers write their metrics here and /metrics sums them; it must be set
+# before prometheus_client is imported.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "strikeforce-metrics"))
+
+ASGI = os.environ.get("GUNICORN_ASGI", "0") == "1"
+if ASGI:
+    # Django's persistent connections are per thread, and ASGI requests run
+    # their sync code in a new thread each, so kept-alive connections would
+    # pile up.
+    os.environ.setdefault("DB_CONN_MAX_AGE", "0")
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def on_starting(server) -> None:
+    # Files left by a previous run would be summed into the new one.
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+wsgi_app = "strikeforce.asgi:application" if ASGI else "strikeforce.wsgi:application"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+if ASGI:
+    # Each uvicorn worker multiplexes its requests on an event loop; more
+    # processes per core only add switching.
+    worker_class = "uvicorn_worker.UvicornWorker"
+    workers = int(os.environ.get("WEB_CONCURRENCY", _cpu_count()))
+else:
+    # Threads overlap the time requests spend waiting on the database, S3 and SMTP.
+    worker_class = "gthread"
+    workers = int(os.environ.get("WEB_CONCURRENCY", 2 * _cpu_count() + 1))
+    threads = int(os.environ.get("GUNICORN_THREADS", 4))
+backlog = int(os.environ.get("GUNICORN_BACKLOG", 2048))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# Recycle workers now and then so slow leaks cannot grow without bound.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 500))
+# Import Django once in the master; workers fork with the app already loaded.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+accesslog = os.environ.get("GUNICORN_ACCESSLOG", "-") or None
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
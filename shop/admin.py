@@ -6,10 +6,16 @@ from .models import (
     Category,
     CustomOrder,
     CustomOrderLine,
+    CustomOrderStatus,
+    QuotePdfJob,
     StandardOrder,
     StandardOrderItem,
+    StandardOrderStatus,
+    StockReservation,
+    transition_standard_orders,
 )
-from .services import generate_custom_order_quote_pdf
+from .exports import CUSTOM_ORDERS, STANDARD_ORDER_ITEMS, export_response
+from .services import generate_custom_order_quote_pdfs
 
 
 @admin.register(Category)
@@ -37,38 +43,40 @@ class StandardOrderAdmin(admin.ModelAdmin):
     list_filter = ("status", "customer__city", "created_at")
     search_fields = ("customer__name", "customer__phone")
     inlines = [StandardOrderItemInline]
-    actions = ["action_confirm", "action_ready", "action_complete"]
+    actions = ["action_confirm", "action_ready", "action_complete", "action_export_csv", "action_export_xlsx"]
 
     def action_confirm(self, request, queryset):
-        for order in queryset:
-            try:
-                order.confirm()
-            except Exception as exc:  # pylint: disable=broad-except
-                self.message_user(request, f"تعذر تأكيد الطلب {order.pk}: {exc}", level=messages.ERROR)
-        self.message_user(request, _("تم تحديث الحالات"), level=messages.SUCCESS)
+        self._transition(request, queryset, StandardOrderStatus.CONFIRMED)
 
     action_confirm.short_description = "تأكيد الطلبات"  # type: ignore[attr-defined]
 
     def action_ready(self, request, queryset):
-        for order in queryset:
-            try:
-                order.mark_ready()
-            except Exception as exc:  # pylint: disable=broad-except
-                self.message_user(request, f"تعذر تحديث الطلب {order.pk}: {exc}", level=messages.ERROR)
-        self.message_user(request, _("تم تحديث الحالات"), level=messages.SUCCESS)
+        self._transition(request, queryset, StandardOrderStatus.READY)
 
     action_ready.short_description = "جاهز للاستلام"  # type: ignore[attr-defined]
 
     def action_complete(self, request, queryset):
-        for order in queryset:
-            try:
-                order.complete()
-            except Exception as exc:  # pylint: disable=broad-except
-                self.message_user(request, f"تعذر إكمال الطلب {order.pk}: {exc}", level=messages.ERROR)
-        self.message_user(request, _("تم تحديث الحالات"), level=messages.SUCCESS)
+        self._transition(request, queryset, StandardOrderStatus.COMPLETED)
 
     action_complete.short_description = "تم التسليم"  # type: ignore[attr-defined]
 
+    def _transition(self, request, queryset, to_status: str) -> None:
+        results = transition_standard_orders(queryset.values_list("pk", flat=True), to_status)
+        for pk, error in results.items():
+            if error:
+                self.message_user(request, f"تعذر تحديث الطلب {pk}: {error}", level=messages.ERROR)
+        self.message_user(request, _("تم تحديث الحالات"), level=messages.SUCCESS)
+
+    def action_export_csv(self, request, queryset):
+        return export_response(STANDARD_ORDER_ITEMS, queryset, "csv")
+
+    action_export_csv.short_description = "تصدير CSV"  # type: ignore[attr-defined]
+
+    def action_export_xlsx(self, request, queryset):
+        return export_response(STANDARD_ORDER_ITEMS, queryset, "xlsx")
+
+    action_export_xlsx.short_description = "تصدير Excel"  # type: ignore[attr-defined]
+
 
 class CustomOrderLineInline(admin.TabularInline):
     model = CustomOrderLine
@@ -81,16 +89,25 @@ class CustomOrderAdmin(admin.ModelAdmin):
     list_filter = ("status", "customer__city", "created_at")
     search_fields = ("customer__name", "customer__phone")
     inlines = [CustomOrderLineInline]
-    actions = ["action_generate_pdf", "action_approve", "action_schedule_install"]
+    actions = [
+        "action_generate_pdf",
+        "action_approve",
+        "action_schedule_install",
+        "action_export_csv",
+        "action_export_xlsx",
+    ]
 
     def action_generate_pdf(self, request, queryset):
-        for order in queryset:
-            try:
-                order.require_lines_for_quote()
-                generate_custom_order_quote_pdf(order)
-            except Exception as exc:  # pylint: disable=broad-except
-                self.message_user(request, f"تعذر توليد العرض للطلب {order.pk}: {exc}", level=messages.ERROR)
-        self.message_user(request, _("تم توليد ملفات PDF"), level=messages.SUCCESS)
+        results = generate_custom_order_quote_pdfs(queryset)
+        failures = [result for result in results if result.error]
+        generated = len(results) - len(failures)
+        cached = sum(1 for result in results if result.cached)
+        message = f"تم توليد ملفات PDF لـ {generated} طلب (منها {cached} دون إعادة توليد)"
+        if failures:
+            details = "؛ ".join(f"الطلب {result.order_id}: {result.error}" for result in failures)
+            self.message_user(request, f"{message}. تعذر توليد {len(failures)}: {details}", level=messages.WARNING)
+            return
+        self.message_user(request, message, level=messages.SUCCESS)
 
     action_generate_pdf.short_description = "توليد PDF العرض"  # type: ignore[attr-defined]
 
@@ -113,3 +130,28 @@ class CustomOrderAdmin(admin.ModelAdmin):
         self.message_user(request, _("تم تحديث الحالات"), level=messages.SUCCESS)
 
     action_schedule_install.short_description = "جدولة التركيب"  # type: ignore[attr-defined]
+
+    def action_export_csv(self, request, queryset):
+        return export_response(CUSTOM_ORDERS, queryset, "csv")
+
+    action_export_csv.short_description = "تصدير CSV"  # type: ignore[attr-defined]
+
+    def action_export_xlsx(self, request, queryset):
+        return export_response(CUSTOM_ORDERS, queryset, "xlsx")
+
+    action_export_xlsx.short_description = "تصدير Excel"  # type: ignore[attr-defined]
+
+
+@admin.register(QuotePdfJob)
+class QuotePdfJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "custom_order", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status", "created_at")
+    readonly_fields = ("quote_pdf_url", "error", "attempts", "started_at", "finished_at")
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("id", "order", "product", "qty", "expires_at", "released_at")
+    list_filter = ("released_at", "expires_at")
+    search_fields = ("product__sku", "order__id")
+    readonly_fields = ("order", "product", "qty", "expires_at", "released_at")
@@ -5,3 +5,8 @@ class ShopConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shop"
     verbose_name = "Strike Force Shop"
+
+    def ready(self) -> None:
+        from . import metrics, signals  # noqa: F401
+
+        metrics.install()
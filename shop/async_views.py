@@ -0,0 +1,103 @@
+"""Async cache hits for the anonymous catalog reads.
+
+Under ASGI every sync view costs a hop to a worker thread. With
+``ASYNC_CATALOG_READS`` on, anonymous JSON ``GET`` requests for the product,
+category and brand lists and details are first looked up in the catalog cache
+with the async cache API. A hit, or a 304 for it, is answered without running
+the view. The lookup goes through the router's viewset itself: its content
+negotiation, ``CatalogCacheMixin`` key and entries, and ``finalize_response``
+headers.
+
+Everything else (misses, writes, authenticated requests, other renderers) is
+handed to the router's view, which computes the response and fills the cache
+for the next request.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import URLPattern, re_path
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .cache import aget_catalog_version, cached_entry_response, catalog_cache, catalog_cache_counters, catalog_response_key
+
+
+class AsyncCatalogReadView(View):
+    # The router's view for the same URL.
+    fallback = None
+
+    async def get(self, request, *args, **kwargs):
+        response = None
+        # JWT is the only authentication, so requests without the header are anonymous.
+        if "HTTP_AUTHORIZATION" not in request.META:
+            response = await self.cached_response(request, args, kwargs)
+        if response is None:
+            response = await self.forward(request, *args, **kwargs)
+        return response
+
+    async def forward(self, request, *args, **kwargs):
+        return await sync_to_async(self.fallback)(request, *args, **kwargs)
+
+    head = post = put = patch = delete = options = forward
+
+    async def cached_response(self, request, args: Tuple, kwargs: Dict) -> Optional[HttpResponse]:
+        viewset = self._viewset(request, args, kwargs)
+        drf_request = viewset.request
+        try:
+            drf_request.accepted_renderer, drf_request.accepted_media_type = viewset.perform_content_negotiation(
+                drf_request
+            )
+        except APIException:
+            return None
+        if not viewset._is_cacheable(drf_request):
+            return None
+        key = catalog_response_key(
+            await aget_catalog_version(), viewset.basename, viewset.action, drf_request, viewset.kwargs
+        )
+        entry = await catalog_cache().aget(key)
+        if entry is None:
+            # The viewset counts the miss and stores the entry.
+            return None
+        catalog_cache_counters.record(hit=True)
+        response = viewset.finalize_response(drf_request, cached_entry_response(drf_request, entry), *args, **kwargs)
+        if not isinstance(response, Response):
+            return response
+        # Django renders a returned DRF response through sync_to_async; render it here instead.
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    def _viewset(self, request, args: Tuple, kwargs: Dict):
+        """The viewset instance the router's view would dispatch to, ready for a handler."""
+        viewset = self.fallback.cls(**self.fallback.initkwargs)
+        viewset.action_map = self.fallback.actions
+        for method, action in self.fallback.actions.items():
+            setattr(viewset, method, getattr(viewset, action))
+        viewset.args = args
+        viewset.kwargs = kwargs
+        viewset.format_kwarg = None
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.headers = viewset.default_response_headers
+        return viewset
+
+
+CATALOG_READ_ROUTES = (("products", "product"), ("categories", "category"), ("brands", "brand"))
+
+
+def catalog_read_urls(router) -> List[URLPattern]:
+    """URL patterns to place before ``router.urls``; each falls back to the router's view."""
+    router_views = {pattern.name: pattern.callback for pattern in router.urls}
+    patterns = []
+    for prefix, basename in CATALOG_READ_ROUTES:
+        for suffix, regex in (("list", ""), ("detail", r"(?P<pk>[0-9]+)/")):
+            name = f"{basename}-{suffix}"
+            view = csrf_exempt(AsyncCatalogReadView.as_view(fallback=router_views[name]))
+            patterns.append(re_path(rf"^{prefix}/{regex}$", view, name=name))
+    return patterns
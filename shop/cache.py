@@ -0,0 +1,175 @@
+"""Response cache for the anonymous catalog endpoints.
+
+Keys embed a catalog version number. Saving or deleting a Product, Category
+or Brand bumps the version once the transaction commits (see
+``shop.signals``), so stale entries are never read again and simply expire.
+Bumping only after commit matters: a reader that picked up the new version
+before the write was visible would store old data under it. For the same
+reason, misses are computed on the primary, never on a lagging read replica.
+
+The version is seeded from the clock in microseconds. Should the key be culled
+or evicted, the next seed is still larger than any version handed out before,
+so old entries never become current again.
+
+Stock moves from order confirmations and cancellations do not bump the
+version, so the stock shown in cached responses may lag by up to
+``CATALOG_CACHE_TIMEOUT``; stock is checked when an order reserves or deducts
+it.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .db_routers import primary_reads
+
+CATALOG_VERSION_KEY = "catalog:version"
+
+
+def catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def _seed_version() -> int:
+    return time.time_ns() // 1000
+
+
+def get_catalog_version() -> int:
+    cache = catalog_cache()
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        seed = _seed_version()
+        cache.add(CATALOG_VERSION_KEY, seed, None)
+        version = cache.get(CATALOG_VERSION_KEY, seed)
+    return version
+
+
+async def aget_catalog_version() -> int:
+    cache = catalog_cache()
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        seed = _seed_version()
+        await cache.aadd(CATALOG_VERSION_KEY, seed, None)
+        version = await cache.aget(CATALOG_VERSION_KEY, seed)
+    return version
+
+
+def bump_catalog_version() -> None:
+    """Invalidate every catalog entry now; inside a transaction use :func:`bump_catalog_version_on_commit`."""
+    cache = catalog_cache()
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.add(CATALOG_VERSION_KEY, _seed_version(), None)
+    else:
+        # The generic incr() re-sets the key with the default timeout.
+        cache.touch(CATALOG_VERSION_KEY, None)
+
+
+def bump_catalog_version_on_commit(using=None) -> None:
+    transaction.on_commit(bump_catalog_version, using=using)
+
+
+class CacheCounters:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+catalog_cache_counters = CacheCounters()
+
+
+def catalog_cache_stats() -> Dict[str, int]:
+    return {**catalog_cache_counters.stats(), "version": get_catalog_version()}
+
+
+def catalog_response_key(version: int, basename: str, action: str, request, kwargs: Dict) -> str:
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    raw = repr((request.scheme, request.get_host(), sorted(kwargs.items()), params))
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    return f"catalog:v{version}:response:{basename}:{action}:{digest}"
+
+
+class CatalogCacheMixin:
+    """Serve anonymous catalog reads from the cache.
+
+    Only anonymous JSON requests are cached: staff see inactive products and
+    the browsable API renders per-user HTML. Entries keep the response's
+    validators next to its data, so a hit, or a 304 for it, costs no query.
+    Place this mixin before ``ConditionalGetMixin``.
+    """
+
+    cached_actions = frozenset({"list", "retrieve"})
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler: Callable[..., Response], request, *args, **kwargs) -> Response:
+        if not self._is_cacheable(request):
+            return handler(request, *args, **kwargs)
+        key = self.catalog_cache_key(request)
+        cache = catalog_cache()
+        entry = cache.get(key)
+        catalog_cache_counters.record(hit=entry is not None)
+        if entry is not None:
+            return cached_entry_response(request, entry)
+        with primary_reads():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, cache_entry(response), settings.CATALOG_CACHE_TIMEOUT)
+        return response
+
+    def catalog_cache_key(self, request) -> str:
+        return catalog_response_key(get_catalog_version(), self.basename, self.action, request, self.kwargs)
+
+    def _is_cacheable(self, request) -> bool:
+        return (
+            self.action in self.cached_actions
+            and not request.user.is_authenticated
+            and getattr(request, "accepted_renderer", None) is not None
+            and request.accepted_renderer.format == "json"
+        )
+
+
+def cache_entry(response: Response) -> Tuple[Any, Optional[str], Optional[str]]:
+    """``(data, ETag, Last-Modified)`` of a 200 response, as stored in the catalog cache."""
+    return response.data, response.get("ETag"), response.get("Last-Modified")
+
+
+def cached_entry_response(request, entry: Tuple[Any, Optional[str], Optional[str]]):
+    data, etag, last_modified = entry
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=parse_http_date_safe(last_modified) if last_modified else None
+    )
+    if not_modified is not None:
+        return not_modified
+    response = Response(data)
+    if etag:
+        response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = last_modified
+    return response
@@ -0,0 +1,54 @@
+"""Category tree reads over the materialized ``Category.path``.
+
+A category's subtree is every row whose path starts with its own, so both the
+descendant ids and the full menu tree come from one query. Results are cached
+under the catalog version, which every category save or delete bumps, and
+are read from the primary (see :mod:`shop.db_routers`).
+"""
+from __future__ import annotations
+
+from typing import Dict, List
+
+from django.conf import settings
+
+from .cache import catalog_cache, get_catalog_version
+from .db_routers import primary_reads
+from .models import Category
+
+
+def descendant_ids(category_id: int) -> List[int]:
+    """Ids of ``category_id`` and all of its descendants; empty if it does not exist."""
+    key = f"catalog:v{get_catalog_version()}:category-descendants:{category_id}"
+    cache = catalog_cache()
+    ids = cache.get(key)
+    if ids is None:
+        with primary_reads():
+            path = Category.objects.filter(pk=category_id).values_list("path", flat=True).first()
+            ids = list(Category.objects.filter(path__startswith=path).values_list("pk", flat=True)) if path else []
+        cache.set(key, ids, settings.CATALOG_CACHE_TIMEOUT)
+    return ids
+
+
+def category_tree() -> List[Dict]:
+    """All categories as nested ``{"id", "name_ar", "depth", "children"}`` nodes, siblings by name."""
+    key = f"catalog:v{get_catalog_version()}:category-tree"
+    cache = catalog_cache()
+    tree = cache.get(key)
+    if tree is None:
+        with primary_reads():
+            rows = list(Category.objects.order_by("depth", "name_ar").values("id", "name_ar", "parent_id", "depth"))
+        tree = _build_tree(rows)
+        cache.set(key, tree, settings.CATALOG_CACHE_TIMEOUT)
+    return tree
+
+
+def _build_tree(rows) -> List[Dict]:
+    # Rows arrive parents-first, so every parent node exists before its children.
+    nodes: Dict[int, Dict] = {}
+    roots: List[Dict] = []
+    for row in rows:
+        node = {"id": row["id"], "name_ar": row["name_ar"], "depth": row["depth"], "children": []}
+        nodes[row["id"]] = node
+        parent = nodes.get(row["parent_id"])
+        (parent["children"] if parent is not None else roots).append(node)
+    return roots
@@ -0,0 +1,92 @@
+"""Conditional GET for list and detail endpoints.
+
+Validators come from ``updated_at`` and never require serializing anything:
+
+* list: the ids and ``updated_at`` of the rows on the requested page, what
+  else shapes the page (the total for numbered pages, the neighbouring rows
+  for keyset pages) and the query string. They are read from the page the view
+  loads anyway, so lists pay no extra aggregate; a deletion shows up as a
+  changed count or a shifted page. Lists carry no ``Last-Modified``, since no
+  timestamp moves when a row is deleted.
+* detail: the row's primary key and ``updated_at``.
+
+A matching ``If-None-Match`` (or, for details, ``If-Modified-Since``) returns
+304 before anything is serialized.
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Optional, Tuple
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        state = (
+            sorted((key, sorted(values)) for key, values in request.query_params.lists()),
+            self._page_bounds() if page is not None else None,
+            [(row.pk, row.updated_at) for row in rows],
+        )
+        etag = self._etag(request, state)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        data = self.get_serializer(rows, many=True).data
+        response = Response(data) if page is None else self.get_paginated_response(data)
+        response["ETag"] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        try:
+            updated_at = (
+                queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+                .values_list("updated_at", flat=True)
+                .first()
+            )
+        except (TypeError, ValueError, DjangoValidationError):
+            updated_at = None
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self._conditional(
+            request,
+            (self.kwargs[lookup_url_kwarg], updated_at),
+            updated_at,
+            super().retrieve,
+            *args,
+            **kwargs,
+        )
+
+    def _conditional(self, request, state: Tuple, latest, handler, *args, **kwargs):
+        etag = self._etag(request, state)
+        last_modified: Optional[int] = int(latest.timestamp()) if latest is not None else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def _page_bounds(self):
+        # Numbered pages also show the total; keyset pages link to their neighbours.
+        keyset = getattr(self.paginator, "keyset", None)
+        if keyset is not None:
+            return keyset.next_values, keyset.previous_values
+        return self.paginator.page.paginator.count
+
+    def _etag(self, request, state: Tuple) -> str:
+        media_type = getattr(request, "accepted_media_type", "")
+        raw = repr((self.basename, self.action, request.user.is_authenticated, media_type, state))
+        return quote_etag(hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32])
+
@@ -0,0 +1,61 @@
+"""Send anonymous catalog reads to a read replica.
+
+Routers only see a model and hints, not the request, so the views mark the
+requests whose catalog reads may be served from ``CATALOG_READ_DATABASE``
+with :func:`enable_catalog_replica_reads`. The flag is a context variable: it
+follows the request into the threads ``sync_to_async`` runs ORM calls in, and
+nothing outside those requests (orders, stock moves, staff, admin, commands)
+ever reads from the replica. All writes go to the primary.
+
+Anything stored in the catalog cache is read inside :func:`primary_reads`.
+The catalog version is bumped once the primary commits, so a replica that
+still lags would put the old rows in the cache under the new version, where
+they would be served until the next write.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+CATALOG_MODELS = frozenset({"product", "category", "brand"})
+
+_catalog_replica_reads: ContextVar[bool] = ContextVar("catalog_replica_reads", default=False)
+
+
+def enable_catalog_replica_reads() -> Token:
+    return _catalog_replica_reads.set(True)
+
+
+def reset_catalog_replica_reads(token: Token) -> None:
+    _catalog_replica_reads.reset(token)
+
+
+@contextmanager
+def primary_reads() -> Iterator[None]:
+    """Read catalog models from the primary even inside a replica-read request."""
+    token = _catalog_replica_reads.set(False)
+    try:
+        yield
+    finally:
+        reset_catalog_replica_reads(token)
+
+
+class CatalogReplicaRouter:
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        alias = settings.CATALOG_READ_DATABASE
+        if alias and _catalog_replica_reads.get() and _is_catalog_model(model):
+            return alias
+        return None
+
+    def db_for_write(self, model, **hints) -> str:
+        # Without this, saving an instance read from the replica would write there.
+        return DEFAULT_DB_ALIAS
+
+
+def _is_catalog_model(model) -> bool:
+    return model._meta.app_label == "shop" and model._meta.model_name in CATALOG_MODELS
+
@@ -0,0 +1,268 @@
+"""Streaming CSV and XLSX exports.
+
+Rows come from ``values_list(...).iterator(chunk_size=...)`` and are encoded as
+they are produced, so an export holds one database chunk and one output chunk
+in memory whatever its length. XLSX files are written as a zip stream with
+inline strings, which avoids the shared-strings table that would otherwise have
+to be built in memory before the sheet. Text that a spreadsheet would read as a
+formula is prefixed with ``'`` in both formats.
+"""
+from __future__ import annotations
+
+import csv
+import re
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from django.db.models import F, QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import CustomOrder, Product, StandardOrderItem
+
+EXPORT_FORMATS = ("csv", "xlsx")
+EXPORT_CHUNK_SIZE = 2000
+XLSX_MAX_ROWS = 1_048_575
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+# Text starting with one of these is a formula to spreadsheet apps; customer
+# names and notes come from anonymous order forms, so it must stay text.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class ExportSpec:
+    """Columns of one export as ``(title, values_list field)`` pairs.
+
+    ``source`` turns the caller's filtered queryset into the queryset the rows
+    are read from. Columns with a ``None`` field are computed by ``row`` and
+    must come last.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source: Callable[[QuerySet], QuerySet],
+        columns: Sequence[Tuple[str, Optional[str]]],
+        row: Optional[Callable[[tuple], tuple]] = None,
+    ) -> None:
+        self.name = name
+        self.source = source
+        self.header = [title for title, _ in columns]
+        self.fields = [field for _, field in columns if field is not None]
+        self.row = row
+
+    def rows(self, queryset: QuerySet) -> Iterator[tuple]:
+        values = self.source(queryset).values_list(*self.fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        if self.row is None:
+            return values
+        return map(self.row, values)
+
+
+def _selected_pks(queryset: QuerySet) -> QuerySet:
+    return queryset.order_by().prefetch_related(None).values("pk")
+
+
+def standard_order_items(orders: QuerySet) -> QuerySet:
+    return StandardOrderItem.objects.filter(order__in=_selected_pks(orders)).order_by(
+        F("order__created_at").desc(), "order_id", "id"
+    )
+
+
+def custom_orders(orders: QuerySet) -> QuerySet:
+    return CustomOrder.objects.filter(pk__in=_selected_pks(orders)).order_by("-created_at", "id")
+
+
+def products(queryset: QuerySet) -> QuerySet:
+    return Product.objects.filter(pk__in=_selected_pks(queryset)).order_by("sku")
+
+
+STANDARD_ORDER_ITEMS = ExportSpec(
+    "standard-orders",
+    standard_order_items,
+    [
+        ("رقم الطلب", "order_id"),
+        ("تاريخ الطلب", "order__created_at"),
+        ("الحالة", "order__status"),
+        ("اسم العميل", "order__customer__name"),
+        ("الهاتف", "order__customer__phone"),
+        ("المدينة", "order__customer__city"),
+        ("إجمالي الطلب", "order__total"),
+        ("العملة", "order__currency"),
+        ("SKU", "product__sku"),
+        ("المنتج", "product__name_ar"),
+        ("الكمية", "qty"),
+        ("سعر الوحدة", "unit_price"),
+        ("إجمالي السطر", None),
+    ],
+    row=lambda row: (*row, row[-2] * row[-1]),
+)
+
+CUSTOM_ORDERS = ExportSpec(
+    "custom-orders",
+    custom_orders,
+    [
+        ("رقم الطلب", "id"),
+        ("تاريخ الطلب", "created_at"),
+        ("الحالة", "status"),
+        ("اسم العميل", "customer__name"),
+        ("الهاتف", "customer__phone"),
+        ("المدينة", "customer__city"),
+        ("مدينة الموقع", "site_city"),
+        ("المجموع الفرعي", "quote_subtotal"),
+        ("الخصم", "quote_discount"),
+        ("الإجمالي", "quote_total"),
+        ("العملة", "currency"),
+    ],
+)
+
+PRODUCTS = ExportSpec(
+    "products",
+    products,
+    [
+        ("SKU", "sku"),
+        ("الاسم", "name_ar"),
+        ("الفئة", "category__name_ar"),
+        ("العلامة التجارية", "brand__name"),
+        ("السعر", "price"),
+        ("المخزون", "stock"),
+        ("المحجوز", "reserved"),
+        ("فعال", "is_active"),
+    ],
+)
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime("%Y-%m-%d %H:%M") if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return str(value)
+
+
+class _Echo:
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_csv(header: List[str], rows: Iterable[tuple]) -> Iterator[bytes]:
+    writer = csv.writer(_Echo())
+    # The BOM makes Excel open UTF-8 Arabic text correctly.
+    yield "\ufeff".encode("utf-8") + writer.writerow(header).encode("utf-8")
+    for row in rows:
+        yield writer.writerow([_cell_text(value) for value in row]).encode("utf-8")
+
+
+class _ZipBuffer:
+    """Write-only, unseekable sink for ``zipfile``; ``drain`` hands back what was written."""
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def _xlsx_cell(value) -> str:
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    text = escape(XML_INVALID_CHARS.sub("", _cell_text(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: Iterable) -> bytes:
+    return ("<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>").encode("utf-8")
+
+
+def stream_xlsx(header: List[str], rows: Iterable[tuple], flush_rows: int = 500) -> Iterator[bytes]:
+    """Yield an XLSX workbook with one right-to-left sheet, compressed as rows arrive."""
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_STATIC_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetViews><sheetView rightToLeft="1" workbookViewId="0"/></sheetViews><sheetData>'
+            )
+            sheet.write(_xlsx_row(header))
+            for index, row in enumerate(rows, start=1):
+                if index > XLSX_MAX_ROWS:
+                    break
+                sheet.write(_xlsx_row(row))
+                if index % flush_rows == 0:
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            sheet.write(b"</sheetData></worksheet>")
+    yield buffer.drain()
+
+
+def export_response(spec: ExportSpec, queryset: QuerySet, export_format: str = "csv") -> StreamingHttpResponse:
+    rows = spec.rows(queryset)
+    filename = f"{spec.name}-{timezone.localdate():%Y%m%d}.{export_format}"
+    if export_format == "xlsx":
+        response = StreamingHttpResponse(stream_xlsx(spec.header, rows), content_type=XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(stream_csv(spec.header, rows), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,125 @@
+"""Filtering and facet counts over ``Product.specs``.
+
+Filters arrive as ``?spec.<key>=<value>`` query params. Repeat a param to OR
+values of the same key, and use several keys to AND them. On PostgreSQL each
+value becomes a ``specs @> {"key": "value"}`` containment test, which the
+``shop_product_specs_gin`` index (jsonb_path_ops) serves. Other databases
+compare the extracted key. Keys containing ``__`` are ignored because they
+would be read as nested lookups.
+
+Facet values are reported as text on every database (``8``, ``true``,
+``5MP``), and a filter value matches both the JSON string and the number or
+boolean it spells, so every offered facet value can be used as a filter.
+"""
+from __future__ import annotations
+
+import json
+import math
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connections
+from django.db.models import Q, QuerySet
+
+SPEC_PARAM_PREFIX = "spec."
+
+_FACET_SQL = {
+    "postgresql": (
+        "SELECT kv.key, kv.value #>> '{{}}', COUNT(*) "
+        "FROM {table} AS p CROSS JOIN LATERAL jsonb_each(p.specs) AS kv "
+        "WHERE p.id IN ({ids}) AND jsonb_typeof(p.specs) = 'object' "
+        "AND jsonb_typeof(kv.value) IN ('string', 'number', 'boolean') "
+        "GROUP BY 1, 2 ORDER BY 1, 3 DESC, 2"
+    ),
+    "sqlite": (
+        "SELECT kv.key, CASE kv.type WHEN 'true' THEN 'true' WHEN 'false' THEN 'false' "
+        "ELSE CAST(kv.value AS TEXT) END, COUNT(*) "
+        "FROM {table} AS p, json_each(p.specs) AS kv "
+        "WHERE p.id IN ({ids}) AND json_type(p.specs) = 'object' "
+        "AND kv.type IN ('text', 'integer', 'real', 'true', 'false') "
+        "GROUP BY 1, 2 ORDER BY 1, 3 DESC, 2"
+    ),
+}
+
+
+def spec_filters_from_params(query_params) -> Dict[str, List[str]]:
+    filters: Dict[str, List[str]] = OrderedDict()
+    for param in query_params:
+        if not param.startswith(SPEC_PARAM_PREFIX):
+            continue
+        key = param[len(SPEC_PARAM_PREFIX):]
+        values = [value for value in query_params.getlist(param) if value != ""]
+        if key and "__" not in key and values:
+            filters[key] = values
+    return filters
+
+
+def spec_value_variants(value: str) -> List:
+    """JSON values ``value`` stands for: the string itself and the number or boolean it spells."""
+    variants = [value]
+    try:
+        typed = json.loads(value)
+    except ValueError:
+        return variants
+    if isinstance(typed, bool) or (isinstance(typed, (int, float)) and math.isfinite(typed)):
+        variants.append(typed)
+    return variants
+
+
+def filter_by_specs(queryset: QuerySet, filters: Dict[str, List[str]]) -> QuerySet:
+    if not filters:
+        return queryset
+    postgresql = connections[queryset.db].vendor == "postgresql"
+    for key, values in filters.items():
+        variants = [variant for value in values for variant in spec_value_variants(value)]
+        if postgresql:
+            condition = Q()
+            for variant in variants:
+                condition |= Q(specs__contains={key: variant})
+            queryset = queryset.filter(condition)
+        else:
+            queryset = queryset.filter(**{f"specs__{key}__in": variants})
+    return queryset
+
+
+def _facet_text(value) -> Optional[str]:
+    """A scalar spec value as the facet SQL renders it; ``None`` for arrays, objects and null."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    return None
+
+
+def _facet_rows_in_python(queryset: QuerySet) -> List[Tuple[str, str, int]]:
+    counts: Counter = Counter()
+    for specs in queryset.order_by().values_list("specs", flat=True).iterator(chunk_size=2000):
+        if not isinstance(specs, dict):
+            continue
+        for key, value in specs.items():
+            text = _facet_text(value)
+            if text is not None:
+                counts[key, text] += 1
+    return sorted(((key, text, count) for (key, text), count in counts.items()), key=lambda row: (row[0], -row[2], row[1]))
+
+
+def spec_facet_counts(queryset: QuerySet, keys: Optional[Iterable[str]] = None) -> Dict[str, List[dict]]:
+    """Count products per spec key/value over ``queryset`` with a single aggregate query."""
+    connection = connections[queryset.db]
+    template = _FACET_SQL.get(connection.vendor)
+    if template is None:
+        # No JSON table function wired up for this database; count the specs here.
+        rows = _facet_rows_in_python(queryset)
+    else:
+        ids_sql, params = queryset.order_by().values("id").query.sql_with_params()
+        sql = template.format(table=connection.ops.quote_name(queryset.model._meta.db_table), ids=ids_sql)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+    wanted = set(keys) if keys else None
+    facets: Dict[str, List[dict]] = OrderedDict()
+    for key, value, count in rows:
+        if wanted is not None and key not in wanted:
+            continue
+        facets.setdefault(key, []).append({"value": value, "count": count})
+    return facets
@@ -0,0 +1,167 @@
+"""Product image derivatives.
+
+An upload is hashed while it is read in chunks, and every derivative is stored
+under ``<PRODUCT_IMAGE_FOLDER>/<hash[:2]>/<hash>/<width>.<ext>``. Uploading the
+same bytes again only checks that those names exist. Missing derivatives are
+resized and encoded in a thread pool (Pillow releases the GIL while resampling
+and encoding), one task per width, and saved as soon as each is ready.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Pillow format name and file extension per output format.
+IMAGE_FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+
+
+class ImageProcessingError(ValueError):
+    pass
+
+
+@dataclass
+class ProcessedImage:
+    digest: str
+    width: int
+    height: int
+    derivatives: List[Dict] = field(default_factory=list)
+    created: int = 0
+
+    @property
+    def url(self) -> str:
+        """The widest JPEG, for clients that store a single URL in ``Product.images``."""
+        jpegs = [item for item in self.derivatives if item["format"] == "jpeg"]
+        return max(jpegs, key=lambda item: item["width"])["url"]
+
+    def as_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "hash": self.digest,
+            "width": self.width,
+            "height": self.height,
+            "derivatives": self.derivatives,
+        }
+
+
+def _hash_upload(file_obj) -> str:
+    digest = hashlib.sha256()
+    for chunk in file_obj.chunks() if hasattr(file_obj, "chunks") else iter(lambda: file_obj.read(65536), b""):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def derivative_name(digest: str, width: int, image_format: str) -> str:
+    extension = IMAGE_FORMATS[image_format][1]
+    return f"{settings.PRODUCT_IMAGE_FOLDER}/{digest[:2]}/{digest}/{width}.{extension}"
+
+
+def _target_widths(source_width: int) -> List[int]:
+    # Never upscale: widths beyond the source collapse into the source width.
+    return sorted({min(width, source_width) for width in settings.PRODUCT_IMAGE_WIDTHS})
+
+
+def _open(file_obj) -> Image.Image:
+    try:
+        image = Image.open(file_obj)
+        image.verify()
+        file_obj.seek(0)
+        image = Image.open(file_obj)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as exc:
+        raise ImageProcessingError("الملف ليس صورة صالحة") from exc
+    return image
+
+
+def _is_rotated(image: Image.Image) -> bool:
+    # EXIF orientations 5-8 swap width and height once applied.
+    return image.getexif().get(0x0112, 1) in {5, 6, 7, 8}
+
+
+def _oriented_size(image: Image.Image) -> Tuple[int, int]:
+    width, height = image.size
+    return (height, width) if _is_rotated(image) else (width, height)
+
+
+def _prepare(image: Image.Image, largest_width: int) -> Image.Image:
+    width, height = _oriented_size(image)
+    requested = (largest_width, max(1, -(-height * largest_width // width)))
+    # JPEG sources can be decoded at 1/2, 1/4 or 1/8 scale, which is much cheaper
+    # than decoding at full size and resampling down.
+    image.draft("RGB", requested[::-1] if _is_rotated(image) else requested)
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in {"RGB", "RGBA"}:
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    image.load()
+    return image
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    pil_format = IMAGE_FORMATS[image_format][0]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    buffer = io.BytesIO()
+    options = {"quality": settings.PRODUCT_IMAGE_QUALITY}
+    if pil_format == "JPEG":
+        options.update(optimize=True, progressive=True)
+    else:
+        options["method"] = 4
+    image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+def _render_width(image: Image.Image, width: int, names: Dict[str, str]) -> None:
+    if width < image.width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    for image_format, name in names.items():
+        default_storage.save(name, ContentFile(_encode(image, image_format)))
+
+
+def process_product_image(file_obj) -> ProcessedImage:
+    """Store WebP and JPEG derivatives of an uploaded image at ``PRODUCT_IMAGE_WIDTHS``."""
+    if file_obj.size and file_obj.size > settings.PRODUCT_IMAGE_MAX_UPLOAD_BYTES:
+        raise ImageProcessingError("حجم الصورة أكبر من المسموح")
+    digest = _hash_upload(file_obj)
+    image = _open(file_obj)
+    source_width, source_height = _oriented_size(image)
+    widths = _target_widths(source_width)
+    names = {
+        (width, image_format): derivative_name(digest, width, image_format)
+        for width in widths
+        for image_format in settings.PRODUCT_IMAGE_FORMATS
+    }
+    with ThreadPoolExecutor(max_workers=settings.PRODUCT_IMAGE_WORKERS) as pool:
+        existing = dict(zip(names, pool.map(default_storage.exists, names.values())))
+        missing: Dict[int, Dict[str, str]] = {}
+        for (width, image_format), name in names.items():
+            if not existing[(width, image_format)]:
+                missing.setdefault(width, {})[image_format] = name
+        if missing:
+            try:
+                source = _prepare(image, max(missing))
+            except (OSError, Image.DecompressionBombError) as exc:
+                raise ImageProcessingError("الملف ليس صورة صالحة") from exc
+            for future in [pool.submit(_render_width, source, width, pending) for width, pending in missing.items()]:
+                future.result()
+
+    derivatives = [
+        {"width": width, "format": image_format, "url": default_storage.url(name)}
+        for (width, image_format), name in names.items()
+    ]
+    return ProcessedImage(
+        digest=digest,
+        width=source_width,
+        height=source_height,
+        derivatives=derivatives,
+        created=sum(len(pending) for pending in missing.values()),
+    )
@@ -0,0 +1,290 @@
+"""Streaming catalog import used by ``seed_products``.
+
+Records are read one at a time from a JSON array, JSON lines or CSV, so memory
+stays flat whatever the size of the feed. Categories and brands resolve through
+in-memory name caches, and products are upserted a chunk at a time with a
+single ``INSERT ... ON CONFLICT (sku) DO UPDATE``.
+
+Each written product stores a hash of its normalized feed record in
+``Product.content_hash``; a delta sync skips rows whose hash is unchanged.
+"""
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import json
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from django.utils import timezone
+
+from .models import Brand, Category, Product
+from .utils import build_product_search_document
+
+DEFAULT_CATEGORY = "إكسسوارات"
+READ_SIZE = 1 << 16
+PRODUCT_FIELDS = ("name_ar", "price", "stock", "category_id", "brand_id", "images", "specs", "is_active")
+UPSERT_FIELDS = [
+    "name_ar",
+    "price",
+    "stock",
+    "category",
+    "brand",
+    "images",
+    "specs",
+    "is_active",
+    "search_document",
+    "content_hash",
+    "updated_at",
+]
+TRUE_VALUES = {"1", "true", "yes", "y", "نعم"}
+FALSE_VALUES = {"0", "false", "no", "n", "لا"}
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+@dataclass
+class SyncResult:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+
+@contextmanager
+def open_source(source: str) -> Iterator[TextIO]:
+    if urlparse(source).scheme in {"http", "https"}:
+        raw = urlopen(source, timeout=10)  # nosec B310
+        stream = io.BufferedReader(raw, buffer_size=READ_SIZE)
+    else:
+        stream = Path(source).open("rb")
+    try:
+        yield io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    finally:
+        stream.close()
+
+
+def iter_records(stream: TextIO) -> Iterator[dict]:
+    """Yield raw records from a JSON array, JSON lines or CSV stream, detected from the first character."""
+    head = stream.read(1)
+    while head and head.isspace():
+        head = stream.read(1)
+    if head == "[":
+        yield from _iter_json_array(stream)
+    elif head == "{":
+        yield from _iter_json_lines(head, stream)
+    elif head:
+        yield from csv.DictReader(_prepend(head, stream))
+
+
+def _prepend(head: str, stream: TextIO) -> Iterator[str]:
+    first = head + stream.readline()
+    yield first
+    yield from stream
+
+
+def _iter_json_lines(head: str, stream: TextIO) -> Iterator[dict]:
+    for line in _prepend(head, stream):
+        if line.strip():
+            yield json.loads(line)
+
+
+def _iter_json_array(stream: TextIO) -> Iterator[dict]:
+    # The opening "[" has already been consumed by iter_records.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = stream.read(READ_SIZE)
+            eof = not more
+            buffer += more
+            continue
+        yield record
+        buffer = buffer[end:]
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_json_field(value, default):
+    if value is None or value == "":
+        return default
+    if isinstance(value, str) and value.lstrip()[:1] in {"[", "{"}:
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            return value
+    return value
+
+
+def _parse_bool(value) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if not lowered or lowered in TRUE_VALUES:
+            return True
+        if lowered in FALSE_VALUES:
+            return False
+        raise InvalidRecord(f"Invalid is_active value {value!r}")
+    return bool(value)
+
+
+def normalize_record(record: dict) -> dict:
+    sku = str(record.get("sku") or "").strip()
+    if not sku:
+        raise InvalidRecord("Missing sku")
+    try:
+        price = Decimal(str(record.get("price") or 0)).quantize(Decimal("0.01"))
+        stock = int(record.get("stock") or 0)
+    except (InvalidOperation, TypeError, ValueError) as exc:
+        raise InvalidRecord(f"Invalid price or stock for {sku}") from exc
+    if stock < 0:
+        raise InvalidRecord(f"Negative stock for {sku}")
+    return {
+        "sku": sku,
+        "name_ar": record.get("name_ar") or record.get("name") or sku,
+        "price": price,
+        "stock": stock,
+        "category": record.get("category") or DEFAULT_CATEGORY,
+        "brand": record.get("brand") or None,
+        "images": _parse_json_field(record.get("images"), []),
+        "specs": _parse_json_field(record.get("specs"), None),
+        "is_active": _parse_bool(record.get("is_active")),
+    }
+
+
+def content_hash(record: dict) -> str:
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CatalogImporter:
+    """Upserts normalized records; one instance carries its name caches across chunks.
+
+    With ``create_missing=False`` (dry runs) unknown categories and brands get
+    negative placeholder ids instead of being created.
+    """
+
+    def __init__(self, create_missing: bool = True) -> None:
+        self.create_missing = create_missing
+        self._categories: Dict[str, int] = dict(Category.objects.values_list("name_ar", "id"))
+        self._brands: Dict[str, int] = dict(Brand.objects.values_list("name", "id"))
+
+    def category_id(self, name: str) -> int:
+        if name not in self._categories:
+            self._categories[name] = self._create(Category, "name_ar", name, len(self._categories))
+        return self._categories[name]
+
+    def brand_id(self, name: Optional[str]) -> Optional[int]:
+        if not name:
+            return None
+        if name not in self._brands:
+            self._brands[name] = self._create(Brand, "name", name, len(self._brands))
+        return self._brands[name]
+
+    def _create(self, model, field: str, name: str, known: int) -> int:
+        if not self.create_missing:
+            return -(known + 1)
+        return model.objects.get_or_create(**{field: name})[0].pk
+
+    def build_product(self, record: dict, digest: Optional[str] = None) -> Product:
+        return Product(
+            sku=record["sku"],
+            name_ar=record["name_ar"],
+            price=record["price"],
+            stock=record["stock"],
+            category_id=self.category_id(record["category"]),
+            brand_id=self.brand_id(record["brand"]),
+            images=record["images"],
+            specs=record["specs"],
+            is_active=record["is_active"],
+            content_hash=digest or content_hash(record),
+            search_document=build_product_search_document(
+                record["name_ar"], record["sku"], record["brand"], record["category"], record["specs"]
+            ),
+        )
+
+    def sync(self, records: List[dict], delta: bool = False) -> SyncResult:
+        """Upsert ``records``; with ``delta`` only rows whose content hash changed are written."""
+        # Later rows win when a chunk repeats a SKU; PostgreSQL rejects touching a row twice in one upsert.
+        by_sku = {record["sku"]: record for record in records}
+        stored = dict(Product.objects.filter(sku__in=by_sku).values_list("sku", "content_hash"))
+        result = SyncResult()
+        batch = []
+        for sku, record in by_sku.items():
+            digest = content_hash(record)
+            if sku not in stored:
+                result.inserted += 1
+            elif delta and stored[sku] == digest:
+                result.skipped += 1
+                continue
+            else:
+                result.updated += 1
+            batch.append(self.build_product(record, digest))
+        self._write(batch)
+        return result
+
+    def _write(self, products: List[Product]) -> None:
+        if products:
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=UPSERT_FIELDS,
+            )
+
+    def diff(self, records: List[dict]) -> List[Tuple[str, str, List[str]]]:
+        """Describe what :meth:`upsert` would do as ``(sku, "new"|"changed", fields)`` without writing."""
+        products = {record["sku"]: self.build_product(record) for record in records}
+        existing = {
+            row["sku"]: row
+            for row in Product.objects.filter(sku__in=products).values("sku", *PRODUCT_FIELDS)
+        }
+        changes = []
+        for sku, product in products.items():
+            current = existing.get(sku)
+            if current is None:
+                changes.append((sku, "new", []))
+                continue
+            fields = [field for field in PRODUCT_FIELDS if getattr(product, field) != current[field]]
+            if fields:
+                changes.append((sku, "changed", fields))
+        return changes
+
+
+def deactivate_missing(seen_skus: Set[str], dry_run: bool = False, batch_size: int = 500) -> int:
+    """Deactivate active products whose SKU is not in ``seen_skus`` and return how many there were."""
+    active = Product.objects.filter(is_active=True).values_list("sku", flat=True)
+    missing = [sku for sku in active.iterator(chunk_size=5000) if sku not in seen_skus]
+    if dry_run:
+        return len(missing)
+    now = timezone.now()
+    for batch in chunked(missing, batch_size):
+        # Clearing the hash makes a delta sync reactivate the SKU if it returns to the feed unchanged.
+        Product.objects.filter(sku__in=batch, is_active=True).update(is_active=False, content_hash="", updated_at=now)
+    return len(missing)
@@ -0,0 +1,17 @@
+"""Guard for the benchmark commands that seed and delete rows."""
+from __future__ import annotations
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def require_benchmark_database() -> None:
+    """Refuse to run unless ``DEBUG`` is on or the default database is ``BENCHMARK_DATABASE_NAME``."""
+    name = str(settings.DATABASES[DEFAULT_DB_ALIAS]["NAME"])
+    if settings.DEBUG or (settings.BENCHMARK_DATABASE_NAME and name == settings.BENCHMARK_DATABASE_NAME):
+        return
+    raise CommandError(
+        "Benchmarks seed and delete rows; run them with DEBUG=1 or against a dedicated database "
+        f"named in BENCHMARK_DATABASE_NAME (the configured database is {name!r})."
+    )
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from rest_framework.utils.encoders import JSONEncoder
+
+from shop.management.benchmarks import require_benchmark_database
+from shop.models import Category, Customer, Product, StandardOrder, StandardOrderItem
+from shop.serializers import StandardOrderListSerializer, StandardOrderSerializer
+
+BENCH_SKU_PREFIX = "BENCH-ORDER-"
+BENCH_CATEGORY = "فئة اختبار الطلبات"
+# Not a phone number, so the cleanup can never match a real customer.
+BENCH_CUSTOMER_PHONE_PREFIX = "BENCH-ORDER-"
+
+
+class Command(BaseCommand):
+    help = "Time one list page of standard orders with the nested and the compact serializer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", type=int, default=2000)
+        parser.add_argument("--items", type=int, default=5, help="Items per order")
+        parser.add_argument("--page-size", type=int, default=settings.REST_FRAMEWORK["PAGE_SIZE"])
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded orders after the run")
+
+    def handle(self, *args, **options):
+        require_benchmark_database()
+        self._cleanup()
+        self._seed(options["orders"], options["items"])
+        self.stdout.write(
+            f"{options['orders']} orders x {options['items']} items on {connection.vendor}, "
+            f"page size {options['page_size']}"
+        )
+        orders = StandardOrder.objects.filter(customer__phone__startswith=BENCH_CUSTOMER_PHONE_PREFIX)
+        variants = [
+            (
+                "expand=items",
+                lambda: orders.select_related("customer").prefetch_related("items__product").order_by("-created_at"),
+                StandardOrderSerializer,
+            ),
+            (
+                "compact",
+                lambda: orders.select_related("customer")
+                .only("id", "status", "total", "currency", "created_at", "updated_at", "customer__name", "customer__phone")
+                .annotate(item_count=Count("items"))
+                .order_by("-created_at"),
+                StandardOrderListSerializer,
+            ),
+        ]
+        for label, build_queryset, serializer_class in variants:
+            timings = []
+            size = 0
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                data = serializer_class(list(build_queryset()[: options["page_size"]]), many=True).data
+                body = json.dumps(data, cls=JSONEncoder, ensure_ascii=False).encode("utf-8")
+                timings.append((time.perf_counter() - started) * 1000)
+                size = len(body)
+            self.stdout.write(
+                f"{label}: median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms, "
+                f"{size / 1024:.1f} KiB per page"
+            )
+
+        if not options["keep"]:
+            self._cleanup()
+
+    def _seed(self, orders: int, items: int) -> None:
+        rng = random.Random(orders)
+        category, _ = Category.objects.get_or_create(name_ar=BENCH_CATEGORY)
+        products = Product.objects.bulk_create(
+            [
+                Product(
+                    name_ar=f"منتج اختبار {index}",
+                    sku=f"{BENCH_SKU_PREFIX}{index:04d}",
+                    price=rng.randint(5, 500),
+                    stock=1000,
+                    category=category,
+                    images=[f"https://example.com/{index}.jpg"],
+                    specs={"resolution": "4MP", "storage": "1TB", "warranty": "سنتان"},
+                )
+                for index in range(max(items * 4, 20))
+            ]
+        )
+        customers = Customer.objects.bulk_create(
+            [
+                Customer(name=f"عميل اختبار {index}", phone=f"{BENCH_CUSTOMER_PHONE_PREFIX}{index:06d}", city="عمان")
+                for index in range(max(orders // 10, 1))
+            ]
+        )
+        created = StandardOrder.objects.bulk_create([StandardOrder(customer=rng.choice(customers)) for _ in range(orders)])
+        order_items = []
+        for order in created:
+            for product in rng.sample(products, items):
+                order_items.append(StandardOrderItem(order=order, product=product, qty=1, unit_price=product.price))
+        StandardOrderItem.objects.bulk_create(order_items, batch_size=5000)
+
+    def _cleanup(self) -> None:
+        StandardOrder.objects.filter(customer__phone__startswith=BENCH_CUSTOMER_PHONE_PREFIX).delete()
+        Customer.objects.filter(phone__startswith=BENCH_CUSTOMER_PHONE_PREFIX).delete()
+        Product.objects.filter(sku__startswith=BENCH_SKU_PREFIX).delete()
+        Category.objects.filter(name_ar=BENCH_CATEGORY, products__isnull=True).delete()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from shop.management.benchmarks import require_benchmark_database
+from shop.models import Brand, Category, Product
+from shop.search import product_search_index, search_products
+from shop.utils import build_product_search_document
+
+BENCH_SKU_PREFIX = "BENCH-SEARCH-"
+BENCH_CATEGORY_PREFIX = "فئة اختبار البحث"
+BENCH_BRAND_PREFIX = "Bench Search Brand"
+NAME_WORDS = ["كاميرا", "مراقبة", "لابتوب", "شاشة", "طابعة", "راوتر", "هارد", "ذاكرة", "سلك", "إضاءة", "حزمة", "أمان"]
+SPEC_VALUES = ["2MP", "4MP", "5MP", "8MP", "1TB", "2TB", "8GB", "16GB", "RTX 3060", "Wi-Fi"]
+QUERIES = ["كاميرا", "كاميرات مراقبه", "لابتوب 16gb", "أمان", "hik", "شاشه 4mp", "راوتر wi"]
+
+
+class Command(BaseCommand):
+    help = "Seed a synthetic catalog and time ranked product searches against it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per query")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded products after the run")
+
+    def handle(self, *args, **options):
+        require_benchmark_database()
+        existing = Product.objects.filter(sku__startswith=BENCH_SKU_PREFIX).count()
+        if existing < options["products"]:
+            self._seed(existing, options["products"])
+        self.stdout.write(f"Catalog: {Product.objects.count()} products on {connection.vendor}")
+
+        queryset = Product.objects.filter(is_active=True)
+        if connection.vendor != "postgresql":
+            started = time.perf_counter()
+            product_search_index.search(["warmup"])
+            self.stdout.write(f"In-process index built in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        for query in QUERIES:
+            timings = []
+            matches = 0
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                page = list(search_products(queryset, query)[:20])
+                timings.append((time.perf_counter() - started) * 1000)
+                matches = len(page)
+            self.stdout.write(
+                f"{query!r}: first page {matches} rows, "
+                f"median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms"
+            )
+
+        if not options["keep"]:
+            deleted, _ = Product.objects.filter(sku__startswith=BENCH_SKU_PREFIX).delete()
+            Category.objects.filter(name_ar__startswith=BENCH_CATEGORY_PREFIX, products__isnull=True).delete()
+            Brand.objects.filter(name__startswith=BENCH_BRAND_PREFIX, products__isnull=True).delete()
+            self.stdout.write(f"Removed {deleted} seeded products")
+
+    def _seed(self, start: int, total: int) -> None:
+        rng = random.Random(start)
+        categories = [Category.objects.get_or_create(name_ar=f"{BENCH_CATEGORY_PREFIX} {i}")[0] for i in range(10)]
+        brands = [Brand.objects.get_or_create(name=f"{BENCH_BRAND_PREFIX} {i}")[0] for i in range(20)]
+        batch = []
+        for index in range(start, total):
+            category = rng.choice(categories)
+            brand = rng.choice(brands)
+            name = " ".join(rng.sample(NAME_WORDS, 3))
+            sku = f"{BENCH_SKU_PREFIX}{index:07d}"
+            specs = {"resolution": rng.choice(SPEC_VALUES), "storage": rng.choice(SPEC_VALUES)}
+            batch.append(
+                Product(
+                    name_ar=name,
+                    sku=sku,
+                    price=rng.randint(5, 2000),
+                    stock=rng.randint(0, 50),
+                    category=category,
+                    brand=brand,
+                    specs=specs,
+                    search_document=build_product_search_document(name, sku, brand.name, category.name_ar, specs),
+                )
+            )
+            if len(batch) >= 5000:
+                Product.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Product.objects.bulk_create(batch)
+        self.stdout.write(f"Seeded {total - start} products")
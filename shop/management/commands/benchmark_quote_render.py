@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import statistics
+import time
+from typing import Callable, List
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.models import CustomOrder
+from shop.services import QuoteRenderer, build_custom_order_quote_html
+
+
+class Command(BaseCommand):
+    help = "Compare per-quote render time of a cold renderer against the shared warm renderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--order", type=int, help="Custom order id to render (defaults to the latest order with lines)")
+        parser.add_argument("--iterations", type=int, default=20)
+
+    def handle(self, *args, **options):
+        queryset = CustomOrder.objects.select_related("customer").prefetch_related("lines")
+        if options.get("order"):
+            custom_order = queryset.filter(pk=options["order"]).first()
+        else:
+            custom_order = queryset.filter(lines__isnull=False).distinct().first()
+        if custom_order is None:
+            raise CommandError("No custom order with lines to render")
+
+        lines = list(custom_order.lines.all())
+        html_string = build_custom_order_quote_html(custom_order, lines, "https://example.com/quote.pdf")
+        iterations = max(1, options["iterations"])
+
+        cold = self._measure(lambda: QuoteRenderer().render(html_string), iterations)
+        warm_renderer = QuoteRenderer()
+        warm_renderer.render(html_string)
+        warm = self._measure(lambda: warm_renderer.render(html_string), iterations)
+
+        self.stdout.write(f"Custom order #{custom_order.pk}, {iterations} renders each")
+        self._report("cold (new fonts + CSS per quote)", cold)
+        self._report("warm (shared renderer)", warm)
+        speedup = statistics.mean(cold) / statistics.mean(warm)
+        self.stdout.write(self.style.SUCCESS(f"Warm renderer is {speedup:.2f}x faster per quote"))
+
+    def _measure(self, render: Callable[[], bytes], iterations: int) -> List[float]:
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def _report(self, label: str, timings: List[float]) -> None:
+        self.stdout.write(
+            f"{label}: mean {statistics.mean(timings):.1f} ms, "
+            f"median {statistics.median(timings):.1f} ms, max {max(timings):.1f} ms"
+        )
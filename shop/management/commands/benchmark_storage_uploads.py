@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, storages
+from django.core.management.base import BaseCommand
+from storages.backends.s3 import S3Storage
+
+from shop.storage import PooledS3Storage, save_many
+
+BENCH_PREFIX = "benchmark-uploads"
+
+
+class Command(BaseCommand):
+    help = "Measure uploads/sec to the default storage, one at a time and as a concurrent batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=200)
+        parser.add_argument("--size-kb", type=int, default=64, help="Size of each object")
+        parser.add_argument("--workers", type=int, default=None, help="Batch parallelism (STORAGE_UPLOAD_WORKERS)")
+        parser.add_argument("--keep", action="store_true", help="Keep the uploaded objects")
+
+    def handle(self, *args, **options):
+        payload = os.urandom(options["size_kb"] * 1024)
+        storage = storages["default"]
+        self.stdout.write(f"{options['files']} x {options['size_kb']} KiB to {storage.__class__.__name__}")
+        runs = [("sequential", storage, False), ("batch", storage, True)]
+        if isinstance(storage, PooledS3Storage):
+            # The stock backend with the same settings, for comparison.
+            runs.append(("batch-s3storage", S3Storage(), True))
+
+        for label, storage, batch in runs:
+            names = {f"{BENCH_PREFIX}/{label}/{index:06d}.bin": payload for index in range(options["files"])}
+            started = time.perf_counter()
+            failures = self._upload(storage, names, batch, options["workers"])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{label}: {len(names) / elapsed:.1f} uploads/s, "
+                f"{len(names) * len(payload) / elapsed / 1024 / 1024:.1f} MiB/s, {failures} failed"
+            )
+            if not options["keep"]:
+                with ThreadPoolExecutor(max_workers=options["workers"] or 8) as pool:
+                    list(pool.map(storage.delete, names))
+
+    def _upload(self, storage: Storage, names: Dict[str, bytes], batch: bool, workers) -> int:
+        if batch:
+            results = save_many(names, storage=storage, max_workers=workers)
+            return sum(1 for result in results.values() if isinstance(result, Exception))
+        failures = 0
+        for name, content in names.items():
+            try:
+                storage.save(name, ContentFile(content))
+            except Exception:  # pylint: disable=broad-except
+                failures += 1
+        return failures
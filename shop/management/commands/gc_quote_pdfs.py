@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import posixpath
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.models import CustomOrder
+
+
+class Command(BaseCommand):
+    help = "Delete stored quote PDFs that no custom order references any more"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age-hours",
+            type=float,
+            default=24,
+            help="Keep unreferenced files younger than this, in case a render is still being saved",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="List the files without deleting them")
+
+    def handle(self, *args, **options):
+        folder = settings.PDF_STORAGE_FOLDER
+        referenced = set()
+        for url, fingerprint in CustomOrder.objects.values_list("quote_pdf_url", "quote_pdf_fingerprint").iterator():
+            if url:
+                referenced.add(posixpath.basename(urlparse(url).path))
+            if fingerprint:
+                referenced.add(f"{fingerprint}.pdf")
+
+        try:
+            _, files = default_storage.listdir(folder)
+        except FileNotFoundError:
+            files = []
+        cutoff = timezone.now() - timedelta(hours=options["min_age_hours"])
+        removed = 0
+        kept = 0
+        for file_name in files:
+            path = f"{folder}/{file_name}"
+            if file_name in referenced or default_storage.get_modified_time(path) > cutoff:
+                kept += 1
+                continue
+            if options["dry_run"]:
+                self.stdout.write(f"Would delete {path}")
+            else:
+                default_storage.delete(path)
+            removed += 1
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} quote PDFs, kept {kept}"))
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import http.client
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.models import Brand, Category, Product
+
+# name -> (command, extra environment); "{port}" is replaced with the port.
+PROFILES = {
+    "runserver": (
+        [sys.executable, "manage.py", "runserver", "--noreload", "127.0.0.1:{port}"],
+        {"ASYNC_CATALOG_READS": "0"},
+    ),
+    "wsgi": (
+        ["gunicorn", "-c", "gunicorn.conf.py", "--bind", "127.0.0.1:{port}"],
+        {"GUNICORN_ASGI": "0", "ASYNC_CATALOG_READS": "0", "GUNICORN_ACCESSLOG": ""},
+    ),
+    "asgi-sync": (
+        ["gunicorn", "-c", "gunicorn.conf.py", "--bind", "127.0.0.1:{port}"],
+        {"GUNICORN_ASGI": "1", "ASYNC_CATALOG_READS": "0", "GUNICORN_ACCESSLOG": ""},
+    ),
+    "asgi": (
+        ["gunicorn", "-c", "gunicorn.conf.py", "--bind", "127.0.0.1:{port}"],
+        {"GUNICORN_ASGI": "1", "ASYNC_CATALOG_READS": "1", "GUNICORN_ACCESSLOG": ""},
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = "Load-test the anonymous catalog reads and report req/s and latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", help="Test a running server at this base URL instead of starting profiles")
+        parser.add_argument(
+            "--profiles",
+            default="wsgi,asgi-sync,asgi",
+            help=f"Comma-separated serving profiles to start and compare: {', '.join(PROFILES)}",
+        )
+        parser.add_argument("--port", type=int, default=8100, help="First port for the started profiles")
+        parser.add_argument("--concurrency", type=int, default=32, help="Concurrent keep-alive clients")
+        parser.add_argument("--duration", type=float, default=15.0, help="Seconds of measurement per target")
+        parser.add_argument("--warmup", type=float, default=3.0, help="Seconds of unmeasured load first")
+
+    def handle(self, *args, **options):
+        paths = self._paths()
+        if options["url"]:
+            self._report(options["url"], self._run(options["url"], paths, options))
+            return
+        for offset, name in enumerate(name.strip() for name in options["profiles"].split(",")):
+            if name not in PROFILES:
+                raise CommandError(f"Unknown profile {name!r}")
+            port = options["port"] + offset
+            base_url = f"http://127.0.0.1:{port}"
+            server = self._start(name, port)
+            try:
+                self._wait_ready(base_url)
+                self._report(name, self._run(base_url, paths, options))
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    def _paths(self) -> List[str]:
+        product_ids = list(Product.objects.filter(is_active=True).values_list("pk", flat=True)[:200])
+        category_ids = list(Category.objects.values_list("pk", flat=True)[:50])
+        brand_ids = list(Brand.objects.values_list("pk", flat=True)[:50])
+        if not product_ids:
+            raise CommandError("No active products; run seed_products first")
+        # Weighted towards the storefront's hot paths: product pages and details.
+        paths = ["/api/products/"] * 4 + ["/api/products/?page=2"] * 2 + ["/api/categories/", "/api/brands/"]
+        paths += [f"/api/products/{pk}/" for pk in random.sample(product_ids, min(len(product_ids), 40))] * 2
+        paths += [f"/api/categories/{pk}/" for pk in category_ids[:10]]
+        paths += [f"/api/brands/{pk}/" for pk in brand_ids[:10]]
+        return paths
+
+    def _start(self, name: str, port: int) -> subprocess.Popen:
+        command, env = PROFILES[name]
+        return subprocess.Popen(
+            [part.format(port=port) for part in command],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, **env},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def _wait_ready(self, base_url: str, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                connection = self._connect(base_url)
+                connection.request("GET", "/api/categories/")
+                if connection.getresponse().status < 500:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.5)
+        raise CommandError(f"{base_url} did not start within {timeout:.0f}s")
+
+    @staticmethod
+    def _connect(base_url: str) -> http.client.HTTPConnection:
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        return connection_class(parts.hostname, parts.port, timeout=30)
+
+    def _run(self, base_url: str, paths: List[str], options) -> Dict:
+        measuring = threading.Event()
+        stop = threading.Event()
+        latencies: List[List[float]] = [[] for _ in range(options["concurrency"])]
+        errors = [0] * options["concurrency"]
+
+        def client(index: int) -> None:
+            rng = random.Random(index)
+            connection = self._connect(base_url)
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    connection.request("GET", rng.choice(paths), headers={"Accept": "application/json"})
+                    response = connection.getresponse()
+                    response.read()
+                    failed = response.status >= 400
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = self._connect(base_url)
+                    failed = True
+                if measuring.is_set():
+                    latencies[index].append(time.perf_counter() - started)
+                    errors[index] += failed
+            connection.close()
+
+        threads = [threading.Thread(target=client, args=(index,), daemon=True) for index in range(options["concurrency"])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options["warmup"])
+        measuring.set()
+        started = time.perf_counter()
+        time.sleep(options["duration"])
+        measuring.clear()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        samples = sorted(latency for thread_latencies in latencies for latency in thread_latencies)
+        if not samples:
+            raise CommandError(f"No responses from {base_url}")
+        return {
+            "requests": len(samples),
+            "errors": sum(errors),
+            "rps": len(samples) / elapsed,
+            "p50": samples[len(samples) // 2],
+            "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        }
+
+    def _report(self, label: str, result: Dict) -> None:
+        self.stdout.write(
+            f"{label}: {result['rps']:.0f} req/s, p50 {result['p50'] * 1000:.1f} ms, "
+            f"p99 {result['p99'] * 1000:.1f} ms, {result['requests']} requests, {result['errors']} errors"
+        )
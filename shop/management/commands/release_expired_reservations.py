@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from shop.models import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Release stock held by standard orders whose reservation has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            units = release_expired_reservations(options["batch_size"])
+            if not units:
+                break
+            released += units
+        self.stdout.write(self.style.SUCCESS(f"Released {released} reserved units"))
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from shop.services import claim_quote_pdf_jobs, requeue_stale_quote_pdf_jobs
+from shop.workers import init_worker, run_quote_pdf_job
+
+
+class Command(BaseCommand):
+    help = "Process queued quote PDF jobs in a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+        parser.add_argument("--batch-size", type=int, default=None, help="Jobs to claim per poll (defaults to --processes)")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to sleep when the queue is empty")
+        parser.add_argument(
+            "--stale-after-minutes",
+            type=int,
+            default=15,
+            help="Requeue running jobs that started longer ago than this",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit")
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        batch_size = options["batch_size"] or processes
+        stale_after = timedelta(minutes=options["stale_after_minutes"])
+        requeued = requeue_stale_quote_pdf_jobs(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale jobs"))
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=init_worker) as pool:
+            self.stdout.write(f"Quote PDF worker started with {processes} processes")
+            while True:
+                close_old_connections()
+                job_ids = claim_quote_pdf_jobs(batch_size)
+                if not job_ids:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                futures = {pool.submit(run_quote_pdf_job, job_id): job_id for job_id in job_ids}
+                wait(futures)
+                for future, job_id in futures.items():
+                    try:
+                        self.stdout.write(f"Job {job_id}: {future.result()}")
+                    except Exception as exc:  # pylint: disable=broad-except
+                        self.stderr.write(f"Job {job_id}: worker error {exc}")
+        self.stdout.write(self.style.SUCCESS("Quote PDF queue drained"))
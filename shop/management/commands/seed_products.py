@@ -1,65 +1,139 @@
 from __future__ import annotations
 
-import csv
 import json
+import os
+import time
+from contextlib import nullcontext
+from itertools import islice
 from pathlib import Path
-from typing import Iterable
-from urllib.parse import urlparse
-from urllib.request import urlopen
+from typing import Iterable, Iterator, Optional, Set
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from shop.models import Brand, Category, Product
+from shop.cache import bump_catalog_version
+from shop.importer import (
+    CatalogImporter,
+    InvalidRecord,
+    SyncResult,
+    chunked,
+    deactivate_missing,
+    iter_records,
+    normalize_record,
+    open_source,
+)
 
 
 class Command(BaseCommand):
     help = "Load sample products into the database"
 
     def add_arguments(self, parser):
-        parser.add_argument("--source", help="Path or URL to JSON/CSV file", required=False)
+        parser.add_argument("--source", help="Path or URL to JSON/JSON lines/CSV file", required=False)
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Products upserted per statement")
+        parser.add_argument("--dry-run", action="store_true", help="Print new and changed SKUs without writing")
+        parser.add_argument("--checkpoint", help="File recording progress so an interrupted import can resume")
+        parser.add_argument("--delta", action="store_true", help="Skip products whose feed record has not changed")
+        parser.add_argument(
+            "--deactivate-missing", action="store_true", help="Deactivate active products missing from the feed"
+        )
 
     def handle(self, *args, **options):
         source = options.get("source")
-        if source:
-            data = self._load_from_source(source)
-        else:
-            data = self._default_seed()
-        count = 0
-        for product in data:
-            category_name = product.get("category", "إكسسوارات")
-            category, _ = Category.objects.get_or_create(name_ar=category_name)
-            brand_name = product.get("brand")
-            brand = None
-            if brand_name:
-                brand, _ = Brand.objects.get_or_create(name=brand_name)
-            Product.objects.update_or_create(
-                sku=product["sku"],
-                defaults={
-                    "name_ar": product.get("name_ar") or product.get("name") or product["sku"],
-                    "price": product.get("price", 0),
-                    "stock": product.get("stock", 0),
-                    "category": category,
-                    "brand": brand,
-                    "images": product.get("images", []),
-                    "specs": product.get("specs"),
-                    "is_active": product.get("is_active", True),
-                },
+        dry_run = options["dry_run"]
+        checkpoint = None if dry_run else options.get("checkpoint")
+        skip = self._load_checkpoint(checkpoint, source)
+        if skip:
+            self.stdout.write(f"Resuming after {skip} rows")
+
+        importer = CatalogImporter(create_missing=not dry_run)
+        totals = SyncResult()
+        seen_skus: Set[str] = set()
+        rows = skip
+        invalid = new = changed = 0
+        started = time.perf_counter()
+        with open_source(source) if source else nullcontext() as stream:
+            records = iter_records(stream) if stream else iter(self._default_seed())
+            if options["deactivate_missing"]:
+                records = self._track_skus(records, seen_skus)
+            for chunk in chunked(islice(records, skip, None), options["chunk_size"]):
+                valid = []
+                for offset, record in enumerate(chunk, start=rows + 1):
+                    try:
+                        valid.append(normalize_record(record))
+                    except InvalidRecord as exc:
+                        invalid += 1
+                        self.stderr.write(f"Row {offset}: {exc}")
+                rows += len(chunk)
+                if dry_run:
+                    for sku, change, fields in importer.diff(valid):
+                        if change == "new":
+                            new += 1
+                            self.stdout.write(f"+ {sku}")
+                        else:
+                            changed += 1
+                            self.stdout.write(f"~ {sku}: {', '.join(fields)}")
+                    continue
+                with transaction.atomic():
+                    result = importer.sync(valid, delta=options["delta"])
+                totals.inserted += result.inserted
+                totals.updated += result.updated
+                totals.skipped += result.skipped
+                self._save_checkpoint(checkpoint, source, rows)
+                if options["verbosity"] >= 2:
+                    self.stdout.write(f"{rows} rows ({self._rate(rows - skip, started):.0f} rows/s)")
+
+        deactivated = 0
+        if options["deactivate_missing"] and rows:
+            deactivated = deactivate_missing(seen_skus, dry_run=dry_run)
+
+        rate = self._rate(rows - skip, started)
+        elapsed = time.perf_counter() - started
+        if dry_run:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Dry run: {new} new, {changed} changed, {deactivated} to deactivate, {invalid} invalid "
+                    f"of {rows} rows in {elapsed:.1f}s ({rate:.0f} rows/s)"
+                )
+            )
+            return
+        if totals.inserted or totals.updated or deactivated:
+            # bulk_create and update() skip post_save, so the catalog cache is invalidated here.
+            bump_catalog_version()
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Inserted {totals.inserted}, updated {totals.updated}, skipped {totals.skipped} unchanged, "
+                f"deactivated {deactivated}, {invalid} invalid of {rows} rows "
+                f"in {elapsed:.1f}s ({rate:.0f} rows/s)"
             )
-            count += 1
-        self.stdout.write(self.style.SUCCESS(f"Loaded {count} products"))
+        )
+
+    @staticmethod
+    def _track_skus(records: Iterable[dict], seen_skus: Set[str]) -> Iterator[dict]:
+        # Wraps the stream before checkpoint skipping, so resumed runs still see every SKU in the feed.
+        for record in records:
+            seen_skus.add(str(record.get("sku") or "").strip())
+            yield record
+
+    @staticmethod
+    def _rate(rows: int, started: float) -> float:
+        return rows / max(time.perf_counter() - started, 1e-9)
+
+    def _load_checkpoint(self, path: Optional[str], source: Optional[str]) -> int:
+        if not path or not os.path.exists(path):
+            return 0
+        state = json.loads(Path(path).read_text(encoding="utf-8"))
+        if state.get("source") != source:
+            raise CommandError(f"Checkpoint {path} was written for {state.get('source')!r}, not {source!r}")
+        return int(state["rows"])
 
-    def _load_from_source(self, source: str) -> Iterable[dict]:
-        parsed = urlparse(source)
-        if parsed.scheme in {"http", "https"}:
-            with urlopen(source, timeout=10) as response:  # nosec B310
-                content = response.read()
-        else:
-            content = Path(source).read_bytes()
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            reader = csv.DictReader(content.decode("utf-8").splitlines())
-            return list(reader)
+    def _save_checkpoint(self, path: Optional[str], source: Optional[str], rows: int) -> None:
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        Path(tmp_path).write_text(json.dumps({"source": source, "rows": rows}), encoding="utf-8")
+        os.replace(tmp_path, path)
 
     def _default_seed(self) -> Iterable[dict]:
         return [
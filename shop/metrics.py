@@ -0,0 +1,206 @@
+"""Per-request latency, query and serializer metrics.
+
+``RequestMetricsMiddleware`` times every request and tags it with the URL
+name it resolved to, which for router views is ``<basename>-<action>`` (for
+example ``custom-order-generate-quote-pdf``). A ``METRICS_SAMPLE_RATE``
+fraction of requests also measures database queries, through an execute
+wrapper installed on every new connection, and serializer time, through the
+``data`` property of DRF serializers. Serializer time includes the queries
+serialization itself triggers, which is where N+1 lookups show up.
+
+Results go to Prometheus histograms served at ``/metrics`` and, with
+``METRICS_SERVER_TIMING`` on (the default only with ``DEBUG``), to a
+``Server-Timing`` response header. Under
+gunicorn every worker writes to ``PROMETHEUS_MULTIPROC_DIR`` and ``/metrics``
+aggregates them (see gunicorn.conf.py). Streaming responses are timed until
+the response starts, not until the stream ends.
+"""
+from __future__ import annotations
+
+import os
+import random
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from rest_framework.serializers import ListSerializer, Serializer
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+KNOWN_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+
+REQUESTS = Counter("http_requests", "Requests by endpoint, method and status", ["endpoint", "method", "status"])
+LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency", ["endpoint", "method"], buckets=LATENCY_BUCKETS
+)
+QUERIES = Histogram(
+    "http_request_db_queries", "Database queries per sampled request", ["endpoint"], buckets=QUERY_BUCKETS
+)
+DB_TIME = Histogram(
+    "http_request_db_duration_seconds", "Database time per sampled request", ["endpoint"], buckets=LATENCY_BUCKETS
+)
+SERIALIZE_TIME = Histogram(
+    "http_request_serialize_duration_seconds",
+    "Serializer time per sampled request",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "serialize_seconds", "serializing")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+
+
+# Set for sampled requests only. Context variables follow the request into the
+# threads sync_to_async runs views and ORM calls in.
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = _sampled_stats()
+        token = _request_stats.set(stats)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return _record(request, response, stats, perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = _sampled_stats()
+        token = _request_stats.set(stats)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return _record(request, response, stats, perf_counter() - started)
+
+
+def _sampled_stats() -> Optional[RequestStats]:
+    return RequestStats() if random.random() < settings.METRICS_SAMPLE_RATE else None
+
+
+def _endpoint(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route
+
+
+_children: Dict[Tuple, object] = {}
+
+
+def _child(metric, *labels):
+    # ``labels()`` validates and locks on every call; URL names are a bounded set.
+    key = (metric, labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def _record(request, response, stats: Optional[RequestStats], elapsed: float):
+    endpoint = _endpoint(request)
+    method = request.method if request.method in KNOWN_METHODS else "other"
+    _child(REQUESTS, endpoint, method, response.status_code).inc()
+    _child(LATENCY, endpoint, method).observe(elapsed)
+    timings = [f"total;dur={elapsed * 1000:.1f}"]
+    if stats is not None:
+        _child(QUERIES, endpoint).observe(stats.queries)
+        _child(DB_TIME, endpoint).observe(stats.db_seconds)
+        _child(SERIALIZE_TIME, endpoint).observe(stats.serialize_seconds)
+        timings.insert(0, f'db;dur={stats.db_seconds * 1000:.1f};desc="queries={stats.queries}"')
+        timings.insert(1, f"serialize;dur={stats.serialize_seconds * 1000:.1f}")
+    if settings.METRICS_SERVER_TIMING:
+        response["Server-Timing"] = ", ".join(timings)
+    return response
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += perf_counter() - started
+
+
+def _instrument_connection(sender, connection, **kwargs) -> None:
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def _timed_data(data_property: property) -> property:
+    fget = data_property.fget
+
+    def data(self):
+        stats = _request_stats.get()
+        # Nested and list-item serializers are part of the outermost one's time.
+        if stats is None or stats.serializing:
+            return fget(self)
+        stats.serializing = True
+        started = perf_counter()
+        try:
+            return fget(self)
+        finally:
+            stats.serialize_seconds += perf_counter() - started
+            stats.serializing = False
+
+    data.timed = True
+    return property(data)
+
+
+def install() -> None:
+    """Hook query and serializer timing in; called once from ``ShopConfig.ready``."""
+    connection_created.connect(_instrument_connection, dispatch_uid="shop_request_metrics_queries")
+    for serializer_class in (Serializer, ListSerializer):
+        if not getattr(serializer_class.data.fget, "timed", False):
+            serializer_class.data = _timed_data(serializer_class.data)
+
+
+def metrics_view(request):
+    """Prometheus text exposition behind ``Authorization: Bearer <METRICS_TOKEN>``.
+
+    Without a token configured, it is only served with ``DEBUG`` on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
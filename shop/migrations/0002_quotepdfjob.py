@@ -0,0 +1,32 @@
+# Generated manually for Strike Force project
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotePdfJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'بانتظار المعالجة'), ('running', 'قيد المعالجة'), ('done', 'جاهز'), ('failed', 'فشل')], default='pending', max_length=16)),
+                ('quote_pdf_url', models.URLField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('custom_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quote_pdf_jobs', to='shop.customorder')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='shop_quotejob_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated manually for Strike Force project
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_quotepdfjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customorder',
+            name='quote_pdf_fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
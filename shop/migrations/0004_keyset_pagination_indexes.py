@@ -0,0 +1,24 @@
+# Generated manually for Strike Force project
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_customorder_quote_pdf_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name_ar', 'id'], name='shop_product_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='standardorder',
+            index=models.Index(fields=['-created_at', 'id'], name='shop_stdorder_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customorder',
+            index=models.Index(fields=['-created_at', 'id'], name='shop_custorder_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated manually for Strike Force project
+from django.db import migrations, models
+
+from shop.utils import build_product_search_document
+
+
+def populate_search_documents(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    batch = []
+    for product in Product.objects.select_related('brand', 'category').iterator(chunk_size=2000):
+        product.search_document = build_product_search_document(
+            product.name_ar,
+            product.sku,
+            product.brand.name if product.brand_id else None,
+            product.category.name_ar,
+            product.specs,
+        )
+        batch.append(product)
+        if len(batch) >= 2000:
+            Product.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['search_document'])
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS shop_product_search_gin ON shop_product "
+        "USING gin (to_tsvector('simple'::regconfig, search_document))"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS shop_product_search_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_document',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
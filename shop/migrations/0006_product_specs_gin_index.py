@@ -0,0 +1,27 @@
+# Generated manually for Strike Force project
+from django.db import migrations
+
+
+def create_specs_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS shop_product_specs_gin ON shop_product USING gin (specs jsonb_path_ops)"
+    )
+
+
+def drop_specs_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS shop_product_specs_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_specs_index, drop_specs_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated manually for Strike Force project
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated manually for Strike Force project
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model('shop', 'Category')
+    paths = {}
+    level = list(Category.objects.filter(parent__isnull=True))
+    depth = 0
+    while level:
+        for category in level:
+            category.path = f"{paths.get(category.parent_id, '/')}{category.pk}/"
+            category.depth = depth
+            paths[category.pk] = category.path
+        Category.objects.bulk_update(level, ['path', 'depth'], batch_size=1000)
+        level = list(Category.objects.filter(parent_id__in=[category.pk for category in level]))
+        depth += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_product_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
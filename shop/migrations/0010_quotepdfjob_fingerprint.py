@@ -0,0 +1,17 @@
+# Generated manually for Strike Force project
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_category_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quotepdfjob',
+            name='fingerprint',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
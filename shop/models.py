@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+from datetime import timedelta
 from decimal import Decimal
-from typing import Iterable
+from typing import Dict, Iterable, List, Optional
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .utils import build_product_search_document
+
 
 class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -15,6 +22,13 @@ class TimeStampedModel(models.Model):
     class Meta:
         abstract = True
 
+    def save(self, *args, **kwargs):
+        # auto_now only reaches the database if updated_at is among the written columns.
+        update_fields = kwargs.get("update_fields")
+        if update_fields and "updated_at" not in update_fields:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+        super().save(*args, **kwargs)
+
 
 class Customer(TimeStampedModel):
     name = models.CharField(max_length=255)
@@ -37,6 +51,11 @@ class Category(TimeStampedModel):
     parent = models.ForeignKey(
         "self", related_name="children", on_delete=models.CASCADE, blank=True, null=True
     )
+    # Materialized path of ancestor ids including this one, e.g. "/3/17/42/".
+    path = models.CharField(max_length=255, blank=True, editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    PATH_FIELDS = frozenset({"path", "depth"})
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -45,6 +64,55 @@ class Category(TimeStampedModel):
     def __str__(self) -> str:  # pragma: no cover - simple display
         return self.name_ar
 
+    def is_descendant_path(self, other_path: str) -> bool:
+        """Whether ``other_path`` is this category or one of its descendants."""
+        return bool(self.path) and other_path.startswith(self.path)
+
+    def clean(self) -> None:
+        if self.parent_id and self.pk and self.is_descendant_path(self.parent.path):
+            raise ValidationError({"parent": "لا يمكن نقل الفئة إلى إحدى فئاتها الفرعية."})
+
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        # path and depth are only written by _move_subtree, from the stored paths:
+        # an instance loaded before an ancestor moved holds an outdated path.
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) - self.PATH_FIELDS
+            if "parent" not in update_fields:
+                super().save(*args, **kwargs)
+                return
+        elif not self._state.adding:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.PATH_FIELDS
+            ]
+        parent_path = ""
+        if self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list("path", flat=True).get()
+        old_path = Category.objects.filter(pk=self.pk).values_list("path", flat=True).first() if self.pk else ""
+        if old_path and parent_path.startswith(old_path):
+            raise ValidationError("لا يمكن نقل الفئة إلى إحدى فئاتها الفرعية.")
+        super().save(*args, **kwargs)
+        self._move_subtree(old_path or "", f"{parent_path or '/'}{self.pk}/")
+
+    def _move_subtree(self, old_path: str, new_path: str) -> None:
+        """Rewrite this category's path and, in one UPDATE, the paths of its descendants."""
+        new_depth = new_path.count("/") - 2
+        if old_path == new_path:
+            self.path = new_path
+            self.depth = new_depth
+            return
+        Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                path=Concat(models.Value(new_path), Substr("path", len(old_path) + 1)),
+                depth=F("depth") + (new_depth - (old_path.count("/") - 2)),
+            )
+        self.path = new_path
+        self.depth = new_depth
+
 
 class Brand(TimeStampedModel):
     name = models.CharField(max_length=255, unique=True)
@@ -66,13 +134,183 @@ class Product(TimeStampedModel):
     specs = models.JSONField(blank=True, null=True)
     category = models.ForeignKey(Category, related_name="products", on_delete=models.PROTECT)
     brand = models.ForeignKey(Brand, related_name="products", on_delete=models.SET_NULL, null=True, blank=True)
+    search_document = models.TextField(blank=True, editable=False)
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    SEARCH_SOURCE_FIELDS = frozenset({"name_ar", "sku", "specs", "category", "brand"})
+    FEED_FIELDS = frozenset({"name_ar", "price", "stock", "category", "brand", "images", "specs", "is_active"})
 
     class Meta:
         ordering = ["name_ar"]
+        indexes = [models.Index(fields=["name_ar", "id"], name="shop_product_name_id_idx")]
 
     def __str__(self) -> str:  # pragma: no cover - simple display
         return f"{self.name_ar} ({self.sku})"
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        extra_fields = set()
+        if update_fields is None or self.SEARCH_SOURCE_FIELDS.intersection(update_fields):
+            self.search_document = self.build_search_document()
+            extra_fields.add("search_document")
+        if update_fields is None or self.FEED_FIELDS.intersection(update_fields):
+            # content_hash describes the last imported feed record, so a manual edit
+            # makes the next delta sync rewrite the product.
+            self.content_hash = ""
+            extra_fields.add("content_hash")
+        if update_fields is not None and extra_fields:
+            kwargs["update_fields"] = {*update_fields, *extra_fields}
+        elif update_fields is None and not self._state.adding:
+            # reserved only moves through conditional UPDATEs (holds, releases and
+            # confirmations); writing back a stale copy would undo concurrent ones.
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields if not field.primary_key and field.name != "reserved"
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def available_stock(self) -> int:
+        return max(self.stock - self.reserved, 0)
+
+    def build_search_document(self) -> str:
+        return build_product_search_document(
+            self.name_ar,
+            self.sku,
+            self.brand.name if self.brand_id else None,
+            self.category.name_ar if self.category_id else None,
+            self.specs,
+        )
+
+
+def _lock_products(product_ids: Iterable[int]) -> None:
+    # Taking row locks in SKU order keeps concurrent multi-item moves from deadlocking.
+    list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by("sku").values_list("pk", flat=True))
+
+
+def _stock_delta(quantities: Dict[int, int]) -> Case:
+    return Case(
+        *[When(pk=product_id, then=models.Value(qty)) for product_id, qty in quantities.items()],
+        default=models.Value(0),
+        output_field=models.IntegerField(),
+    )
+
+
+def _short_skus(quantities: Dict[int, int], held: Optional[Dict[int, int]] = None) -> str:
+    held = held or {}
+    rows = Product.objects.filter(pk__in=quantities).order_by("sku").values_list("pk", "sku", "stock", "reserved")
+    return "، ".join(
+        sku for pk, sku, stock, reserved in rows if stock - reserved + held.get(pk, 0) < quantities[pk]
+    )
+
+
+def deduct_stock(quantities: Dict[int, int], held: Optional[Dict[int, int]] = None) -> None:
+    """Subtract ``{product_id: qty}`` from stock in one conditional UPDATE.
+
+    ``held`` maps product ids to units the order already had reserved; they
+    count as available and leave ``reserved`` in the same statement. Must run
+    inside a transaction: rows are only decremented where enough unreserved
+    stock is left, and a short row count raises so the caller rolls back.
+    """
+    if not quantities:
+        return
+    held = held or {}
+    _lock_products(quantities)
+    enough = Q()
+    for product_id, qty in quantities.items():
+        enough |= Q(pk=product_id, stock__gte=F("reserved") - held.get(product_id, 0) + qty)
+    changes = {"stock": F("stock") - _stock_delta(quantities), "updated_at": timezone.now()}
+    if held:
+        changes["reserved"] = F("reserved") - _stock_delta(held)
+    savepoint = transaction.savepoint()
+    if Product.objects.filter(enough).update(**changes) != len(quantities):
+        transaction.savepoint_rollback(savepoint)
+        raise ValidationError(f"المخزون غير كافٍ للمنتج {_short_skus(quantities, held)}.")
+    transaction.savepoint_commit(savepoint)
+
+
+def restore_stock(quantities: Dict[int, int]) -> None:
+    if not quantities:
+        return
+    _lock_products(quantities)
+    Product.objects.filter(pk__in=quantities).update(
+        stock=F("stock") + _stock_delta(quantities), updated_at=timezone.now()
+    )
+
+
+def reserve_stock(order: "StandardOrder", quantities: Dict[int, int]) -> None:
+    """Hold ``{product_id: qty}`` for ``order`` for ``STOCK_RESERVATION_TTL_MINUTES``.
+
+    The hold is a conditional increment of ``Product.reserved`` plus one ledger
+    row per product, so the product rows are only locked from here to commit.
+    """
+    if not quantities:
+        return
+    _lock_products(quantities)
+    enough = Q()
+    for product_id, qty in quantities.items():
+        enough |= Q(pk=product_id, stock__gte=F("reserved") + qty)
+    savepoint = transaction.savepoint()
+    held = Product.objects.filter(enough).update(
+        reserved=F("reserved") + _stock_delta(quantities), updated_at=timezone.now()
+    )
+    if held != len(quantities):
+        transaction.savepoint_rollback(savepoint)
+        raise ValidationError(f"المخزون غير كافٍ للمنتج {_short_skus(quantities)}.")
+    transaction.savepoint_commit(savepoint)
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_TTL_MINUTES)
+    StockReservation.objects.bulk_create(
+        [
+            StockReservation(order=order, product_id=product_id, qty=qty, expires_at=expires_at)
+            for product_id, qty in quantities.items()
+        ]
+    )
+
+
+def _claim_holds(holds: models.QuerySet) -> Dict[int, int]:
+    """Mark active holds in ``holds`` released and return the units claimed per product.
+
+    The ``released_at IS NULL`` check is part of the UPDATE, so a hold consumed
+    by a confirmation and swept as expired at the same time is counted once.
+    """
+    released_at = timezone.now()
+    ids = list(holds.filter(released_at__isnull=True).values_list("pk", flat=True))
+    if not ids:
+        return {}
+    StockReservation.objects.filter(pk__in=ids, released_at__isnull=True).update(released_at=released_at)
+    claimed = (
+        StockReservation.objects.filter(pk__in=ids, released_at=released_at)
+        .values("product_id")
+        .annotate(total=Sum("qty"))
+        .values_list("product_id", "total")
+    )
+    return dict(claimed)
+
+
+def release_reservations(holds: models.QuerySet) -> int:
+    """Release the active holds in ``holds`` and return the number of units freed."""
+    claimed = _claim_holds(holds)
+    if not claimed:
+        return 0
+    _lock_products(claimed)
+    Product.objects.filter(pk__in=claimed).update(
+        reserved=F("reserved") - _stock_delta(claimed), updated_at=timezone.now()
+    )
+    return sum(claimed.values())
+
+
+def release_expired_reservations(batch_size: int = 1000) -> int:
+    with transaction.atomic():
+        ids = list(
+            StockReservation.objects.filter(released_at__isnull=True, expires_at__lte=timezone.now())
+            .order_by("expires_at")
+            .select_for_update(skip_locked=True)
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        return release_reservations(StockReservation.objects.filter(pk__in=ids))
+
 
 class StandardOrderStatus(models.TextChoices):
     NEW = "new", _("جديد")
@@ -91,18 +329,22 @@ class StandardOrder(TimeStampedModel):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["-created_at", "id"], name="shop_stdorder_created_id_idx")]
 
     def __str__(self) -> str:  # pragma: no cover
         return f"Order #{self.pk}"
 
     @transaction.atomic
     def confirm(self) -> None:
-        if self.status != StandardOrderStatus.NEW:
+        if self.status != StandardOrderStatus.NEW or not self._transition(
+            {StandardOrderStatus.NEW}, StandardOrderStatus.CONFIRMED
+        ):
             raise ValidationError("لا يمكن تأكيد الطلب في هذه الحالة.")
-        self._ensure_stock()
-        self._apply_stock_deduction()
-        self.status = StandardOrderStatus.CONFIRMED
-        self.save(update_fields=["status"])
+        try:
+            deduct_stock(self._item_quantities(), held=_claim_holds(self.reservations.all()))
+        except ValidationError:
+            self.status = StandardOrderStatus.NEW
+            raise
 
     def mark_ready(self) -> None:
         if self.status != StandardOrderStatus.CONFIRMED:
@@ -116,32 +358,33 @@ class StandardOrder(TimeStampedModel):
         self.status = StandardOrderStatus.COMPLETED
         self.save(update_fields=["status"])
 
+    @transaction.atomic
     def cancel(self) -> None:
         if self.status == StandardOrderStatus.CANCELLED:
             return
-        if self.status in {StandardOrderStatus.CONFIRMED, StandardOrderStatus.READY}:
-            self._restore_stock()
-        self.status = StandardOrderStatus.CANCELLED
-        self.save(update_fields=["status"])
-
-    def _ensure_stock(self) -> None:
-        for item in self.items.select_related("product"):
-            if item.product.stock < item.qty:
-                raise ValidationError(f"المخزون غير كافٍ للمنتج {item.product.sku}.")
-
-    def _apply_stock_deduction(self) -> None:
-        for item in self.items.select_related("product").select_for_update():
-            product = item.product
-            if product.stock < item.qty:
-                raise ValidationError(f"المخزون غير كافٍ للمنتج {product.sku}.")
-            product.stock -= item.qty
-            product.save(update_fields=["stock"])
-
-    def _restore_stock(self) -> None:
-        for item in self.items.select_related("product").select_for_update():
-            product = item.product
-            product.stock += item.qty
-            product.save(update_fields=["stock"])
+        if self._transition({StandardOrderStatus.CONFIRMED, StandardOrderStatus.READY}, StandardOrderStatus.CANCELLED):
+            restore_stock(self._item_quantities())
+        elif self._transition({StandardOrderStatus.NEW, StandardOrderStatus.COMPLETED}, StandardOrderStatus.CANCELLED):
+            release_reservations(self.reservations.all())
+
+    def _transition(self, from_statuses: Iterable[str], to_status: str) -> bool:
+        """Move to ``to_status`` only if the stored status is still one of ``from_statuses``.
+
+        The check happens in the UPDATE itself, so two concurrent confirmations
+        or cancellations cannot both move stock.
+        """
+        now = timezone.now()
+        updated = StandardOrder.objects.filter(pk=self.pk, status__in=list(from_statuses)).update(
+            status=to_status, updated_at=now
+        )
+        if updated:
+            self.status = to_status
+            self.updated_at = now
+        return bool(updated)
+
+    def _item_quantities(self) -> Dict[int, int]:
+        # Summed like _batch_quantities, so a repeated product line could never be dropped.
+        return dict(self.items.values("product_id").annotate(total=Sum("qty")).values_list("product_id", "total"))
 
     def recalculate_total(self) -> None:
         total = sum(item.total_price for item in self.items.all())
@@ -166,6 +409,120 @@ class StandardOrderItem(models.Model):
         return f"{self.product} x {self.qty}"
 
 
+class StockReservation(TimeStampedModel):
+    order = models.ForeignKey(StandardOrder, related_name="reservations", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="reservations", on_delete=models.CASCADE)
+    qty = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["expires_at"],
+                name="shop_reservation_active_idx",
+                condition=Q(released_at__isnull=True),
+            )
+        ]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"{self.product} x {self.qty} (Order #{self.order_id})"
+
+
+STANDARD_ORDER_TRANSITIONS = {
+    StandardOrderStatus.CONFIRMED: ({StandardOrderStatus.NEW}, "لا يمكن تأكيد الطلب في هذه الحالة."),
+    StandardOrderStatus.READY: ({StandardOrderStatus.CONFIRMED}, "لا يمكن جعل الطلب جاهزاً إلا بعد التأكيد."),
+    StandardOrderStatus.COMPLETED: (
+        {StandardOrderStatus.READY, StandardOrderStatus.CONFIRMED},
+        "لا يمكن إكمال الطلب في هذه الحالة.",
+    ),
+    StandardOrderStatus.CANCELLED: (
+        {
+            StandardOrderStatus.NEW,
+            StandardOrderStatus.CONFIRMED,
+            StandardOrderStatus.READY,
+            StandardOrderStatus.COMPLETED,
+        },
+        "",
+    ),
+}
+
+
+def transition_standard_orders(order_ids: Iterable[int], to_status: str) -> Dict[int, Optional[str]]:
+    """Move a batch of standard orders to ``to_status`` in one transaction.
+
+    Returns ``{order_id: error}``, with ``None`` for orders that moved (or were
+    already cancelled). The orders are locked and checked against
+    ``STANDARD_ORDER_TRANSITIONS`` in memory, the status change is one UPDATE,
+    and stock moves are summed over the batch into single statements. When the
+    combined deduction of a confirm batch fails, the orders are confirmed one
+    by one so that only the short ones are rejected.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    allowed, error = STANDARD_ORDER_TRANSITIONS[to_status]
+    with transaction.atomic():
+        statuses = dict(
+            StandardOrder.objects.select_for_update().filter(pk__in=order_ids).order_by("pk").values_list("pk", "status")
+        )
+        results: Dict[int, Optional[str]] = {
+            pk: None if pk in statuses else "الطلب غير موجود." for pk in order_ids
+        }
+        eligible = []
+        for pk, status in statuses.items():
+            if status in allowed:
+                eligible.append(pk)
+            elif not status == to_status == StandardOrderStatus.CANCELLED:
+                results[pk] = error
+        if not eligible:
+            return results
+
+        if to_status == StandardOrderStatus.CONFIRMED:
+            _confirm_batch(eligible, results)
+        elif to_status == StandardOrderStatus.CANCELLED:
+            _set_batch_status(eligible, to_status)
+            moved = [pk for pk in eligible if statuses[pk] in {StandardOrderStatus.CONFIRMED, StandardOrderStatus.READY}]
+            restore_stock(_batch_quantities(moved))
+            release_reservations(StockReservation.objects.filter(order_id__in=set(eligible) - set(moved)))
+        else:
+            _set_batch_status(eligible, to_status)
+    return results
+
+
+def _set_batch_status(order_ids: Iterable[int], to_status: str) -> None:
+    StandardOrder.objects.filter(pk__in=order_ids).update(status=to_status, updated_at=timezone.now())
+
+
+def _batch_quantities(order_ids: Iterable[int]) -> Dict[int, int]:
+    rows = (
+        StandardOrderItem.objects.filter(order_id__in=order_ids)
+        .values("product_id")
+        .annotate(total=Sum("qty"))
+        .values_list("product_id", "total")
+    )
+    return dict(rows)
+
+
+def _confirm_batch(order_ids: List[int], results: Dict[int, Optional[str]]) -> None:
+    savepoint = transaction.savepoint()
+    try:
+        _set_batch_status(order_ids, StandardOrderStatus.CONFIRMED)
+        deduct_stock(
+            _batch_quantities(order_ids),
+            held=_claim_holds(StockReservation.objects.filter(order_id__in=order_ids)),
+        )
+    except ValidationError:
+        transaction.savepoint_rollback(savepoint)
+    else:
+        transaction.savepoint_commit(savepoint)
+        return
+    for order in StandardOrder.objects.filter(pk__in=order_ids).order_by("pk"):
+        try:
+            order.confirm()
+        except ValidationError as exc:
+            results[order.pk] = exc.message
+
+
 class CustomOrderStatus(models.TextChoices):
     NEW = "new", _("طلب جديد")
     SURVEY_SCHEDULED = "site_survey_scheduled", _("تم جدولة الزيارة")
@@ -194,9 +551,11 @@ class CustomOrder(TimeStampedModel):
     quote_total = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
     currency = models.CharField(max_length=8, default="JOD")
     quote_pdf_url = models.URLField(blank=True)
+    quote_pdf_fingerprint = models.CharField(max_length=64, blank=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["-created_at", "id"], name="shop_custorder_created_id_idx")]
 
     def __str__(self) -> str:  # pragma: no cover
         return f"CustomOrder #{self.pk}"
@@ -243,3 +602,29 @@ class CustomOrderLine(models.Model):
 
     def __str__(self) -> str:  # pragma: no cover
         return f"{self.name} ({self.item_type})"
+
+
+class QuotePdfJobStatus(models.TextChoices):
+    PENDING = "pending", _("بانتظار المعالجة")
+    RUNNING = "running", _("قيد المعالجة")
+    DONE = "done", _("جاهز")
+    FAILED = "failed", _("فشل")
+
+
+class QuotePdfJob(TimeStampedModel):
+    custom_order = models.ForeignKey(CustomOrder, related_name="quote_pdf_jobs", on_delete=models.CASCADE)
+    status = models.CharField(max_length=16, choices=QuotePdfJobStatus.choices, default=QuotePdfJobStatus.PENDING)
+    # Quote fingerprint when the job was queued; only a pending job for the same quote is reused.
+    fingerprint = models.CharField(max_length=64, blank=True)
+    quote_pdf_url = models.URLField(blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"], name="shop_quotejob_status_idx")]
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"QuotePdfJob #{self.pk} ({self.status})"
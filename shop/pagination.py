@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import List, Optional, Sequence, Tuple
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination over a composite, unique ordering.
+
+    Views declare ``keyset_ordering`` (for example ``("-created_at", "id")``).
+    The cursor carries the ordering values of the boundary row, so each page is
+    a single indexed range scan: no OFFSET and no COUNT(*).
+    """
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = "مؤشر الصفحة غير صالح"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(view.keyset_ordering)
+        self.model = queryset.model
+        values, reverse = self.decode_cursor(request)
+
+        ordering = self._reversed(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        self.next_values = self._row_values(rows[-1]) if rows and has_next else None
+        self.previous_values = self._row_values(rows[0]) if rows and has_previous else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.encode_cursor(self.next_values, reverse=False),
+                "previous": self.encode_cursor(self.previous_values, reverse=True),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def decode_cursor(self, request) -> Tuple[Optional[List], bool]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode("ascii")).decode("utf-8"))
+            raw_values = payload["v"]
+            if len(raw_values) != len(self.ordering):
+                raise ValueError("cursor does not match ordering")
+            values = [
+                self.model._meta.get_field(name.lstrip("-")).to_python(value)
+                for name, value in zip(self.ordering, raw_values)
+            ]
+            return values, bool(payload.get("r"))
+        except Exception as exc:  # pylint: disable=broad-except
+            raise NotFound(self.invalid_cursor_message) from exc
+
+    def encode_cursor(self, values: Optional[List], reverse: bool) -> Optional[str]:
+        if values is None:
+            return None
+        payload = json.dumps({"v": values, "r": int(reverse)}, default=str, separators=(",", ":"))
+        encoded = urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _row_values(self, row) -> List:
+        values = []
+        for name in self.ordering:
+            value = getattr(row, name.lstrip("-"))
+            values.append(value.isoformat() if hasattr(value, "isoformat") else value)
+        return values
+
+    @staticmethod
+    def _reversed(ordering: Sequence[str]) -> Tuple[str, ...]:
+        return tuple(name[1:] if name.startswith("-") else f"-{name}" for name in ordering)
+
+    @staticmethod
+    def _after(ordering: Sequence[str], values: Sequence) -> Q:
+        """Lexicographic "comes after" over the ordering, e.g. a > x OR (a = x AND b > y)."""
+        condition = Q()
+        for index in range(len(ordering) - 1, -1, -1):
+            name = ordering[index].lstrip("-")
+            lookup = "lt" if ordering[index].startswith("-") else "gt"
+            step = Q(**{f"{name}__{lookup}": values[index]})
+            if index < len(ordering) - 1:
+                step |= Q(**{name: values[index]}) & condition
+            condition = step
+        return condition
+
+
+class OptInKeysetPagination(PageNumberPagination):
+    """Page-number pagination unless the client asks for keyset pages.
+
+    ``?paginate=cursor`` (or any request carrying ``cursor``) switches views
+    that declare ``keyset_ordering`` to :class:`KeysetPagination`, so existing
+    clients keep their ``count``/``page`` responses.
+    """
+
+    mode_query_param = "paginate"
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self._wants_keyset(request, view):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def _wants_keyset(self, request, view) -> bool:
+        if not getattr(view, "keyset_ordering", None):
+            return False
+        params = request.query_params
+        return params.get(self.mode_query_param) == "cursor" or self.keyset_class.cursor_query_param in params
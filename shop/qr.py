@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import base64
+import io
+
+import qrcode
+from qrcode.image.svg import SvgPathImage
+
+QR_FORMAT_PNG = "png"
+QR_FORMAT_SVG = "svg"
+
+
+def render_qr_code(data: str, color: str, qr_format: str = QR_FORMAT_PNG) -> str:
+    """Return the QR code for ``data``: a base64 PNG, or inline markup for ``QR_FORMAT_SVG``."""
+    qr = qrcode.QRCode(version=1, box_size=8, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    if qr_format == QR_FORMAT_SVG:
+        img = qr.make_image(image_factory=SvgPathImage)
+        img.path.set("fill", color)
+        return img.to_string(encoding="unicode")
+    buffer = io.BytesIO()
+    img = qr.make_image(fill_color=color, back_color="white")
+    img.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
@@ -0,0 +1,225 @@
+"""Sales and operations reports aggregated in the database.
+
+Every report is a single grouped query; ranks, running totals and shares are
+window functions over the grouped rows, so no order or item is loaded into
+Python. Databases outside ``GROUPED_WINDOW_VENDORS`` get the same columns
+computed in Python over the grouped rows. Order reports are bounded by a ``date_from``/``date_to`` period (the
+last 30 days by default), which the ``created_at`` indexes serve however long
+the history is.
+
+Results are cached per time bucket of ``REPORTS_CACHE_SECONDS``: the key holds
+the bucket number, so a report is recomputed at most once per bucket and
+stale buckets simply expire. ``REPORTS_CACHE_SECONDS=0`` turns the cache off.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, FloatField, Func, IntegerField, Q, Sum, Window
+from django.db.models.functions import Cast, Rank, TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ParseError
+
+from .models import CustomOrder, CustomOrderStatus, Product, StandardOrder, StandardOrderItem, StandardOrderStatus
+
+DEFAULT_PERIOD_DAYS = 30
+DEFAULT_TOP_SKUS = 20
+MAX_REPORT_ROWS = 500
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+# Vendors on which GroupedWindow's GROUP BY handling has been checked.
+GROUPED_WINDOW_VENDORS = frozenset({"postgresql", "sqlite"})
+
+
+class WindowSum(Func):
+    """``SUM(<aggregate>)`` for use in a window; the ORM refuses ``Sum(Sum(...))``."""
+
+    function = "SUM"
+    window_compatible = True
+    output_field = MONEY
+
+
+class GroupedWindow(Window):
+    """Window over the rows of a ``values().annotate()`` GROUP BY.
+
+    A plain Window annotation is added to the GROUP BY itself; flagging it as an
+    aggregate makes the ORM group by its PARTITION BY/ORDER BY columns instead.
+    """
+
+    contains_aggregate = True
+
+
+def report_period(query_params) -> Tuple[date, date]:
+    """Inclusive ``(date_from, date_to)`` from ``YYYY-MM-DD`` params, in local dates."""
+    date_to = _parse_date_param(query_params, "date_to") or timezone.localdate()
+    date_from = _parse_date_param(query_params, "date_from") or date_to - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    if date_from > date_to:
+        raise ParseError("يجب أن يسبق تاريخ البداية تاريخ النهاية")
+    return date_from, date_to
+
+
+def report_int(query_params, name: str, default: int, minimum: int = 0, maximum: int = MAX_REPORT_ROWS) -> int:
+    try:
+        value = int(query_params.get(name, default))
+    except (TypeError, ValueError) as exc:
+        raise ParseError(f"قيمة {name} غير صالحة") from exc
+    return max(minimum, min(value, maximum))
+
+
+def _parse_date_param(query_params, name: str) -> Optional[date]:
+    raw = query_params.get(name)
+    if not raw:
+        return None
+    try:
+        parsed = parse_date(raw)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ParseError(f"تاريخ غير صالح في {name}")
+    return parsed
+
+
+def _created_between(date_from: date, date_to: date, prefix: str = "") -> Q:
+    start = timezone.make_aware(datetime.combine(date_from, dt_time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), dt_time.min))
+    return Q(**{f"{prefix}created_at__gte": start, f"{prefix}created_at__lt": end})
+
+
+def _counted_orders(date_from: date, date_to: date, prefix: str = "") -> Q:
+    return _created_between(date_from, date_to, prefix) & ~Q(**{f"{prefix}status": StandardOrderStatus.CANCELLED})
+
+
+def revenue_by_day(date_from: date, date_to: date) -> List[Dict]:
+    """Non-cancelled standard-order revenue per local day and customer city.
+
+    ``running_revenue`` accumulates each city's revenue over the period.
+    """
+    rows = (
+        StandardOrder.objects.filter(_counted_orders(date_from, date_to))
+        .annotate(day=TruncDate("created_at"), city=F("customer__city"))
+        .values("day", "city")
+        .annotate(orders=Count("pk"), revenue=Sum("total"))
+        .order_by("day", "city")
+    )
+    if not _grouped_windows(rows):
+        return _with_running_revenue(list(rows))
+    rows = rows.annotate(
+        running_revenue=GroupedWindow(
+            WindowSum(Sum("total")),
+            partition_by=[F("customer__city")],
+            order_by=TruncDate("created_at").asc(),
+        )
+    )
+    return list(rows)
+
+
+def top_skus(date_from: date, date_to: date, limit: int = DEFAULT_TOP_SKUS) -> List[Dict]:
+    """Best-selling SKUs of non-cancelled orders, ranked by revenue."""
+    line_total = ExpressionWrapper(F("qty") * F("unit_price"), output_field=MONEY)
+    rows = (
+        StandardOrderItem.objects.filter(_counted_orders(date_from, date_to, prefix="order__"))
+        .values("product_id")
+        .annotate(
+            sku=F("product__sku"),
+            name_ar=F("product__name_ar"),
+            orders=Count("order_id", distinct=True),
+            units=Sum("qty"),
+            revenue=Sum(line_total),
+        )
+    )
+    if not _grouped_windows(rows):
+        return _with_revenue_ranks(list(rows))[:limit]
+    rows = rows.annotate(
+        revenue_share=ExpressionWrapper(
+            Cast(Sum(line_total), FloatField()) * 100 / GroupedWindow(WindowSum(Sum(line_total))),
+            output_field=FloatField(),
+        ),
+        rank=GroupedWindow(Rank(), order_by=Sum(line_total).desc()),
+    ).order_by("rank", "sku")
+    return list(rows[:limit])
+
+
+def _grouped_windows(queryset) -> bool:
+    return connections[queryset.db].vendor in GROUPED_WINDOW_VENDORS
+
+
+def _with_running_revenue(rows: List[Dict]) -> List[Dict]:
+    # Rows come ordered by day, so each city's sum so far is its running total.
+    running: Dict[str, Decimal] = {}
+    for row in rows:
+        running[row["city"]] = running.get(row["city"], Decimal("0")) + row["revenue"]
+        row["running_revenue"] = running[row["city"]]
+    return rows
+
+
+def _with_revenue_ranks(rows: List[Dict]) -> List[Dict]:
+    total = sum((row["revenue"] for row in rows), Decimal("0"))
+    rows.sort(key=lambda row: row["revenue"], reverse=True)
+    for index, row in enumerate(rows):
+        # Ties share a rank and leave a gap after them, as RANK() does.
+        tied = index and rows[index - 1]["revenue"] == row["revenue"]
+        row["rank"] = rows[index - 1]["rank"] if tied else index + 1
+        row["revenue_share"] = float(row["revenue"]) * 100 / float(total) if total else None
+    rows.sort(key=lambda row: (row["rank"], row["sku"]))
+    return rows
+
+
+def custom_order_funnel(date_from: date, date_to: date) -> List[Dict]:
+    """Custom orders created in the period, counted by current status in workflow order."""
+    counts = dict(
+        CustomOrder.objects.filter(_created_between(date_from, date_to))
+        .values("status")
+        .annotate(count=Count("pk"))
+        .values_list("status", "count")
+    )
+    total = sum(counts.values())
+    return [
+        {
+            "status": status,
+            "label": str(label),
+            "count": counts.get(status, 0),
+            "share": round(counts.get(status, 0) * 100 / total, 2) if total else 0,
+        }
+        for status, label in CustomOrderStatus.choices
+    ]
+
+
+def low_stock_products(threshold: int, limit: int) -> List[Dict]:
+    """Active products whose unreserved stock is at or below ``threshold``, scarcest first."""
+    available = ExpressionWrapper(F("stock") - F("reserved"), output_field=IntegerField())
+    rows = (
+        Product.objects.filter(is_active=True)
+        .annotate(available=available)
+        .filter(available__lte=threshold)
+        .order_by("available", "sku")
+        .values("id", "sku", "name_ar", "stock", "reserved", "available", category_name=F("category__name_ar"))
+    )
+    return list(rows[:limit])
+
+
+def reports_cache():
+    return caches[settings.REPORTS_CACHE_ALIAS]
+
+
+def cached_report(name: str, params: Tuple, compute: Callable[[], object]):
+    bucket_seconds = settings.REPORTS_CACHE_SECONDS
+    if bucket_seconds <= 0:
+        return compute()
+    bucket = int(time.time()) // bucket_seconds
+    digest = hashlib.sha256(repr(params).encode("utf-8")).hexdigest()[:32]
+    key = f"reports:{name}:{bucket}:{digest}"
+    cache = reports_cache()
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, bucket_seconds)
+    return data
@@ -0,0 +1,150 @@
+"""Ranked product search over ``Product.search_document``.
+
+PostgreSQL matches a ``to_tsvector('simple', search_document)`` expression that
+is backed by the ``shop_product_search_gin`` index. Other databases use an
+in-process inverted index. Both sides see text folded by
+:func:`shop.utils.normalize_arabic`, so queries and documents agree on alef,
+hamza and taa marbuta variants.
+"""
+from __future__ import annotations
+
+import bisect
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connections
+from django.db.models import Case, Count, FloatField, Func, Max, QuerySet, Value, When
+
+from .models import Product
+from .utils import normalize_arabic
+
+SEARCH_MAX_RESULTS = 1000
+# Index matches are checked against the caller's queryset this many at a time.
+SEARCH_FILTER_CHUNK = 1000
+
+
+class SimpleTsVector(Func):
+    """``to_tsvector('simple', ...)`` spelled exactly like the GIN index expression."""
+
+    function = "to_tsvector"
+    template = "%(function)s('simple'::regconfig, %(expressions)s)"
+    output_field = SearchVectorField()
+
+
+def query_tokens(query: str) -> List[str]:
+    return normalize_arabic(query).split()
+
+
+def search_products(queryset: QuerySet, query: str) -> QuerySet:
+    """Filter ``queryset`` to products matching every token of ``query``, best matches first.
+
+    Tokens match as prefixes, so partially typed words still find products.
+    """
+    tokens = query_tokens(query)
+    if not tokens:
+        return queryset
+    if connections[queryset.db].vendor == "postgresql":
+        return _search_postgres(queryset, tokens)
+    return _search_in_process(queryset, tokens)
+
+
+def _search_postgres(queryset: QuerySet, tokens: List[str]) -> QuerySet:
+    ts_query = SearchQuery(" & ".join(f"{token}:*" for token in tokens), config="simple", search_type="raw")
+    vector = SimpleTsVector("search_document")
+    return (
+        queryset.annotate(search_vector=vector, search_rank=SearchRank(vector, ts_query))
+        .filter(search_vector=ts_query)
+        .order_by("-search_rank", "name_ar", "id")
+    )
+
+
+def _search_in_process(queryset: QuerySet, tokens: List[str]) -> QuerySet:
+    ranked = _visible_matches(queryset, product_search_index.search(tokens, using=queryset.db))
+    if not ranked:
+        return queryset.none()
+    ids_by_score: Dict[float, List[int]] = defaultdict(list)
+    for product_id, score in ranked:
+        ids_by_score[score].append(product_id)
+    rank = Case(
+        *[When(pk__in=ids, then=Value(score)) for score, ids in ids_by_score.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    return (
+        queryset.filter(pk__in=[product_id for product_id, _ in ranked])
+        .annotate(search_rank=rank)
+        .order_by("-search_rank", "name_ar", "id")
+    )
+
+
+def _visible_matches(queryset: QuerySet, ranked: List[Tuple[int, float]]) -> List[Tuple[int, float]]:
+    """The first ``SEARCH_MAX_RESULTS`` of ``ranked`` that ``queryset`` admits.
+
+    The index covers the whole catalog, so the cut is made only after the
+    caller's filters (active products, category) have been applied.
+    """
+    visible: List[Tuple[int, float]] = []
+    unfiltered = queryset.order_by()
+    for start in range(0, len(ranked), SEARCH_FILTER_CHUNK):
+        chunk = ranked[start : start + SEARCH_FILTER_CHUNK]
+        admitted = set(unfiltered.filter(pk__in=[product_id for product_id, _ in chunk]).values_list("pk", flat=True))
+        visible.extend(match for match in chunk if match[0] in admitted)
+        if len(visible) >= SEARCH_MAX_RESULTS:
+            break
+    return visible[:SEARCH_MAX_RESULTS]
+
+
+class ProductSearchIndex:
+    """Inverted index of search-document tokens for databases without full-text search.
+
+    The index is rebuilt when the product count or latest ``updated_at``
+    changes, which costs one aggregate query per search.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._state: Optional[Tuple] = None
+        self._postings: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = []
+
+    def search(self, tokens: List[str], using: str = "default") -> List[Tuple[int, float]]:
+        self._refresh(using)
+        scores: Optional[Dict[int, float]] = None
+        for token in tokens:
+            token_scores: Dict[int, float] = {}
+            start = bisect.bisect_left(self._vocabulary, token)
+            for term in self._vocabulary[start:]:
+                if not term.startswith(token):
+                    break
+                weight = 2.0 if term == token else 1.0
+                for product_id in self._postings[term]:
+                    if token_scores.get(product_id, 0.0) < weight:
+                        token_scores[product_id] = weight
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: score + token_scores[pid] for pid, score in scores.items() if pid in token_scores}
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _refresh(self, using: str) -> None:
+        state = tuple(Product.objects.using(using).aggregate(count=Count("id"), latest=Max("updated_at")).values())
+        if state == self._state:
+            return
+        with self._lock:
+            if state == self._state:
+                return
+            postings: Dict[str, Set[int]] = defaultdict(set)
+            documents = Product.objects.using(using).values_list("id", "search_document")
+            for product_id, document in documents.iterator(chunk_size=5000):
+                for term in document.split():
+                    postings[term].add(product_id)
+            self._postings = dict(postings)
+            self._vocabulary = sorted(postings)
+            self._state = state
+
+
+product_search_index = ProductSearchIndex()
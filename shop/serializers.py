@@ -3,10 +3,12 @@ from __future__ import annotations
 from decimal import Decimal
 from typing import List
 
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
 from rest_framework import serializers
 
 from .models import (
+    STANDARD_ORDER_TRANSITIONS,
     Brand,
     Category,
     CustomOrder,
@@ -14,12 +16,16 @@ from .models import (
     CustomOrderStatus,
     Customer,
     Product,
+    QuotePdfJob,
     StandardOrder,
     StandardOrderItem,
     StandardOrderStatus,
+    reserve_stock,
 )
 from .utils import normalize_jordan_phone
 
+BULK_STATUS_MAX_ORDERS = 500
+
 
 class CustomerSerializer(serializers.ModelSerializer):
     phone = serializers.CharField()
@@ -58,7 +64,13 @@ class CustomerSerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ["id", "name_ar", "parent"]
+        fields = ["id", "name_ar", "parent", "path", "depth"]
+        read_only_fields = ["path", "depth"]
+
+    def validate_parent(self, value):
+        if value is not None and self.instance is not None and self.instance.is_descendant_path(value.path):
+            raise serializers.ValidationError("لا يمكن نقل الفئة إلى إحدى فئاتها الفرعية.")
+        return value
 
 
 class BrandSerializer(serializers.ModelSerializer):
@@ -70,6 +82,8 @@ class BrandSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
     brand = serializers.PrimaryKeyRelatedField(queryset=Brand.objects.all(), allow_null=True, required=False)
+    # Stock not held by pending orders; what a new order can still get.
+    available_stock = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Product
@@ -79,6 +93,7 @@ class ProductSerializer(serializers.ModelSerializer):
             "sku",
             "price",
             "stock",
+            "available_stock",
             "is_active",
             "images",
             "specs",
@@ -137,43 +152,87 @@ class StandardOrderSerializer(serializers.ModelSerializer):
         customer_serializer.is_valid(raise_exception=True)
         customer = customer_serializer.save()
 
+        seen_skus = set()
+        for item in items_data:
+            sku = item.get("sku")
+            if sku in seen_skus:
+                raise serializers.ValidationError({"items": f"تم تكرار المنتج {sku}"})
+            seen_skus.add(sku)
+
         with transaction.atomic():
-            order = StandardOrder.objects.create(customer=customer, pickup_notes=validated_data.get("pickup_notes", ""))
+            products = Product.objects.filter(is_active=True).in_bulk(seen_skus, field_name="sku")
             total = Decimal("0.00")
-            seen_skus = set()
+            order_items = []
             for item in items_data:
                 sku = item.get("sku")
-                if sku in seen_skus:
-                    raise serializers.ValidationError({"items": f"تم تكرار المنتج {sku}"})
-                seen_skus.add(sku)
                 qty = int(item.get("qty", 0))
-                try:
-                    product = Product.objects.get(sku=sku, is_active=True)
-                except Product.DoesNotExist as exc:
-                    raise serializers.ValidationError({"items": f"المنتج برقم {sku} غير موجود"}) from exc
-                if product.stock < qty:
+                product = products.get(sku)
+                if product is None:
+                    raise serializers.ValidationError({"items": f"المنتج برقم {sku} غير موجود"})
+                if product.available_stock < qty:
                     raise serializers.ValidationError({"items": f"المخزون غير كافٍ للمنتج {sku}"})
-                order_item = StandardOrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    qty=qty,
-                    unit_price=product.price,
-                )
+                order_item = StandardOrderItem(product=product, qty=qty, unit_price=product.price)
                 total += order_item.total_price
-            order.total = total
-            order.save(update_fields=["total"])
+                order_items.append(order_item)
+            order = StandardOrder.objects.create(
+                customer=customer,
+                pickup_notes=validated_data.get("pickup_notes", ""),
+                total=total,
+            )
+            for order_item in order_items:
+                order_item.order = order
+            StandardOrderItem.objects.bulk_create(order_items)
+            try:
+                reserve_stock(order, {item.product_id: item.qty for item in order_items})
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError({"items": exc.message}) from exc
         return order
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data["items"] = StandardOrderItemSerializer(instance.items.all(), many=True).data
+        items = instance.items.all()
+        if "items" not in getattr(instance, "_prefetched_objects_cache", {}):
+            # A freshly created order has nothing prefetched; load the products with the items.
+            items = items.select_related("product")
+        data["items"] = StandardOrderItemSerializer(items, many=True).data
         return data
 
 
+class StandardOrderListSerializer(serializers.ModelSerializer):
+    """Compact list row; ``item_count`` is annotated by the view's queryset."""
+
+    customer_name = serializers.CharField(source="customer.name", read_only=True)
+    customer_phone = serializers.CharField(source="customer.phone", read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = StandardOrder
+        fields = [
+            "id",
+            "customer_name",
+            "customer_phone",
+            "status",
+            "item_count",
+            "total",
+            "currency",
+            "created_at",
+        ]
+        read_only_fields = fields
+
+
 class StandardOrderStatusSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=StandardOrderStatus.choices)
 
 
+class StandardOrderBulkStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), min_length=1, max_length=BULK_STATUS_MAX_ORDERS
+    )
+    status = serializers.ChoiceField(
+        choices=[(status, StandardOrderStatus(status).label) for status in STANDARD_ORDER_TRANSITIONS]
+    )
+
+
 class CustomOrderLineSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomOrderLine
@@ -270,3 +329,56 @@ class CustomOrderLinesBulkSerializer(serializers.Serializer):
             custom_order.full_clean()
             custom_order.save(update_fields=["quote_subtotal", "quote_discount", "quote_total", "quote_pdf_url", "status"])
         return custom_order
+
+
+class QuotePdfJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = QuotePdfJob
+        fields = [
+            "id",
+            "custom_order",
+            "status",
+            "quote_pdf_url",
+            "error",
+            "attempts",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class RevenueByDayRowSerializer(serializers.Serializer):
+    day = serializers.DateField()
+    city = serializers.CharField()
+    orders = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    running_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class TopSkuRowSerializer(serializers.Serializer):
+    rank = serializers.IntegerField()
+    product_id = serializers.IntegerField()
+    sku = serializers.CharField()
+    name_ar = serializers.CharField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    revenue_share = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
+class CustomOrderFunnelRowSerializer(serializers.Serializer):
+    status = serializers.CharField()
+    label = serializers.CharField()
+    count = serializers.IntegerField()
+    share = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
+class LowStockRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    sku = serializers.CharField()
+    name_ar = serializers.CharField()
+    category_name = serializers.CharField()
+    stock = serializers.IntegerField()
+    reserved = serializers.IntegerField()
+    available = serializers.IntegerField()
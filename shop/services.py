@@ -1,50 +1,305 @@
 from __future__ import annotations
 
-import base64
-import io
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import timedelta
 from decimal import Decimal
+from typing import Dict, List, Optional, Sequence, Tuple
 
-import qrcode
 from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
-from django.template.loader import render_to_string
-from weasyprint import HTML
+from django.db.models import F, QuerySet
+from django.template.loader import get_template, render_to_string
+from django.utils import timezone
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
 
-from .models import CustomOrder
+from .models import CustomOrder, CustomOrderLine, QuotePdfJob, QuotePdfJobStatus
+from .qr import QR_FORMAT_SVG, render_qr_code
+from .storage import exists_many, save_many
+from .workers import init_worker, render_quote_pdf
 
 
-def generate_custom_order_quote_pdf(custom_order: CustomOrder) -> str:
+QUOTE_TEMPLATE_NAME = "quotes/custom_order.html"
+QUOTE_STYLESHEET_NAME = "quotes/custom_order.css"
+
+
+def _template_mtime(template_name: str) -> float:
+    return os.path.getmtime(get_template(template_name).origin.name)
+
+
+class QuoteRenderer:
+    """Long-lived WeasyPrint renderer.
+
+    Parsing the quote stylesheet and resolving the Cairo/Amiri fonts dominates a
+    cold render, so both are built once and shared by every render. The
+    stylesheet is rebuilt if its file changes on disk.
+    """
+
+    def __init__(self) -> None:
+        self.font_config = FontConfiguration()
+        self._stylesheet = None
+        self._stylesheet_mtime = None
+
+    @property
+    def stylesheet(self) -> CSS:
+        mtime = _template_mtime(QUOTE_STYLESHEET_NAME)
+        if self._stylesheet is None or mtime != self._stylesheet_mtime:
+            self._stylesheet = CSS(string=render_to_string(QUOTE_STYLESHEET_NAME), font_config=self.font_config)
+            self._stylesheet_mtime = mtime
+        return self._stylesheet
+
+    def render(self, html_string: str) -> bytes:
+        document = HTML(string=html_string, base_url=str(settings.BASE_DIR))
+        return document.write_pdf(stylesheets=[self.stylesheet], font_config=self.font_config)
+
+
+_renderer_local = threading.local()
+
+
+def get_quote_renderer() -> QuoteRenderer:
+    """Return this thread's renderer; WeasyPrint font state is not shared across threads."""
+    renderer = getattr(_renderer_local, "renderer", None)
+    if renderer is None:
+        renderer = QuoteRenderer()
+        _renderer_local.renderer = renderer
+    return renderer
+
+
+def _quote_totals(custom_order: CustomOrder) -> Tuple[Decimal, Decimal, Decimal]:
     subtotal = custom_order.quote_subtotal or Decimal("0.00")
     discount = custom_order.quote_discount or Decimal("0.00")
     total = custom_order.quote_total or (subtotal - discount)
+    return subtotal, discount, total
 
-    file_name = f"{settings.PDF_STORAGE_FOLDER}/custom-order-{custom_order.pk}.pdf"
-    url = default_storage.url(file_name)
 
-    qr_buffer = io.BytesIO()
-    qr = qrcode.QRCode(version=1, box_size=8, border=2)
-    qr.add_data(url)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color=settings.STORE_INFO["theme_colors"]["primary"], back_color="white")
-    img.save(qr_buffer, format="PNG")
-    qr_image_base64 = base64.b64encode(qr_buffer.getvalue()).decode("utf-8")
+def custom_order_quote_fingerprint(custom_order: CustomOrder, lines: Sequence[CustomOrderLine]) -> str:
+    """Hash every input that affects the rendered quote, so unchanged orders can reuse their PDF."""
+    subtotal, discount, total = _quote_totals(custom_order)
+    customer = custom_order.customer
+    payload = {
+        "order": [
+            custom_order.pk,
+            custom_order.requirement_summary,
+            custom_order.site_address,
+            custom_order.site_city,
+            custom_order.preferred_contact_time,
+            custom_order.currency,
+        ],
+        "customer": [customer.name, customer.phone, customer.city],
+        "lines": [[line.item_type, line.name, line.sku, str(line.qty), str(line.unit_price)] for line in lines],
+        "totals": [str(subtotal), str(discount), str(total)],
+        "store": settings.STORE_INFO,
+        "template_mtime": _template_mtime(QUOTE_TEMPLATE_NAME),
+        "stylesheet_mtime": _template_mtime(QUOTE_STYLESHEET_NAME),
+        "qr_format": settings.QUOTE_QR_FORMAT,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def build_custom_order_quote_html(custom_order: CustomOrder, lines: Sequence[CustomOrderLine], pdf_url: str) -> str:
+    subtotal, discount, total = _quote_totals(custom_order)
+    qr_format = settings.QUOTE_QR_FORMAT
+    # The URL carries the quote fingerprint and a quote is only rendered when its
+    # file is missing, so each QR code is drawn once and not worth caching.
+    qr_code = render_qr_code(pdf_url, settings.STORE_INFO["theme_colors"]["primary"], qr_format)
 
     context = {
         "order": custom_order,
+        "lines": lines,
         "subtotal": subtotal,
         "discount": discount,
         "total": total,
         "store": settings.STORE_INFO,
-        "qr_image_base64": qr_image_base64,
+        "qr_svg": qr_code if qr_format == QR_FORMAT_SVG else "",
+        "qr_image_base64": qr_code if qr_format != QR_FORMAT_SVG else "",
     }
+    return render_to_string(QUOTE_TEMPLATE_NAME, context)
+
+
+def generate_custom_order_quote_pdf(custom_order: CustomOrder) -> str:
+    lines = list(custom_order.lines.all())
+    fingerprint = custom_order_quote_fingerprint(custom_order, lines)
+    if custom_order.quote_pdf_fingerprint == fingerprint and custom_order.quote_pdf_url:
+        return custom_order.quote_pdf_url
 
-    html_string = render_to_string("quotes/custom_order.html", context)
-    pdf_file = HTML(string=html_string, base_url=str(settings.BASE_DIR)).write_pdf(stylesheets=None)
-    if default_storage.exists(file_name):
-        default_storage.delete(file_name)
-    saved_path = default_storage.save(file_name, ContentFile(pdf_file))
-    url = default_storage.url(saved_path)
+    file_name = f"{settings.PDF_STORAGE_FOLDER}/{fingerprint}.pdf"
+    if not default_storage.exists(file_name):
+        html_string = build_custom_order_quote_html(custom_order, lines, default_storage.url(file_name))
+        pdf_file = get_quote_renderer().render(html_string)
+        file_name = default_storage.save(file_name, ContentFile(pdf_file))
+    url = default_storage.url(file_name)
     custom_order.quote_pdf_url = url
-    custom_order.save(update_fields=["quote_pdf_url"])
+    custom_order.quote_pdf_fingerprint = fingerprint
+    custom_order.save(update_fields=["quote_pdf_url", "quote_pdf_fingerprint"])
     return url
+
+
+@dataclass
+class QuoteBatchResult:
+    order_id: int
+    url: str = ""
+    error: str = ""
+    cached: bool = False
+
+
+def _render_quote_pdfs(html_by_order: Dict[int, str], processes: Optional[int]):
+    """Yield ``(order_id, pdf_bytes_or_exception)`` as renders finish."""
+    if len(html_by_order) < 2:
+        for order_id, html_string in html_by_order.items():
+            try:
+                yield order_id, get_quote_renderer().render(html_string)
+            except Exception as exc:  # pylint: disable=broad-except
+                yield order_id, exc
+        return
+    max_workers = min(len(html_by_order), processes or os.cpu_count() or 1)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=init_worker) as pool:
+        futures = {pool.submit(render_quote_pdf, html_string): order_id for order_id, html_string in html_by_order.items()}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as exc:  # pylint: disable=broad-except
+                yield futures[future], exc
+
+
+def generate_custom_order_quote_pdfs(
+    queryset: QuerySet,
+    processes: Optional[int] = None,
+    upload_workers: Optional[int] = None,
+) -> List[QuoteBatchResult]:
+    """Render quotes for many orders at once.
+
+    Lines and customers are loaded in one pass, renders fan out to a process
+    pool and each PDF is uploaded (``shop.storage.save_many``) while the
+    remaining renders finish.
+    """
+    orders = list(queryset.select_related("customer").prefetch_related("lines"))
+    results = {order.pk: QuoteBatchResult(order_id=order.pk) for order in orders}
+    pending = {}
+    for order in orders:
+        lines = list(order.lines.all())
+        if not lines:
+            results[order.pk].error = "يجب إضافة بنود قبل إرسال العرض."
+            continue
+        fingerprint = custom_order_quote_fingerprint(order, lines)
+        if order.quote_pdf_fingerprint == fingerprint and order.quote_pdf_url:
+            results[order.pk].url = order.quote_pdf_url
+            results[order.pk].cached = True
+            continue
+        pending[order.pk] = (order, lines, fingerprint, f"{settings.PDF_STORAGE_FOLDER}/{fingerprint}.pdf")
+
+    updated_orders = []
+
+    def record(order_id: int, file_name: str, cached: bool) -> None:
+        order, _, fingerprint, _ = pending[order_id]
+        order.quote_pdf_url = default_storage.url(file_name)
+        order.quote_pdf_fingerprint = fingerprint
+        updated_orders.append(order)
+        results[order_id].url = order.quote_pdf_url
+        results[order_id].cached = cached
+
+    names = {order_id: entry[3] for order_id, entry in pending.items()}
+    existing = exists_many(names.values(), max_workers=upload_workers)
+    html_by_order = {}
+    for order_id, (order, lines, _, file_name) in pending.items():
+        if existing[file_name]:
+            record(order_id, file_name, cached=True)
+            continue
+        try:
+            html_by_order[order_id] = build_custom_order_quote_html(order, lines, default_storage.url(file_name))
+        except Exception as exc:  # pylint: disable=broad-except
+            results[order_id].error = str(exc)
+
+    def rendered_files():
+        for order_id, rendered in _render_quote_pdfs(html_by_order, processes):
+            if isinstance(rendered, Exception):
+                results[order_id].error = str(rendered)
+                continue
+            yield names[order_id], ContentFile(rendered)
+
+    order_ids = {file_name: order_id for order_id, file_name in names.items()}
+    for file_name, saved in save_many(rendered_files(), max_workers=upload_workers).items():
+        if isinstance(saved, Exception):
+            results[order_ids[file_name]].error = str(saved)
+        else:
+            record(order_ids[file_name], saved, cached=False)
+
+    if updated_orders:
+        now = timezone.now()
+        for order in updated_orders:
+            order.updated_at = now
+        CustomOrder.objects.bulk_update(updated_orders, ["quote_pdf_url", "quote_pdf_fingerprint", "updated_at"])
+    return [results[order.pk] for order in orders]
+
+
+def enqueue_custom_order_quote_pdf(custom_order: CustomOrder) -> QuotePdfJob:
+    """Queue a background render, reusing a pending job for the same quote.
+
+    A running job may have read the order before its lines last changed, so it
+    is never reused.
+    """
+    fingerprint = custom_order_quote_fingerprint(custom_order, list(custom_order.lines.all()))
+    pending_job = (
+        custom_order.quote_pdf_jobs.filter(status=QuotePdfJobStatus.PENDING, fingerprint=fingerprint)
+        .order_by("created_at")
+        .first()
+    )
+    if pending_job is not None:
+        return pending_job
+    return QuotePdfJob.objects.create(custom_order=custom_order, fingerprint=fingerprint)
+
+
+def claim_quote_pdf_jobs(limit: int) -> List[int]:
+    """Move up to ``limit`` pending jobs to running; a job is only claimed by one worker."""
+    candidate_ids = list(
+        QuotePdfJob.objects.filter(status=QuotePdfJobStatus.PENDING)
+        .order_by("created_at")
+        .values_list("pk", flat=True)[:limit]
+    )
+    claimed = []
+    for job_id in candidate_ids:
+        now = timezone.now()
+        updated = QuotePdfJob.objects.filter(pk=job_id, status=QuotePdfJobStatus.PENDING).update(
+            status=QuotePdfJobStatus.RUNNING,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            updated_at=now,
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def requeue_stale_quote_pdf_jobs(older_than: timedelta) -> int:
+    """Return jobs left running by a crashed worker to the queue."""
+    now = timezone.now()
+    return QuotePdfJob.objects.filter(
+        status=QuotePdfJobStatus.RUNNING,
+        started_at__lt=now - older_than,
+    ).update(status=QuotePdfJobStatus.PENDING, updated_at=now)
+
+
+def run_quote_pdf_job(job_id: int) -> str:
+    job = QuotePdfJob.objects.select_related("custom_order__customer").get(pk=job_id)
+    try:
+        url = generate_custom_order_quote_pdf(job.custom_order)
+    except Exception as exc:  # pylint: disable=broad-except
+        job.status = QuotePdfJobStatus.FAILED
+        job.error = str(exc)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at", "updated_at"])
+        return job.status
+    job.status = QuotePdfJobStatus.DONE
+    job.quote_pdf_url = url
+    job.error = ""
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "quote_pdf_url", "error", "finished_at", "updated_at"])
+    return job.status
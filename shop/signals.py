@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import bump_catalog_version_on_commit
+from .models import Brand, Category, Product, StandardOrder, release_reservations
+
+
+def _refresh_search_documents(products) -> None:
+    batch = []
+    now = timezone.now()
+    for product in products.select_related("brand", "category").iterator(chunk_size=500):
+        document = product.build_search_document()
+        if document != product.search_document:
+            product.search_document = document
+            # Lets the in-process search index notice the change (shop.search).
+            product.updated_at = now
+            batch.append(product)
+    Product.objects.bulk_update(batch, ["search_document", "updated_at"], batch_size=500)
+
+
+@receiver(post_save, sender=Brand, dispatch_uid="shop_brand_search_documents")
+def brand_saved(sender, instance: Brand, created: bool, **kwargs) -> None:
+    if not created:
+        _refresh_search_documents(instance.products.all())
+
+
+@receiver(post_save, sender=Category, dispatch_uid="shop_category_search_documents")
+def category_saved(sender, instance: Category, created: bool, **kwargs) -> None:
+    if not created:
+        _refresh_search_documents(instance.products.all())
+
+
+@receiver(post_save, sender=Product, dispatch_uid="shop_product_saved_catalog_version")
+@receiver(post_delete, sender=Product, dispatch_uid="shop_product_deleted_catalog_version")
+@receiver(post_save, sender=Category, dispatch_uid="shop_category_saved_catalog_version")
+@receiver(post_delete, sender=Category, dispatch_uid="shop_category_deleted_catalog_version")
+@receiver(post_save, sender=Brand, dispatch_uid="shop_brand_saved_catalog_version")
+@receiver(post_delete, sender=Brand, dispatch_uid="shop_brand_deleted_catalog_version")
+def catalog_changed(sender, using, **kwargs) -> None:
+    bump_catalog_version_on_commit(using)
+
+
+@receiver(pre_delete, sender=StandardOrder, dispatch_uid="shop_standard_order_release_reservations")
+def standard_order_deleted(sender, instance: StandardOrder, **kwargs) -> None:
+    # The ledger rows cascade away with the order; give their units back first.
+    release_reservations(instance.reservations.all())
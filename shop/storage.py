@@ -0,0 +1,170 @@
+"""S3 storage with one pooled client per process, and concurrent batch saves.
+
+``S3Boto3Storage`` builds a boto3 session and resource in every thread that
+touches it, so each worker thread pays for its own credential lookup and TLS
+connections. ``PooledS3Storage`` sends uploads, HEADs, deletes and URL signing
+through a single thread-safe client whose connection pool is sized by
+``AWS_S3_MAX_POOL_CONNECTIONS``. Object names here are content addressed, so
+saves overwrite in place: one PUT, or a concurrent multipart upload above
+``AWS_S3_MULTIPART_THRESHOLD``, with no HEAD for a free name first.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Mapping, Optional, Tuple, Union
+
+import botocore
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import Storage, default_storage
+from storages.backends.s3 import S3Storage, _filter_download_params
+from storages.utils import ReadBytesWrapper, clean_name, is_seekable
+
+_clients: Dict[Tuple, object] = {}
+_clients_lock = threading.Lock()
+
+
+class PooledS3Storage(S3Storage):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if not getattr(settings, "AWS_S3_TRANSFER_CONFIG", None):
+            self.transfer_config = TransferConfig(
+                multipart_threshold=settings.AWS_S3_MULTIPART_THRESHOLD,
+                multipart_chunksize=settings.AWS_S3_MULTIPART_THRESHOLD,
+                max_concurrency=settings.AWS_S3_MULTIPART_CONCURRENCY,
+            )
+
+    @property
+    def client(self):
+        return self._shared_client(signed=True)
+
+    def _shared_client(self, signed: bool):
+        key = (
+            signed,
+            self.session_profile,
+            self.access_key,
+            self.secret_key,
+            self.endpoint_url,
+            self.region_name,
+            self.use_ssl,
+            self.verify,
+        )
+        client = _clients.get(key)
+        if client is None:
+            with _clients_lock:
+                client = _clients.get(key)
+                if client is None:
+                    config = self.client_config.merge(
+                        Config(
+                            max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+                            retries={"max_attempts": 5, "mode": "standard"},
+                        )
+                    )
+                    if not signed:
+                        config = config.merge(Config(signature_version=botocore.UNSIGNED))
+                    client = self._create_session().client(
+                        "s3",
+                        region_name=self.region_name,
+                        use_ssl=self.use_ssl,
+                        endpoint_url=self.endpoint_url,
+                        config=config,
+                        verify=self.verify,
+                    )
+                    _clients[key] = client
+        return client
+
+    def _save(self, name, content):
+        cleaned_name = clean_name(name)
+        name = self._normalize_name(cleaned_name)
+        params = self._get_write_parameters(name, content)
+        if is_seekable(content):
+            content.seek(0, os.SEEK_SET)
+        content = ReadBytesWrapper(content)
+        if self.gzip and params["ContentType"] in self.gzip_content_types and "ContentEncoding" not in params:
+            content = self._compress_content(content)
+            params["ContentEncoding"] = "gzip"
+        # s3transfer closes the file it was given; the caller still owns it.
+        original_close = content.close
+        content.close = lambda: None
+        try:
+            self.client.upload_fileobj(content, self.bucket_name, name, ExtraArgs=params, Config=self.transfer_config)
+        finally:
+            content.close = original_close
+        return cleaned_name
+
+    def exists(self, name):
+        name = self._normalize_name(clean_name(name))
+        params = _filter_download_params(self.get_object_parameters(name))
+        try:
+            self.client.head_object(Bucket=self.bucket_name, Key=name, **params)
+        except ClientError as err:
+            if err.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
+                return False
+            raise
+        return True
+
+    def delete(self, name):
+        name = self._normalize_name(clean_name(name))
+        self.client.delete_object(Bucket=self.bucket_name, Key=name)
+
+    def size(self, name):
+        name = self._normalize_name(clean_name(name))
+        try:
+            return self.client.head_object(Bucket=self.bucket_name, Key=name)["ContentLength"]
+        except ClientError as err:
+            if err.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
+                raise FileNotFoundError(f"File does not exist: {name}") from err
+            raise
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        if self.custom_domain:
+            return super().url(name, parameters, expire, http_method)
+        name = self._normalize_name(clean_name(name))
+        params = {**(parameters or {}), "Bucket": self.bucket_name, "Key": name}
+        client = self._shared_client(signed=self.querystring_auth)
+        return client.generate_presigned_url(
+            "get_object",
+            Params=params,
+            ExpiresIn=self.querystring_expire if expire is None else expire,
+            HttpMethod=http_method,
+        )
+
+
+def save_many(
+    files: Union[Mapping[str, Union[bytes, File]], Iterable[Tuple[str, Union[bytes, File]]]],
+    storage: Optional[Storage] = None,
+    max_workers: Optional[int] = None,
+) -> Dict[str, Union[str, Exception]]:
+    """Save ``{name: content}`` concurrently; return the stored name, or the error, per name.
+
+    ``files`` may also be an iterable of ``(name, content)`` pairs, which is
+    consumed as it produces them, so uploads start while later files are still
+    being generated.
+    """
+    storage = storage or default_storage
+    items = files.items() if isinstance(files, Mapping) else files
+
+    def save(name: str, content) -> Union[str, Exception]:
+        try:
+            return storage.save(name, content if isinstance(content, File) else ContentFile(content))
+        except Exception as exc:  # pylint: disable=broad-except
+            return exc
+
+    with ThreadPoolExecutor(max_workers=max_workers or settings.STORAGE_UPLOAD_WORKERS) as pool:
+        futures = {name: pool.submit(save, name, content) for name, content in items}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def exists_many(
+    names: Iterable[str], storage: Optional[Storage] = None, max_workers: Optional[int] = None
+) -> Dict[str, bool]:
+    """``storage.exists`` for many names at once."""
+    storage = storage or default_storage
+    names = list(names)
+    with ThreadPoolExecutor(max_workers=max_workers or settings.STORAGE_UPLOAD_WORKERS) as pool:
+        return dict(zip(names, pool.map(storage.exists, names)))
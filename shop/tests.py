@@ -0,0 +1,1305 @@
+import base64
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import facets as facets_module
+from . import reports
+from . import storage as storage_module
+from .cache import (
+    CATALOG_VERSION_KEY,
+    bump_catalog_version,
+    catalog_cache,
+    catalog_cache_counters,
+    get_catalog_version,
+)
+from .categories import descendant_ids
+from .exports import XLSX_CONTENT_TYPE
+from .facets import spec_facet_counts
+from .models import (
+    Brand,
+    Category,
+    Customer,
+    CustomOrder,
+    CustomOrderLine,
+    Product,
+    QuotePdfJob,
+    StandardOrder,
+    StandardOrderItem,
+    release_reservations,
+    reserve_stock,
+)
+from .services import (
+    build_custom_order_quote_html,
+    claim_quote_pdf_jobs,
+    generate_custom_order_quote_pdf,
+    requeue_stale_quote_pdf_jobs,
+    run_quote_pdf_job,
+)
+from .storage import PooledS3Storage, save_many
+from .utils import normalize_arabic
+
+try:
+    from moto import mock_aws
+except ImportError:  # test-only dependency, see requirements-dev.txt
+    mock_aws = None
+
+# Keep tests off the file-based catalog cache under .cache/.
+TEST_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-default"},
+    "catalog": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tests-catalog"},
+}
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StandardOrderCreateQueriesTests(TestCase):
+    """Creating an order costs the same number of queries whatever its size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name_ar="كاميرات")
+        Product.objects.bulk_create(
+            Product(name_ar=f"كاميرا {index}", sku=f"CAM-{index}", price=Decimal("10.00"), stock=100, category=category)
+            for index in range(30)
+        )
+
+    def create_order(self, item_count: int, phone: str):
+        payload = {
+            "customer": {"name": "عميل", "phone": phone, "city": "عمّان"},
+            "items": [{"sku": f"CAM-{index}", "qty": 2} for index in range(item_count)],
+        }
+        return APIClient().post("/api/standard-orders/", payload, format="json")
+
+    def test_query_count_does_not_grow_with_items(self):
+        for item_count, phone in ((1, "0791000001"), (5, "0791000005"), (30, "0791000030")):
+            with self.subTest(items=item_count), self.assertNumQueries(17):
+                response = self.create_order(item_count, phone)
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(len(response.json()["items"]), item_count)
+            self.assertEqual(
+                StandardOrder.objects.get(pk=response.json()["id"]).total, Decimal("20.00") * item_count
+            )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CategoryPathTests(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name_ar="أمن")
+        self.cameras = Category.objects.create(name_ar="كاميرات", parent=self.root)
+        self.dome = Category.objects.create(name_ar="قبة", parent=self.cameras)
+        self.other_root = Category.objects.create(name_ar="شبكات")
+
+    def test_move_rewrites_the_subtree(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cameras.parent = self.other_root
+            self.cameras.save()
+
+        self.dome.refresh_from_db()
+        self.assertEqual(self.dome.path, f"/{self.other_root.pk}/{self.cameras.pk}/{self.dome.pk}/")
+        self.assertEqual(self.dome.depth, 2)
+        self.assertCountEqual(descendant_ids(self.other_root.pk), [self.other_root.pk, self.cameras.pk, self.dome.pk])
+        self.assertEqual(descendant_ids(self.root.pk), [self.root.pk])
+
+    def test_saving_a_stale_instance_keeps_the_current_path(self):
+        stale = Category.objects.get(pk=self.dome.pk)
+        self.cameras.parent = self.other_root
+        self.cameras.save()
+
+        stale.name_ar = "قبة داخلية"
+        stale.save()
+
+        self.assertEqual(stale.path, f"/{self.other_root.pk}/{self.cameras.pk}/{self.dome.pk}/")
+        self.assertEqual(Category.objects.get(pk=self.dome.pk).path, stale.path)
+
+    def test_moving_under_own_subtree_is_rejected(self):
+        for parent in (self.dome, self.cameras):
+            with self.subTest(parent=parent.name_ar):
+                self.cameras.parent = parent
+                with self.assertRaises(ValidationError):
+                    self.cameras.save()
+        self.cameras.refresh_from_db()
+        self.assertEqual(self.cameras.parent_id, self.root.pk)
+        self.assertEqual(self.cameras.path, f"/{self.root.pk}/{self.cameras.pk}/")
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProductReservedStockTests(TestCase):
+    def test_full_save_keeps_concurrent_holds(self):
+        category = Category.objects.create(name_ar="أقفال")
+        product = Product.objects.create(name_ar="قفل ذكي", sku="LOCK-1", price=5, stock=10, category=category)
+        stale = Product.objects.get(pk=product.pk)
+        Product.objects.filter(pk=product.pk).update(reserved=4)
+
+        stale.price = 6
+        stale.save()
+
+        product.refresh_from_db()
+        self.assertEqual((product.price, product.reserved), (6, 4))
+        response = APIClient().get(f"/api/products/{product.pk}/", HTTP_ACCEPT="application/json")
+        self.assertEqual((response.json()["stock"], response.json()["available_stock"]), (10, 6))
+
+    def test_holds_change_the_validators(self):
+        category = Category.objects.create(name_ar="أقفال")
+        product = Product.objects.create(name_ar="قفل ذكي", sku="LOCK-2", price=5, stock=10, category=category)
+        customer = Customer.objects.create(name="عميل", phone="0791000099", city="عمّان")
+        order = StandardOrder.objects.create(customer=customer, total=0)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("staff", is_staff=True))
+
+        def get(url, etag):
+            return client.get(url, HTTP_ACCEPT="application/json", HTTP_IF_NONE_MATCH=etag)
+
+        detail_url, list_url = f"/api/products/{product.pk}/", "/api/products/"
+        detail_etag, list_etag = get(detail_url, "")["ETag"], get(list_url, "")["ETag"]
+        reserve_stock(order, {product.pk: 4})
+        response = get(detail_url, detail_etag)
+        self.assertEqual((response.status_code, response.json()["available_stock"]), (200, 6))
+
+        list_etag = get(list_url, list_etag)["ETag"]
+        release_reservations(order.reservations.all())
+        response = get(list_url, list_etag)
+        self.assertEqual((response.status_code, response.json()["results"][0]["available_stock"]), (200, 10))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name_ar="كاميرات")
+        # Half the names tie, so the id tiebreaker decides their order.
+        Product.objects.bulk_create(
+            Product(
+                name_ar="كاميرا" if index % 2 else f"كاميرا {index:02d}",
+                sku=f"CAM-K{index}",
+                price=5,
+                stock=1,
+                category=category,
+            )
+            for index in range(45)
+        )
+        cls.category = category
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def get(self, url: str):
+        response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk(self, url: str, between_pages=None):
+        pages = []
+        while url:
+            data = self.get(url)
+            self.assertNotIn("count", data)
+            pages.append(data)
+            url = data["next"]
+            if between_pages is not None:
+                between_pages()
+                between_pages = None
+        return pages
+
+    def test_pages_follow_the_ordering_without_gaps(self):
+        expected = list(Product.objects.order_by("name_ar", "id").values_list("id", flat=True))
+        pages = self.walk("/api/products/?paginate=cursor")
+        self.assertEqual([len(page["results"]) for page in pages], [20, 20, 5])
+        self.assertEqual([row["id"] for page in pages for row in page["results"]], expected)
+        self.assertIsNone(pages[0]["previous"])
+
+        # Walking back from the last page returns the page before it.
+        previous = self.get(pages[2]["previous"])
+        self.assertEqual(previous["results"], pages[1]["results"])
+        self.assertIsNotNone(previous["next"])
+
+    def test_rows_added_before_the_cursor_do_not_shift_pages(self):
+        expected = list(Product.objects.order_by("name_ar", "id").values_list("id", flat=True))
+
+        def insert_ahead():
+            Product.objects.create(name_ar="أ كاميرا", sku="CAM-K-NEW", price=5, stock=1, category=self.category)
+
+        pages = self.walk("/api/products/?paginate=cursor", between_pages=insert_ahead)
+        self.assertEqual([row["id"] for page in pages for row in page["results"]], expected)
+
+    def test_orders_with_equal_timestamps(self):
+        customer = Customer.objects.create(name="عميل", phone="0791000041", city="عمّان")
+        StandardOrder.objects.bulk_create(StandardOrder(customer=customer, total=1) for _ in range(25))
+        StandardOrder.objects.update(created_at=timezone.now())
+        pages = self.walk("/api/standard-orders/?paginate=cursor")
+        self.assertEqual(
+            [row["id"] for page in pages for row in page["results"]],
+            sorted(StandardOrder.objects.values_list("id", flat=True)),
+        )
+
+    def test_page_numbers_stay_the_default(self):
+        data = self.get("/api/products/")
+        self.assertEqual((data["count"], len(data["results"])), (45, 20))
+        response = self.client.get("/api/products/?cursor=not-a-cursor", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 404)
+
+
+class NormalizeArabicTests(SimpleTestCase):
+    def test_spelling_variants_fold_together(self):
+        cases = {
+            "إِنْذَار": "انذار",
+            "أمان آلي": "امان الي",
+            "كاميرا مراقبة": "كاميرا مراقبه",
+            "مستشفى": "مستشفي",
+            "كامـــيرا": "كاميرا",
+            "٤ ميجا": "4 ميجا",
+            "HikVision DS-2CD_1043": "hikvision ds 2cd 1043",
+        }
+        for value, expected in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(normalize_arabic(value), expected)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cameras = Category.objects.create(name_ar="كاميرات")
+        alarms = Category.objects.create(name_ar="إنذار")
+        hikvision = Brand.objects.create(name="Hikvision")
+        cls.outdoor, cls.indoor, cls.alarm, cls.retired = (
+            Product.objects.create(
+                name_ar=name, sku=sku, price=5, stock=1, category=category, brand=brand, is_active=is_active, specs=specs
+            )
+            for name, sku, category, brand, is_active, specs in (
+                ("كاميرا مراقبة خارجية", "CAM-OUT", cameras, hikvision, True, {"resolution": "4MP"}),
+                ("أجهزة كاميرات داخلية", "CAM-IN", cameras, None, True, None),
+                ("جهاز إنذار لاسلكي", "ALM-1", alarms, None, True, None),
+                ("كاميرا قديمة", "CAM-OLD", cameras, None, False, None),
+            )
+        )
+
+    def search(self, query: str):
+        response = APIClient().get("/api/products/", {"q": query}, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row["sku"] for row in response.json()["results"]]
+
+    def test_matches_ignore_spelling_variants(self):
+        for query, expected in (
+            ("انذار", ["ALM-1"]),
+            ("إنذار", ["ALM-1"]),
+            ("مراقبه", ["CAM-OUT"]),
+            ("خارجيّة", ["CAM-OUT"]),
+            ("HIKVISION", ["CAM-OUT"]),
+            ("cam-in", ["CAM-IN"]),
+            ("4mp", ["CAM-OUT"]),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), expected)
+
+    def test_every_token_must_match_as_a_prefix(self):
+        self.assertEqual(self.search("كامير داخل"), ["CAM-IN"])
+        self.assertEqual(self.search("لاسل"), ["ALM-1"])
+        self.assertEqual(self.search("كاميرا لاسلكي"), [])
+        self.assertEqual(self.search("   "), ["CAM-IN", "ALM-1", "CAM-OUT"])
+
+    @skipIf(connection.vendor == "postgresql", "PostgreSQL ranks with ts_rank")
+    def test_whole_words_rank_before_prefixes(self):
+        # "كاميرا" is a whole word of CAM-OUT and only a prefix of "كاميرات", so CAM-OUT comes
+        # first although CAM-IN sorts first by name. Inactive CAM-OLD is hidden.
+        self.assertEqual(self.search("كاميرا"), ["CAM-OUT", "CAM-IN"])
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SpecFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name_ar="كاميرات")
+        for sku, specs, is_active in (
+            ("CAM-F1", {"resolution": "4MP", "channels": 8, "poe": True}, True),
+            ("CAM-F2", {"resolution": "4MP", "channels": 4}, True),
+            ("CAM-F3", {"resolution": "2MP", "poe": False, "lens": ["2.8mm", "4mm"]}, True),
+            ("CAM-F4", None, True),
+            ("CAM-F5", ["4MP"], True),
+            ("CAM-F6", {"resolution": "4MP"}, False),
+        ):
+            Product.objects.create(name_ar=sku, sku=sku, price=5, stock=1, category=category, specs=specs, is_active=is_active)
+
+    def get(self, path: str, query: str):
+        response = APIClient().get(f"/api/products/{path}?{query}", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def skus(self, query: str):
+        return [row["sku"] for row in self.get("", query)["results"]]
+
+    def test_filters(self):
+        for query, expected in (
+            ("spec.resolution=4MP", ["CAM-F1", "CAM-F2"]),
+            ("spec.resolution=4MP&spec.resolution=2MP", ["CAM-F1", "CAM-F2", "CAM-F3"]),
+            ("spec.resolution=4MP&spec.channels=4", ["CAM-F2"]),
+            ("spec.channels=8", ["CAM-F1"]),
+            ("spec.poe=false", ["CAM-F3"]),
+            ("spec.resolution=8MP", []),
+            ("spec.resolution=", ["CAM-F1", "CAM-F2", "CAM-F3", "CAM-F4", "CAM-F5"]),
+            ("spec.resolution__icontains=mp", ["CAM-F1", "CAM-F2", "CAM-F3", "CAM-F4", "CAM-F5"]),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.skus(query), expected)
+
+    def test_facet_counts(self):
+        facets = self.get("facets/", "")["facets"]
+        self.assertEqual(
+            facets,
+            {
+                "channels": [{"value": "4", "count": 1}, {"value": "8", "count": 1}],
+                "poe": [{"value": "false", "count": 1}, {"value": "true", "count": 1}],
+                "resolution": [{"value": "4MP", "count": 2}, {"value": "2MP", "count": 1}],
+            },
+        )
+        # Every facet value works as a filter.
+        for key, values in facets.items():
+            for value in values:
+                with self.subTest(key=key, value=value["value"]):
+                    self.assertEqual(len(self.skus(f"spec.{key}={value['value']}")), value["count"])
+
+    def test_facets_follow_the_filters(self):
+        facets = self.get("facets/", "spec.resolution=4MP&facet_keys=channels,poe")["facets"]
+        self.assertEqual(
+            facets,
+            {"channels": [{"value": "4", "count": 1}, {"value": "8", "count": 1}], "poe": [{"value": "true", "count": 1}]},
+        )
+
+    def test_python_counts_match_the_sql(self):
+        queryset = Product.objects.filter(is_active=True)
+        expected = spec_facet_counts(queryset)
+        with patch.dict(facets_module._FACET_SQL, clear=True):
+            self.assertEqual(spec_facet_counts(queryset), expected)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        category = Category.objects.create(name_ar="كاميرات")
+        self.product = Product.objects.create(name_ar="كاميرا", sku="CAM-C1", price=5, stock=3, category=category)
+        self.url = f"/api/products/{self.product.pk}/"
+
+    def get(self, url=None, client=None):
+        response = (client or APIClient()).get(url or self.url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def counted(self, *urls):
+        before = catalog_cache_counters.stats()
+        for url in urls:
+            self.get(url)
+        after = catalog_cache_counters.stats()
+        return after["hits"] - before["hits"], after["misses"] - before["misses"]
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.counted(self.url, self.url, "/api/products/", "/api/products/?page=1"), (1, 3))
+        with self.assertNumQueries(0):
+            self.get()
+
+    def test_writes_bump_the_version_on_commit(self):
+        self.get()
+        Product.objects.filter(pk=self.product.pk).update(price=9)
+        # Queryset updates send no signal, so the cached response stands.
+        self.assertEqual(self.get()["price"], "5.00")
+
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.name_ar = "كاميرا خارجية"
+            self.product.save()
+        self.assertEqual(get_catalog_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_catalog_version(), version)
+        self.assertEqual(self.get()["name_ar"], "كاميرا خارجية")
+
+    def test_category_and_brand_changes_bump_the_version(self):
+        for model, fields in ((Category, {"name_ar": "أقفال"}), (Brand, {"name": "Dahua"})):
+            with self.subTest(model=model.__name__):
+                version = get_catalog_version()
+                with self.captureOnCommitCallbacks(execute=True):
+                    instance = model.objects.create(**fields)
+                self.assertGreater(get_catalog_version(), version)
+                version = get_catalog_version()
+                with self.captureOnCommitCallbacks(execute=True):
+                    instance.delete()
+                self.assertGreater(get_catalog_version(), version)
+
+    def test_lost_version_is_reseeded_higher(self):
+        version = get_catalog_version()
+        catalog_cache().delete(CATALOG_VERSION_KEY)
+        bump_catalog_version()
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_staff_reads_skip_the_cache(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("staff", is_staff=True))
+        before = catalog_cache_counters.stats()
+        self.get(client=client)
+        self.assertEqual(catalog_cache_counters.stats(), before)
+
+        stats = self.get("/api/catalog-cache/stats/", client=client)
+        self.assertEqual(stats, {**catalog_cache_counters.stats(), "version": get_catalog_version()})
+        self.assertEqual(APIClient().get("/api/catalog-cache/stats/").status_code, 401)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        catalog_cache().clear()
+        customer = Customer.objects.create(name="عميل", phone="0791000051", city="عمّان")
+        self.orders = StandardOrder.objects.bulk_create(StandardOrder(customer=customer, total=1) for _ in range(3))
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("staff", is_staff=True))
+
+    def get(self, url: str, client=None, **headers):
+        return (client or self.client).get(url, HTTP_ACCEPT="application/json", **headers)
+
+    def test_detail(self):
+        url = f"/api/standard-orders/{self.orders[0].pk}/"
+        response = self.get(url)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        with self.assertNumQueries(1):
+            not_modified = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((not_modified.status_code, not_modified.content), (304, b""))
+        self.assertEqual(self.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        StandardOrder.objects.filter(pk=self.orders[0].pk).update(
+            status="confirmed", updated_at=timezone.now() + timedelta(seconds=5)
+        )
+        changed = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((changed.status_code, changed.json()["status"]), (200, "confirmed"))
+        self.assertNotEqual(changed["ETag"], etag)
+        self.assertEqual(self.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_list(self):
+        url = "/api/standard-orders/"
+        response = self.get(url)
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.get(f"{url}?status=new")["ETag"], etag)
+
+        StandardOrder.objects.filter(pk=self.orders[1].pk).update(updated_at=timezone.now() + timedelta(seconds=5))
+        etag = self.get(url, HTTP_IF_NONE_MATCH=etag)["ETag"]
+        self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # A deletion changes the validator even though no remaining row changed.
+        self.orders[2].delete()
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.json()["count"]), (200, 2))
+
+    def test_cached_catalog_responses(self):
+        category = Category.objects.create(name_ar="كاميرات")
+        product = Product.objects.create(name_ar="كاميرا", sku="CAM-304", price=5, stock=1, category=category)
+        anonymous = APIClient()
+        for url in ("/api/products/", f"/api/products/{product.pk}/"):
+            with self.subTest(url=url):
+                etag = self.get(url, client=anonymous)["ETag"]
+                with self.assertNumQueries(0):
+                    response = self.get(url, client=anonymous, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                # Staff see a different representation, so the anonymous validator does not match.
+                self.assertEqual(self.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StandardOrderListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name_ar="كاميرات")
+        cls.products = Product.objects.bulk_create(
+            Product(name_ar=f"كاميرا {index}", sku=f"CAM-L{index}", price=5, stock=100, category=category)
+            for index in range(3)
+        )
+        cls.customer = Customer.objects.create(name="عميل القائمة", phone="0791000061", city="عمّان")
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def add_orders(self, count: int, item_count: int):
+        for _ in range(count):
+            order = StandardOrder.objects.create(customer=self.customer, total=10 * item_count)
+            StandardOrderItem.objects.bulk_create(
+                StandardOrderItem(order=order, product=product, qty=2, unit_price=5)
+                for product in self.products[:item_count]
+            )
+
+    def get(self, query: str = ""):
+        response = self.client.get(f"/api/standard-orders/?{query}", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_compact_rows(self):
+        self.add_orders(1, 3)
+        row = self.get()[0]
+        self.assertEqual(
+            set(row), {"id", "customer_name", "customer_phone", "status", "item_count", "total", "currency", "created_at"}
+        )
+        self.assertEqual(
+            (row["customer_name"], row["customer_phone"], row["item_count"], row["total"]),
+            ("عميل القائمة", "0791000061", 3, "30.00"),
+        )
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_orders(2, 1)
+        with self.assertNumQueries(2):
+            self.get()
+        self.add_orders(10, 3)
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.get()), 12)
+
+    def test_expand_items(self):
+        self.add_orders(1, 2)
+        row = self.get("expand=items")[0]
+        self.assertEqual([item["qty"] for item in row["items"]], [2, 2])
+        self.assertEqual(row["customer"]["name"], "عميل القائمة")
+        self.assertEqual(self.get("expand=customer")[0]["item_count"], 2)
+        # Details keep the full representation.
+        detail = self.client.get(f"/api/standard-orders/{row['id']}/", HTTP_ACCEPT="application/json").json()
+        self.assertEqual(len(detail["items"]), 2)
+
+
+@override_settings(CACHES=TEST_CACHES, CATALOG_READ_DATABASE="replica")
+class CatalogReplicaCacheTests(TestCase):
+    """What goes into the catalog cache is read from the primary, never from a lagging replica."""
+
+    # No "replica" database is configured here, so any read routed to it fails.
+
+    def test_cache_fills_read_the_primary(self):
+        root = Category.objects.create(name_ar="أمن")
+        child = Category.objects.create(name_ar="كاميرات", parent=root)
+        product = Product.objects.create(name_ar="كاميرا", sku="CAM-R", price=5, stock=3, category=child)
+        client = APIClient()
+        for url in (
+            "/api/products/",
+            f"/api/products/{product.pk}/",
+            f"/api/products/?category_tree={root.pk}",
+            "/api/products/facets/",
+            "/api/categories/",
+            "/api/categories/tree/",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url, HTTP_ACCEPT="application/json").status_code, 200)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConcurrentConfirmTests(TransactionTestCase):
+    """Confirming many orders for one hot SKU from concurrent threads never oversells.
+
+    Each thread uses its own connection to the test database. PostgreSQL runs
+    the confirmations concurrently; SQLite lets one writer in at a time and
+    refuses the others with "database is locked", so those are retried until
+    every order is either confirmed or rejected for stock.
+    """
+
+    stock = 10
+    orders = 40
+    threads = 8
+
+    def test_stock_runs_out_exactly(self):
+        category = Category.objects.create(name_ar="فئة اختبار الضغط")
+        product = Product.objects.create(
+            name_ar="منتج اختبار الضغط", sku="STRESS-HOT-SKU", price=1, stock=self.stock, category=category
+        )
+        customer = Customer.objects.create(name="اختبار الضغط", phone="+962700000000", city="عمّان")
+        orders = StandardOrder.objects.bulk_create(
+            [StandardOrder(customer=customer, total=product.price) for _ in range(self.orders)]
+        )
+        StandardOrderItem.objects.bulk_create(
+            [StandardOrderItem(order=order, product=product, qty=1, unit_price=product.price) for order in orders]
+        )
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            outcomes = list(pool.map(self.confirm, [order.pk for order in orders]))
+
+        self.assertEqual(outcomes.count("confirmed"), self.stock)
+        self.assertEqual(outcomes.count("out of stock"), self.orders - self.stock)
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (0, 0))
+        self.assertEqual(StandardOrder.objects.filter(status="confirmed").count(), self.stock)
+        self.assertEqual(StandardOrder.objects.filter(status="new").count(), self.orders - self.stock)
+
+    @staticmethod
+    def confirm(order_id: int) -> str:
+        try:
+            for _ in range(500):
+                try:
+                    StandardOrder.objects.get(pk=order_id).confirm()
+                    return "confirmed"
+                except ValidationError as exc:
+                    return "out of stock" if "المخزون غير كافٍ" in exc.messages[0] else exc.messages[0]
+                except OperationalError:
+                    time.sleep(random.uniform(0.001, 0.01))
+            return "locked"
+        finally:
+            connection.close()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogSyncTests(TestCase):
+    records = [
+        {"sku": "CAM-S1", "name_ar": "كاميرا", "price": 10, "stock": 5, "category": "كاميرات", "brand": "Hikvision"},
+        {"sku": "CAM-S2", "name_ar": "كاميرا قبة", "price": 12, "stock": 4, "category": "كاميرات"},
+        {"sku": "LOCK-S1", "name_ar": "قفل ذكي", "price": 30, "stock": 2, "category": "أقفال", "specs": {"wifi": True}},
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.feed = os.path.join(directory.name, "feed.jsonl")
+
+    def sync(self, records, *options):
+        with open(self.feed, "w", encoding="utf-8") as feed:
+            feed.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        out, err = io.StringIO(), io.StringIO()
+        call_command("seed_products", "--source", self.feed, *options, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_delta_skips_unchanged_records(self):
+        out, err = self.sync([*self.records, {"sku": "", "name_ar": "بلا رمز"}], "--delta")
+        self.assertIn("Inserted 3, updated 0, skipped 0 unchanged, deactivated 0, 1 invalid of 4 rows", out)
+        self.assertIn("Row 4: Missing sku", err)
+        untouched = Product.objects.get(sku="CAM-S1").updated_at
+
+        changed = [dict(record) for record in self.records]
+        changed[1]["price"] = 13
+        version = get_catalog_version()
+        out, _ = self.sync(changed, "--delta")
+        self.assertIn("Inserted 0, updated 1, skipped 2 unchanged", out)
+        self.assertEqual(Product.objects.get(sku="CAM-S2").price, Decimal("13.00"))
+        self.assertEqual(Product.objects.get(sku="CAM-S1").updated_at, untouched)
+        self.assertGreater(get_catalog_version(), version)
+
+        version = get_catalog_version()
+        out, _ = self.sync(changed, "--delta")
+        self.assertIn("Inserted 0, updated 0, skipped 3 unchanged", out)
+        self.assertEqual(get_catalog_version(), version)
+
+        # Without --delta every record is written again.
+        self.assertIn("Inserted 0, updated 3, skipped 0 unchanged", self.sync(changed)[0])
+
+    def test_manual_edits_are_rewritten_by_the_next_delta(self):
+        self.sync(self.records)
+        product = Product.objects.get(sku="LOCK-S1")
+        product.price = 99
+        product.save()
+        self.assertIn("updated 1, skipped 2 unchanged", self.sync(self.records, "--delta")[0])
+        self.assertEqual(Product.objects.get(sku="LOCK-S1").price, Decimal("30.00"))
+
+    def test_deactivate_missing(self):
+        self.sync(self.records)
+        out, _ = self.sync(self.records[:2], "--delta", "--deactivate-missing", "--dry-run")
+        self.assertIn("Dry run: 0 new, 0 changed, 1 to deactivate", out)
+        self.assertTrue(Product.objects.get(sku="LOCK-S1").is_active)
+
+        out, _ = self.sync(self.records[:2], "--delta", "--deactivate-missing")
+        self.assertIn("skipped 2 unchanged, deactivated 1", out)
+        self.assertEqual(
+            dict(Product.objects.values_list("sku", "is_active")),
+            {"CAM-S1": True, "CAM-S2": True, "LOCK-S1": False},
+        )
+
+        # The SKU comes back unchanged; its cleared hash makes the delta reactivate it.
+        out, _ = self.sync(self.records, "--delta", "--deactivate-missing")
+        self.assertIn("updated 1, skipped 2 unchanged, deactivated 0", out)
+        self.assertTrue(Product.objects.get(sku="LOCK-S1").is_active)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BulkStatusTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name_ar="كاميرات")
+        self.camera = Product.objects.create(name_ar="كاميرا", sku="CAM-B1", price=5, stock=5, category=category)
+        self.lock = Product.objects.create(name_ar="قفل", sku="LOCK-B1", price=5, stock=5, category=category)
+        self.customer = Customer.objects.create(name="عميل", phone="0791000071", city="عمّان")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("staff", is_staff=True))
+
+    def order(self, order_status="new", **quantities):
+        order = StandardOrder.objects.create(customer=self.customer, status=order_status, total=0)
+        for attribute, qty in quantities.items():
+            StandardOrderItem.objects.create(order=order, product=getattr(self, attribute), qty=qty, unit_price=5)
+        return order
+
+    def bulk(self, ids, to_status):
+        response = self.client.post(
+            "/api/standard-orders/bulk-status/", {"ids": ids, "status": to_status}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def stock(self):
+        return [
+            (product.stock, product.reserved)
+            for product in Product.objects.filter(pk__in=[self.camera.pk, self.lock.pk]).order_by("sku")
+        ]
+
+    def test_confirm_rejects_only_the_short_orders(self):
+        first, short, other = self.order(camera=3), self.order(camera=3), self.order(lock=1, camera=1)
+        data = self.bulk([first.pk, short.pk, other.pk], "confirmed")
+        self.assertEqual((data["updated"], data["failed"]), (2, 1))
+        results = {result["id"]: result for result in data["results"]}
+        self.assertEqual(results[first.pk]["status"], "confirmed")
+        self.assertEqual((results[short.pk]["ok"], results[short.pk]["status"]), (False, "new"))
+        self.assertIn("المخزون غير كافٍ", results[short.pk]["detail"])
+        self.assertEqual(results[other.pk]["status"], "confirmed")
+        self.assertEqual(self.stock(), [(1, 0), (4, 0)])
+
+    def test_ineligible_and_missing_orders_are_reported(self):
+        new, confirmed = self.order(camera=1), self.order("confirmed", camera=1)
+        cancelled = self.order("cancelled", camera=1)
+        data = self.bulk([new.pk, confirmed.pk, cancelled.pk, 999999, new.pk], "ready_for_pickup")
+        self.assertEqual(
+            [(result["id"], result["ok"], result["status"]) for result in data["results"]],
+            [
+                (new.pk, False, "new"),
+                (confirmed.pk, True, "ready_for_pickup"),
+                (cancelled.pk, False, "cancelled"),
+                (999999, False, None),
+            ],
+        )
+        self.assertEqual(data["results"][3]["detail"], "الطلب غير موجود.")
+        self.assertEqual(self.stock(), [(5, 0), (5, 0)])
+
+    def test_cancel_restores_stock_and_releases_holds(self):
+        confirmed = self.order(camera=2)
+        confirmed.confirm()
+        held = self.order(lock=3)
+        reserve_stock(held, {self.lock.pk: 3})
+        already = self.order("cancelled", camera=4)
+        self.assertEqual(self.stock(), [(3, 0), (5, 3)])
+
+        data = self.bulk([confirmed.pk, held.pk, already.pk], "cancelled")
+        self.assertEqual((data["updated"], data["failed"]), (3, 0))
+        self.assertEqual(self.stock(), [(5, 0), (5, 0)])
+        self.assertEqual(set(StandardOrder.objects.values_list("status", flat=True)), {"cancelled"})
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        small = [self.order(camera=1, lock=1).pk for _ in range(2)]
+        large = [self.order(camera=1, lock=1).pk for _ in range(3)]
+        with CaptureQueriesContext(connection) as small_queries:
+            self.bulk(small, "confirmed")
+        with self.assertNumQueries(len(small_queries)):
+            self.bulk(large, "confirmed")
+        self.assertEqual(self.stock(), [(0, 0), (0, 0)])
+
+    def test_invalid_requests(self):
+        for payload in ({"ids": [], "status": "confirmed"}, {"ids": [1], "status": "new"}):
+            with self.subTest(payload=payload):
+                response = self.client.post("/api/standard-orders/bulk-status/", payload, format="json")
+                self.assertEqual(response.status_code, 400)
+        response = APIClient().post("/api/standard-orders/bulk-status/", {"ids": [1], "status": "completed"}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name_ar="كاميرات")
+        camera = Product.objects.create(name_ar="كاميرا", sku="CAM-X", price=Decimal("12.50"), stock=50, category=category)
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        hostile = Customer.objects.create(name='=HYPERLINK("http://evil.example","x")', phone="0791000001", city="عمّان")
+        irbid = Customer.objects.create(name="عميل إربد", phone="0791000002", city="إربد")
+        for customer, order_status, qty in ((hostile, "new", 2), (irbid, "confirmed", 3), (irbid, "new", 1)):
+            order = StandardOrder.objects.create(customer=customer, status=order_status, total=camera.price * qty)
+            StandardOrderItem.objects.create(order=order, product=camera, qty=qty, unit_price=camera.price)
+
+    def export(self, query: str):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        return client.get(f"/api/standard-orders/export/?{query}")
+
+    def csv_rows(self, query: str):
+        response = self.export(query)
+        self.assertEqual(response.status_code, 200)
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode("utf-8-sig"))))
+
+    def test_csv(self):
+        header, *rows = self.csv_rows("export_format=csv")
+        self.assertEqual(header[:4], ["رقم الطلب", "تاريخ الطلب", "الحالة", "اسم العميل"])
+        self.assertEqual(len(rows), 3)
+        names = {row[3] for row in rows}
+        self.assertIn('\'=HYPERLINK("http://evil.example","x")', names)
+        self.assertEqual({row[-1] for row in rows}, {"25.00", "37.50", "12.50"})
+
+    def test_xlsx(self):
+        response = self.export("export_format=xlsx")
+        self.assertEqual(response["Content-Type"], XLSX_CONTENT_TYPE)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        namespace = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        rows = sheet.findall("s:sheetData/s:row", namespace)
+        self.assertEqual(len(rows), 4)
+        texts = [node.text for node in sheet.iterfind(".//s:t", namespace)]
+        self.assertIn('\'=HYPERLINK("http://evil.example","x")', texts)
+        self.assertNotIn('=HYPERLINK("http://evil.example","x")', texts)
+        # Quantities stay numbers.
+        self.assertIn("3", [node.text for node in rows[2].iterfind("s:c/s:v", namespace)])
+
+    def test_filters_and_access(self):
+        _, *rows = self.csv_rows("status=new&city=إربد")
+        self.assertEqual([(row[2], row[5], row[10]) for row in rows], [("new", "إربد", "1")])
+        self.assertEqual(self.export("export_format=pdf").status_code, 400)
+        self.assertEqual(APIClient().get("/api/standard-orders/export/").status_code, 401)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QuoteQrCodeTests(TestCase):
+    pdf_url = "https://cdn.example.com/quotes/abc.pdf"
+
+    def quote_html(self) -> str:
+        customer = Customer.objects.create(name="عميل", phone="0791000004", city="عمّان")
+        order = CustomOrder.objects.create(customer=customer, requirement_summary="كاميرات للمستودع")
+        line = CustomOrderLine.objects.create(
+            custom_order=order, item_type="service", name="تركيب", qty=1, unit_price=Decimal("30.00")
+        )
+        return build_custom_order_quote_html(order, [line], self.pdf_url)
+
+    @override_settings(QUOTE_QR_FORMAT="svg")
+    def test_svg_is_inlined(self):
+        html = self.quote_html()
+        self.assertNotIn("data:image/png", html)
+        svg = html[html.index("<svg") : html.index("</svg>") + len("</svg>")]
+        path = ElementTree.fromstring(svg).find("{http://www.w3.org/2000/svg}path")
+        self.assertEqual(path.get("fill"), settings.STORE_INFO["theme_colors"]["primary"])
+
+    @override_settings(QUOTE_QR_FORMAT="png")
+    def test_png_is_embedded(self):
+        html = self.quote_html()
+        self.assertNotIn("<svg", html)
+        encoded = html.split("data:image/png;base64,", 1)[1].split('"', 1)[0]
+        self.assertTrue(base64.b64decode(encoded).startswith(b"\x89PNG"))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QuotePdfJobTests(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name="عميل", phone="0791000021", city="عمّان")
+        self.order = CustomOrder.objects.create(customer=customer, requirement_summary="نظام مراقبة")
+        self.line = CustomOrderLine.objects.create(
+            custom_order=self.order, item_type="service", name="تركيب", qty=1, unit_price=Decimal("30.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("staff", is_staff=True))
+
+    def generate(self):
+        response = self.client.post(f"/api/custom-orders/{self.order.pk}/generate-quote-pdf/")
+        self.assertEqual(response.status_code, 202, response.content)
+        return response.json()
+
+    def test_pending_job_is_reused_for_the_same_quote(self):
+        first = self.generate()
+        self.assertEqual(self.generate()["job_id"], first["job_id"])
+        self.line.qty = 2
+        self.line.save()
+        changed = self.generate()
+        self.assertNotEqual(changed["job_id"], first["job_id"])
+        self.assertEqual(QuotePdfJob.objects.get(pk=changed["job_id"]).status, "pending")
+
+    def test_running_job_is_not_reused(self):
+        running_id = self.generate()["job_id"]
+        self.assertEqual(claim_quote_pdf_jobs(10), [running_id])
+        self.assertNotEqual(self.generate()["job_id"], running_id)
+
+    def test_jobs_are_claimed_once(self):
+        first = QuotePdfJob.objects.create(custom_order=self.order)
+        second = QuotePdfJob.objects.create(custom_order=self.order)
+        self.assertEqual(claim_quote_pdf_jobs(1), [first.pk])
+        self.assertEqual(claim_quote_pdf_jobs(5), [second.pk])
+        self.assertEqual(claim_quote_pdf_jobs(5), [])
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), ("running", 1))
+        self.assertIsNotNone(first.started_at)
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale = QuotePdfJob.objects.create(custom_order=self.order)
+        fresh = QuotePdfJob.objects.create(custom_order=self.order)
+        claim_quote_pdf_jobs(5)
+        QuotePdfJob.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_quote_pdf_jobs(timedelta(minutes=10)), 1)
+        self.assertEqual(
+            dict(QuotePdfJob.objects.values_list("pk", "status")), {stale.pk: "pending", fresh.pk: "running"}
+        )
+
+    def test_status_endpoint_reports_the_outcome(self):
+        job = self.generate()
+        url = "https://cdn.example.com/quotes/abc.pdf"
+        with patch("shop.services.generate_custom_order_quote_pdf", return_value=url):
+            self.assertEqual(run_quote_pdf_job(job["job_id"]), "done")
+        data = self.client.get(job["status_url"]).json()
+        self.assertEqual((data["status"], data["quote_pdf_url"], data["error"]), ("done", url, ""))
+
+        failed = QuotePdfJob.objects.create(custom_order=self.order)
+        with patch("shop.services.generate_custom_order_quote_pdf", side_effect=OSError("storage down")):
+            self.assertEqual(run_quote_pdf_job(failed.pk), "failed")
+        data = self.client.get(f"/api/custom-orders/{self.order.pk}/quote-pdf-jobs/{failed.pk}/").json()
+        self.assertEqual((data["status"], data["error"]), ("failed", "storage down"))
+
+    def test_quote_needs_lines(self):
+        self.line.delete()
+        response = self.client.post(f"/api/custom-orders/{self.order.pk}/generate-quote-pdf/")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QuotePdfJob.objects.exists())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QuotePdfCacheTests(TestCase):
+    """Unchanged quotes reuse their stored PDF; gc_quote_pdfs keeps what orders still point at."""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        renderer_patch = patch("shop.services.get_quote_renderer")
+        self.renderer = renderer_patch.start().return_value
+        self.addCleanup(renderer_patch.stop)
+        self.renderer.render.return_value = b"%PDF-1.7"
+
+        customer = Customer.objects.create(name="عميل", phone="0791000031", city="عمّان")
+        self.order = CustomOrder.objects.create(customer=customer, requirement_summary="نظام مراقبة")
+        self.line = CustomOrderLine.objects.create(
+            custom_order=self.order, item_type="service", name="تركيب", qty=1, unit_price=Decimal("30.00")
+        )
+
+    def test_unchanged_quote_is_not_rendered_again(self):
+        url = generate_custom_order_quote_pdf(self.order)
+        self.order.refresh_from_db()
+        self.assertEqual(url, f"{settings.MEDIA_URL}quotes/{self.order.quote_pdf_fingerprint}.pdf")
+        self.assertEqual(generate_custom_order_quote_pdf(self.order), url)
+        self.assertEqual(self.renderer.render.call_count, 1)
+
+        self.line.unit_price = Decimal("35.00")
+        self.line.save()
+        changed_url = generate_custom_order_quote_pdf(self.order)
+        self.assertNotEqual(changed_url, url)
+        self.assertEqual(self.renderer.render.call_count, 2)
+
+    def test_same_inputs_share_the_stored_file(self):
+        url = generate_custom_order_quote_pdf(self.order)
+        # A lost reference is restored from the stored file without rendering.
+        CustomOrder.objects.filter(pk=self.order.pk).update(quote_pdf_url="", quote_pdf_fingerprint="")
+        self.order.refresh_from_db()
+        self.assertEqual(generate_custom_order_quote_pdf(self.order), url)
+        self.assertEqual(self.renderer.render.call_count, 1)
+
+    def test_gc_removes_only_old_unreferenced_files(self):
+        generate_custom_order_quote_pdf(self.order)
+        self.order.refresh_from_db()
+        referenced = f"quotes/{self.order.quote_pdf_fingerprint}.pdf"
+        orphan = default_storage.save("quotes/orphan.pdf", ContentFile(b"%PDF"))
+        recent = default_storage.save("quotes/recent.pdf", ContentFile(b"%PDF"))
+        two_days_ago = time.time() - 2 * 24 * 3600
+        for name in (referenced, orphan):
+            os.utime(default_storage.path(name), (two_days_ago, two_days_ago))
+
+        out = io.StringIO()
+        call_command("gc_quote_pdfs", "--dry-run", stdout=out)
+        self.assertIn("Would delete 1 quote PDFs, kept 2", out.getvalue())
+        self.assertTrue(default_storage.exists(orphan))
+
+        call_command("gc_quote_pdfs", stdout=io.StringIO())
+        self.assertEqual(
+            [default_storage.exists(name) for name in (referenced, orphan, recent)], [True, False, True]
+        )
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name_ar="كاميرات")
+        cls.camera, cls.lock, cls.router = (
+            Product.objects.create(name_ar=name, sku=sku, price=10, stock=stock, category=category)
+            for name, sku, stock in (("كاميرا", "CAM-R1", 2), ("قفل", "LOCK-R1", 50), ("راوتر", "NET-R1", 4))
+        )
+        amman = Customer.objects.create(name="عمّان", phone="0791000011", city="عمّان")
+        irbid = Customer.objects.create(name="إربد", phone="0791000012", city="إربد")
+        today = timezone.localdate()
+        cls.day1, cls.day2 = today - timedelta(days=2), today - timedelta(days=1)
+        lines = (
+            (amman, cls.day1, "new", [(cls.camera, 2, "50.00"), (cls.lock, 1, "20.00")]),
+            (amman, cls.day2, "confirmed", [(cls.camera, 1, "50.00")]),
+            (irbid, cls.day2, "new", [(cls.lock, 3, "20.00"), (cls.router, 2, "30.00")]),
+            (irbid, cls.day2, "cancelled", [(cls.router, 10, "30.00")]),
+        )
+        for customer, day, order_status, items in lines:
+            total = sum(Decimal(price) * qty for _, qty, price in items)
+            order = StandardOrder.objects.create(customer=customer, status=order_status, total=total)
+            created_at = timezone.make_aware(datetime.combine(day, dt_time(12)))
+            StandardOrder.objects.filter(pk=order.pk).update(created_at=created_at)
+            for product, qty, price in items:
+                StandardOrderItem.objects.create(order=order, product=product, qty=qty, unit_price=Decimal(price))
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+
+    def report(self, name: str, query: str = ""):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.get(f"/api/reports/{name}/?{query}")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_revenue_by_day(self):
+        rows = self.report("revenue-by-day")["results"]
+        self.assertEqual(
+            [(row["day"], row["city"], row["orders"], row["revenue"], row["running_revenue"]) for row in rows],
+            [
+                (str(self.day1), "عمّان", 1, "120.00", "120.00"),
+                (str(self.day2), "إربد", 1, "120.00", "120.00"),
+                (str(self.day2), "عمّان", 1, "50.00", "170.00"),
+            ],
+        )
+
+    def test_top_skus(self):
+        data = self.report("top-skus", f"date_from={self.day2}")
+        self.assertEqual(data["date_from"], str(self.day2))
+        rows = [(row["rank"], row["sku"], row["units"], row["revenue"], row["revenue_share"]) for row in data["results"]]
+        # LOCK-R1 and NET-R1 tie, so the next rank is 3; the cancelled order is left out.
+        self.assertEqual(
+            rows,
+            [
+                (1, "LOCK-R1", 3, "60.00", "35.29"),
+                (1, "NET-R1", 2, "60.00", "35.29"),
+                (3, "CAM-R1", 1, "50.00", "29.41"),
+            ],
+        )
+        self.assertEqual(len(self.report("top-skus", f"date_from={self.day2}&limit=1")["results"]), 1)
+
+    def test_python_fallback_matches_the_window_queries(self):
+        date_to = timezone.localdate()
+        expected = (reports.revenue_by_day(self.day1, date_to), reports.top_skus(self.day2, date_to))
+        with patch.object(reports, "GROUPED_WINDOW_VENDORS", frozenset()):
+            fallback = (reports.revenue_by_day(self.day1, date_to), reports.top_skus(self.day2, date_to))
+        self.assertEqual(fallback[0], expected[0])
+        self.assertEqual(len(fallback[1]), len(expected[1]))
+        for row, expected_row in zip(fallback[1], expected[1]):
+            self.assertAlmostEqual(row.pop("revenue_share"), expected_row.pop("revenue_share"))
+            self.assertEqual(row, expected_row)
+
+    def test_funnel_and_low_stock(self):
+        funnel = {row["status"]: row["count"] for row in self.report("custom-order-funnel")["results"]}
+        self.assertEqual(sum(funnel.values()), 0)
+        rows = self.report("low-stock", "threshold=4")["results"]
+        self.assertEqual([(row["sku"], row["available"]) for row in rows], [("CAM-R1", 2), ("NET-R1", 4)])
+
+    def test_bad_params_and_access(self):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        self.assertEqual(client.get("/api/reports/top-skus/?date_from=2024-13-01").status_code, 400)
+        self.assertEqual(client.get("/api/reports/top-skus/?date_from=2024-02-02&date_to=2024-02-01").status_code, 400)
+        self.assertEqual(APIClient().get("/api/reports/top-skus/").status_code, 401)
+
+    @override_settings(REPORTS_CACHE_SECONDS=0)
+    def test_zero_cache_seconds_disables_the_cache(self):
+        self.assertEqual(len(self.report("low-stock", "threshold=4")["results"]), 2)
+        Product.objects.filter(pk=self.lock.pk).update(stock=1)
+        self.assertEqual(len(self.report("low-stock", "threshold=4")["results"]), 3)
+
+
+@override_settings(CACHES=TEST_CACHES, PRODUCT_IMAGE_WIDTHS=(320, 640, 1280))
+class ProductImageUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media_root.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("staff", is_staff=True))
+
+    @staticmethod
+    def image_bytes(size, image_format="PNG", mode="RGBA", **options) -> bytes:
+        buffer = io.BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == "RGBA" else (200, 30, 30)).save(
+            buffer, format=image_format, **options
+        )
+        return buffer.getvalue()
+
+    def upload(self, content: bytes, name="photo.png"):
+        return self.client.post(
+            "/api/uploads/image/", {"image": SimpleUploadedFile(name, content)}, format="multipart"
+        )
+
+    def stored(self, url: str):
+        return Image.open(default_storage.path(url[len(settings.MEDIA_URL) :]))
+
+    def test_derivatives(self):
+        response = self.upload(self.image_bytes((800, 400)))
+        self.assertEqual(response.status_code, 201, response.content)
+        data = response.json()
+        self.assertEqual((data["width"], data["height"]), (800, 400))
+        # 1280 is wider than the source, so it collapses into 800.
+        self.assertEqual(
+            sorted((item["width"], item["format"]) for item in data["derivatives"]),
+            [(320, "jpeg"), (320, "webp"), (640, "jpeg"), (640, "webp"), (800, "jpeg"), (800, "webp")],
+        )
+        for item in data["derivatives"]:
+            with self.subTest(**item), self.stored(item["url"]) as image:
+                self.assertEqual(image.size, (item["width"], item["width"] // 2))
+                self.assertEqual(image.format, {"jpeg": "JPEG", "webp": "WEBP"}[item["format"]])
+        self.assertTrue(data["url"].endswith(f"/{data['hash']}/800.jpg"))
+        with self.stored(data["url"]) as image:
+            self.assertEqual(image.mode, "RGB")
+
+    def test_same_bytes_reuse_the_stored_derivatives(self):
+        content = self.image_bytes((500, 500))
+        first = self.upload(content).json()
+        with patch("shop.images._render_width") as render:
+            second = self.upload(content, name="copy.png")
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first)
+        render.assert_not_called()
+
+        # A lost derivative is the only one rendered again.
+        lost = next(item for item in first["derivatives"] if item["width"] == 320 and item["format"] == "webp")
+        default_storage.delete(lost["url"][len(settings.MEDIA_URL) :])
+        with patch("shop.images._render_width") as render:
+            self.assertEqual(self.upload(content).status_code, 201)
+        render.assert_called_once()
+        self.assertEqual((render.call_args.args[1], list(render.call_args.args[2])), (320, ["webp"]))
+
+    def test_exif_orientation_is_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        data = self.upload(self.image_bytes((600, 300), "JPEG", "RGB", exif=exif), name="photo.jpg").json()
+        self.assertEqual((data["width"], data["height"]), (300, 600))
+        with self.stored(data["url"]) as image:
+            self.assertEqual(image.size, (300, 600))
+
+    def test_rejected_uploads(self):
+        self.assertEqual(self.upload(b"not an image").status_code, 400)
+        with override_settings(PRODUCT_IMAGE_MAX_UPLOAD_BYTES=10):
+            self.assertEqual(self.upload(self.image_bytes((50, 50))).status_code, 400)
+        self.assertEqual(self.client.post("/api/uploads/image/", {}, format="multipart").status_code, 400)
+        response = APIClient().post(
+            "/api/uploads/image/", {"image": SimpleUploadedFile("photo.png", b"x")}, format="multipart"
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class BenchmarkGuardTests(SimpleTestCase):
+    @override_settings(DEBUG=False, BENCHMARK_DATABASE_NAME="")
+    def test_seeding_benchmarks_refuse_the_configured_database(self):
+        for command in ("benchmark_order_serialization", "benchmark_product_search"):
+            with self.subTest(command=command), self.assertRaises(CommandError):
+                call_command(command, stdout=io.StringIO())
+
+
+class MetricsAccessTests(SimpleTestCase):
+    @override_settings(DEBUG=False, METRICS_TOKEN="")
+    def test_hidden_without_a_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN="s3cret")
+    def test_token_required(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"http_request_duration_seconds", response.content)
+
+
+class _UnreadableFile(io.BytesIO):
+    def read(self, *args):
+        raise OSError("disk went away")
+
+
+@skipIf(mock_aws is None, "moto is not installed")
+@override_settings(AWS_S3_MULTIPART_THRESHOLD=5 * 1024 * 1024, AWS_S3_MULTIPART_CONCURRENCY=2)
+class PooledS3StorageTests(SimpleTestCase):
+    bucket = "strikeforce-test"
+
+    def setUp(self):
+        aws = mock_aws()
+        aws.start()
+        self.addCleanup(aws.stop)
+        # Shared clients are per process; drop any made outside the mock.
+        storage_module._clients.clear()
+        self.addCleanup(storage_module._clients.clear)
+        self.storage = PooledS3Storage(
+            bucket_name=self.bucket,
+            access_key="testing",
+            secret_key="testing",
+            region_name="us-east-1",
+            file_overwrite=True,
+        )
+        self.storage.client.create_bucket(Bucket=self.bucket)
+
+    def read(self, name: str) -> bytes:
+        return self.storage.client.get_object(Bucket=self.bucket, Key=name)["Body"].read()
+
+    def test_save_overwrites_in_place(self):
+        self.assertEqual(self.storage.save("quotes/a.pdf", ContentFile(b"first")), "quotes/a.pdf")
+        self.assertEqual(self.storage.save("quotes/a.pdf", ContentFile(b"second")), "quotes/a.pdf")
+        self.assertEqual(self.read("quotes/a.pdf"), b"second")
+
+    def test_exists_size_and_delete(self):
+        self.storage.save("images/x.webp", ContentFile(b"12345"))
+        self.assertTrue(self.storage.exists("images/x.webp"))
+        self.assertEqual(self.storage.size("images/x.webp"), 5)
+        self.storage.delete("images/x.webp")
+        self.assertFalse(self.storage.exists("images/x.webp"))
+        with self.assertRaises(FileNotFoundError):
+            self.storage.size("images/x.webp")
+
+    def test_url_is_presigned(self):
+        url = self.storage.url("quotes/a.pdf")
+        self.assertIn(self.bucket, url)
+        self.assertIn("quotes/a.pdf", url)
+        self.assertIn("Signature", url)
+
+    def test_large_files_upload_in_parts(self):
+        payload = b"x" * (11 * 1024 * 1024)
+        self.storage.save("exports/big.csv", ContentFile(payload))
+        head = self.storage.client.head_object(Bucket=self.bucket, Key="exports/big.csv")
+        self.assertEqual(head["ContentLength"], len(payload))
+        # Multipart ETags end in "-<part count>".
+        self.assertTrue(head["ETag"].strip('"').endswith("-3"))
+
+    def test_save_many_reports_each_file(self):
+        files = (
+            (name, content)
+            for name, content in [
+                ("batch/1.bin", b"one"),
+                ("batch/2.bin", ContentFile(b"two")),
+                ("batch/3.bin", File(_UnreadableFile(), name="3.bin")),
+            ]
+        )
+        results = save_many(files, storage=self.storage, max_workers=2)
+        self.assertEqual(results["batch/1.bin"], "batch/1.bin")
+        self.assertEqual(results["batch/2.bin"], "batch/2.bin")
+        self.assertIsInstance(results["batch/3.bin"], Exception)
+        self.assertEqual(self.read("batch/2.bin"), b"two")
+        self.assertFalse(self.storage.exists("batch/3.bin"))
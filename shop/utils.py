@@ -1,5 +1,5 @@
 import re
-from typing import Optional
+from typing import Any, Iterable, Optional
 
 from django.core.exceptions import ValidationError
 
@@ -25,3 +25,59 @@ def normalize_jordan_phone(value: Optional[str]) -> Optional[str]:
     if not PHONE_PATTERN.match(normalized):
         raise ValidationError("رقم الهاتف الأردني غير صالح")
     return normalized
+
+
+ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+ARABIC_LETTER_VARIANTS = str.maketrans(
+    {
+        "أ": "ا",
+        "إ": "ا",
+        "آ": "ا",
+        "ٱ": "ا",
+        "ى": "ي",
+        "ئ": "ي",
+        "ؤ": "و",
+        "ة": "ه",
+        "٠": "0",
+        "١": "1",
+        "٢": "2",
+        "٣": "3",
+        "٤": "4",
+        "٥": "5",
+        "٦": "6",
+        "٧": "7",
+        "٨": "8",
+        "٩": "9",
+    }
+)
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def normalize_arabic(value: Optional[str]) -> str:
+    """Fold Arabic spelling variants so alef/hamza forms and taa marbuta match each other."""
+    if not value:
+        return ""
+    text = ARABIC_DIACRITICS.sub("", str(value)).translate(ARABIC_LETTER_VARIANTS).lower()
+    return NON_WORD_PATTERN.sub(" ", text).strip()
+
+
+def _spec_values(specs: Any) -> Iterable[str]:
+    if isinstance(specs, dict):
+        for value in specs.values():
+            yield from _spec_values(value)
+    elif isinstance(specs, (list, tuple)):
+        for value in specs:
+            yield from _spec_values(value)
+    elif specs is not None:
+        yield str(specs)
+
+
+def build_product_search_document(
+    name_ar: str,
+    sku: str,
+    brand_name: Optional[str],
+    category_name: Optional[str],
+    specs: Any,
+) -> str:
+    parts = [name_ar, sku, brand_name or "", category_name or "", *_spec_values(specs)]
+    return " ".join(filter(None, (normalize_arabic(part) for part in parts)))
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from django.core.files.storage import default_storage
-from django.db.models import Prefetch
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.db.models import Count, Prefetch
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ParseError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 
 from .models import (
@@ -17,42 +20,131 @@ from .models import (
     Product,
     StandardOrder,
     StandardOrderStatus,
+    transition_standard_orders,
 )
 from .serializers import (
     BrandSerializer,
     CategorySerializer,
     CustomOrderLinesBulkSerializer,
+    CustomOrderFunnelRowSerializer,
     CustomOrderSerializer,
+    LowStockRowSerializer,
     ProductSerializer,
+    QuotePdfJobSerializer,
+    RevenueByDayRowSerializer,
+    StandardOrderBulkStatusSerializer,
+    StandardOrderListSerializer,
     StandardOrderSerializer,
     StandardOrderStatusSerializer,
+    TopSkuRowSerializer,
 )
-from .services import generate_custom_order_quote_pdf
+from .cache import CatalogCacheMixin, catalog_cache_stats
+from .categories import category_tree, descendant_ids
+from .conditional import ConditionalGetMixin
+from .db_routers import enable_catalog_replica_reads, reset_catalog_replica_reads
+from .exports import CUSTOM_ORDERS, EXPORT_FORMATS, PRODUCTS, STANDARD_ORDER_ITEMS, export_response
+from .images import ImageProcessingError, process_product_image
+from .facets import filter_by_specs, spec_facet_counts, spec_filters_from_params
+from .reports import (
+    DEFAULT_TOP_SKUS,
+    MAX_REPORT_ROWS,
+    cached_report,
+    custom_order_funnel,
+    low_stock_products,
+    report_int,
+    report_period,
+    revenue_by_day,
+    top_skus,
+)
+from .search import search_products
+from .services import enqueue_custom_order_quote_pdf
 
 
 class PublicReadMixin:
+    public_actions = frozenset({"list", "retrieve"})
+    admin_actions = frozenset({"export"})
+
     def get_permissions(self):
-        if self.action in {"list", "retrieve"}:
+        if self.action in self.public_actions:
             return [AllowAny()]
+        if self.action in self.admin_actions:
+            return [IsAdminUser()]
         return [IsAuthenticated()]
 
 
-class CategoryViewSet(PublicReadMixin, viewsets.ModelViewSet):
+class CatalogReplicaMixin:
+    """Serve anonymous public reads of a catalog viewset from ``CATALOG_READ_DATABASE``.
+
+    Responses that ``CatalogCacheMixin`` stores are still computed on the primary.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.public_actions and not request.user.is_authenticated:
+            self._replica_token = enable_catalog_replica_reads()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, "_replica_token", None)
+        if token is not None:
+            reset_catalog_replica_reads(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ExportMixin:
+    """``GET <list>/export/?export_format=csv|xlsx`` streams the filtered list for staff."""
+
+    export_spec = None
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        export_format = request.query_params.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"detail": "صيغة التصدير غير مدعومة"}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(self.export_spec, self.filter_queryset(self.get_queryset()), export_format)
+
+
+def filter_orders(queryset, query_params):
+    status_filter = query_params.get("status")
+    city_filter = query_params.get("city")
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    if city_filter:
+        queryset = queryset.filter(customer__city__iexact=city_filter)
+    return queryset
+
+
+class CategoryViewSet(
+    CatalogReplicaMixin, CatalogCacheMixin, ConditionalGetMixin, PublicReadMixin, viewsets.ModelViewSet
+):
     serializer_class = CategorySerializer
     queryset = Category.objects.all()
+    public_actions = PublicReadMixin.public_actions | {"tree"}
+
+    @action(detail=False, methods=["get"], url_path="tree")
+    def tree(self, request):
+        return Response(category_tree())
 
 
-class BrandViewSet(PublicReadMixin, viewsets.ModelViewSet):
+class BrandViewSet(
+    CatalogReplicaMixin, CatalogCacheMixin, ConditionalGetMixin, PublicReadMixin, viewsets.ModelViewSet
+):
     serializer_class = BrandSerializer
     queryset = Brand.objects.all()
 
 
-class ProductViewSet(PublicReadMixin, viewsets.ModelViewSet):
+class ProductViewSet(
+    CatalogReplicaMixin, CatalogCacheMixin, ConditionalGetMixin, ExportMixin, PublicReadMixin, viewsets.ModelViewSet
+):
     serializer_class = ProductSerializer
+    export_spec = PRODUCTS
+    keyset_ordering = ("name_ar", "id")
+    public_actions = PublicReadMixin.public_actions | {"facets"}
+    cached_actions = CatalogCacheMixin.cached_actions | {"facets"}
 
     def get_queryset(self):
         queryset = Product.objects.all()
-        if self.action in {"list"} or (self.action == "retrieve" and not self.request.user.is_authenticated):
+        if self.action in {"list", "facets"} or (self.action == "retrieve" and not self.request.user.is_authenticated):
             queryset = queryset.filter(is_active=True)
         sku = self.request.query_params.get("sku")
         if sku:
@@ -60,11 +152,110 @@ class ProductViewSet(PublicReadMixin, viewsets.ModelViewSet):
         category = self.request.query_params.get("category")
         if category:
             queryset = queryset.filter(category_id=category)
+        category_tree_id = self.request.query_params.get("category_tree")
+        if category_tree_id:
+            if not category_tree_id.isdigit():
+                raise ParseError("قيمة category_tree غير صالحة")
+            queryset = queryset.filter(category_id__in=descendant_ids(int(category_tree_id)))
+        queryset = filter_by_specs(queryset, spec_filters_from_params(self.request.query_params))
         q = self.request.query_params.get("q")
         if q:
-            queryset = queryset.filter(name_ar__icontains=q)
+            queryset = search_products(queryset, q)
         return queryset.select_related("category", "brand")
 
+    @action(detail=False, methods=["get"], url_path="facets")
+    def facets(self, request):
+        return self.cached_response(self._facets, request)
+
+    def _facets(self, request):
+        keys = [key for key in request.query_params.get("facet_keys", "").split(",") if key]
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response({"facets": spec_facet_counts(queryset, keys)})
+
+
+class CatalogCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(catalog_cache_stats())
+
+
+class ReportsRootView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        names = ["revenue-by-day", "top-skus", "custom-order-funnel", "low-stock"]
+        return Response({name: reverse(f"report-{name}", request=request) for name in names})
+
+
+class ReportView(APIView):
+    """Staff-only report.
+
+    Subclasses define ``report(query_params)``, returning ``(cache params, rows callable)``.
+    """
+
+    permission_classes = [IsAdminUser]
+    report_name = ""
+    row_serializer_class = None
+
+    def get(self, request, *args, **kwargs):
+        params, compute = self.report(request.query_params)
+        rows = cached_report(
+            self.report_name,
+            params,
+            lambda: list(self.row_serializer_class(compute(), many=True).data),
+        )
+        return Response({**self.describe(params), "results": rows})
+
+    def describe(self, params) -> dict:
+        return {}
+
+
+class PeriodReportView(ReportView):
+    def describe(self, params) -> dict:
+        return {"date_from": params[0], "date_to": params[1]}
+
+
+class RevenueByDayReportView(PeriodReportView):
+    report_name = "revenue-by-day"
+    row_serializer_class = RevenueByDayRowSerializer
+
+    def report(self, query_params):
+        date_from, date_to = report_period(query_params)
+        return (date_from, date_to), lambda: revenue_by_day(date_from, date_to)
+
+
+class TopSkusReportView(PeriodReportView):
+    report_name = "top-skus"
+    row_serializer_class = TopSkuRowSerializer
+
+    def report(self, query_params):
+        date_from, date_to = report_period(query_params)
+        limit = report_int(query_params, "limit", DEFAULT_TOP_SKUS, minimum=1)
+        return (date_from, date_to, limit), lambda: top_skus(date_from, date_to, limit)
+
+
+class CustomOrderFunnelReportView(PeriodReportView):
+    report_name = "custom-order-funnel"
+    row_serializer_class = CustomOrderFunnelRowSerializer
+
+    def report(self, query_params):
+        date_from, date_to = report_period(query_params)
+        return (date_from, date_to), lambda: custom_order_funnel(date_from, date_to)
+
+
+class LowStockReportView(ReportView):
+    report_name = "low-stock"
+    row_serializer_class = LowStockRowSerializer
+
+    def report(self, query_params):
+        threshold = report_int(query_params, "threshold", settings.LOW_STOCK_THRESHOLD, maximum=1_000_000)
+        limit = report_int(query_params, "limit", MAX_REPORT_ROWS, minimum=1)
+        return (threshold, limit), lambda: low_stock_products(threshold, limit)
+
+    def describe(self, params) -> dict:
+        return {"threshold": params[0]}
+
 
 class ProductImageUploadView(APIView):
     permission_classes = [IsAuthenticated]
@@ -73,30 +264,42 @@ class ProductImageUploadView(APIView):
         file_obj = request.FILES.get("image")
         if not file_obj:
             return Response({"detail": "يرجى رفع ملف صورة"}, status=status.HTTP_400_BAD_REQUEST)
-        path = default_storage.save(f"products/{file_obj.name}", file_obj)
-        url = default_storage.url(path)
-        return Response({"url": url})
+        try:
+            processed = process_product_image(file_obj)
+        except ImageProcessingError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(processed.as_dict(), status=status.HTTP_201_CREATED if processed.created else status.HTTP_200_OK)
 
 
-class StandardOrderViewSet(PublicReadMixin, viewsets.ModelViewSet):
+class StandardOrderViewSet(ConditionalGetMixin, ExportMixin, PublicReadMixin, viewsets.ModelViewSet):
     serializer_class = StandardOrderSerializer
+    export_spec = STANDARD_ORDER_ITEMS
+    keyset_ordering = ("-created_at", "id")
 
     def get_permissions(self):
         if self.action in {"create"}:
             return [AllowAny()]
         return super().get_permissions()
 
+    def get_serializer_class(self):
+        if self._lean_list():
+            return StandardOrderListSerializer
+        return super().get_serializer_class()
+
     def get_queryset(self):
-        qs = (
-            StandardOrder.objects.all()
-            .select_related("customer")
-            .prefetch_related("items__product")
-            .order_by("-created_at")
-        )
-        status_filter = self.request.query_params.get("status")
-        if status_filter:
-            qs = qs.filter(status=status_filter)
-        return qs
+        qs = StandardOrder.objects.all().select_related("customer").order_by("-created_at")
+        if self._lean_list():
+            qs = qs.only(
+                "id", "status", "total", "currency", "created_at", "updated_at", "customer__name", "customer__phone"
+            ).annotate(item_count=Count("items"))
+        else:
+            qs = qs.prefetch_related("items__product")
+        return filter_orders(qs, self.request.query_params)
+
+    def _lean_list(self) -> bool:
+        """Lists use the compact row unless the client asks for ``?expand=items``."""
+        expand = {field for field in self.request.query_params.get("expand", "").split(",") if field}
+        return self.action == "list" and "items" not in expand
 
     @action(detail=True, methods=["patch"], url_path="status", serializer_class=StandardOrderStatusSerializer)
     def set_status(self, request, pk=None):
@@ -120,9 +323,24 @@ class StandardOrderViewSet(PublicReadMixin, viewsets.ModelViewSet):
         order.refresh_from_db()
         return Response(StandardOrderSerializer(order).data)
 
+    @action(detail=False, methods=["post"], url_path="bulk-status", serializer_class=StandardOrderBulkStatusSerializer)
+    def bulk_status(self, request):
+        serializer = StandardOrderBulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        outcome = transition_standard_orders(serializer.validated_data["ids"], serializer.validated_data["status"])
+        statuses = dict(StandardOrder.objects.filter(pk__in=outcome).values_list("pk", "status"))
+        results = [
+            {"id": pk, "ok": error is None, "status": statuses.get(pk), "detail": error or ""}
+            for pk, error in outcome.items()
+        ]
+        failed = sum(1 for result in results if not result["ok"])
+        return Response({"updated": len(results) - failed, "failed": failed, "results": results})
+
 
-class CustomOrderViewSet(PublicReadMixin, viewsets.ModelViewSet):
+class CustomOrderViewSet(ConditionalGetMixin, ExportMixin, PublicReadMixin, viewsets.ModelViewSet):
     serializer_class = CustomOrderSerializer
+    export_spec = CUSTOM_ORDERS
+    keyset_ordering = ("-created_at", "id")
 
     def get_permissions(self):
         if self.action in {"create"}:
@@ -136,13 +354,7 @@ class CustomOrderViewSet(PublicReadMixin, viewsets.ModelViewSet):
             .prefetch_related(Prefetch("lines"))
             .order_by("-created_at")
         )
-        status_filter = self.request.query_params.get("status")
-        city_filter = self.request.query_params.get("city")
-        if status_filter:
-            qs = qs.filter(status=status_filter)
-        if city_filter:
-            qs = qs.filter(customer__city__iexact=city_filter)
-        return qs
+        return filter_orders(qs, self.request.query_params)
 
     @action(detail=True, methods=["post"], url_path="schedule-survey")
     def schedule_survey(self, request, pk=None):
@@ -181,9 +393,27 @@ class CustomOrderViewSet(PublicReadMixin, viewsets.ModelViewSet):
             custom_order.require_lines_for_quote()
         except DjangoValidationError as exc:
             return Response({"detail": exc.message}, status=status.HTTP_400_BAD_REQUEST)
-        url = generate_custom_order_quote_pdf(custom_order)
-        custom_order.refresh_from_db()
-        return Response({"quote_pdf_url": url})
+        job = enqueue_custom_order_quote_pdf(custom_order)
+        status_url = reverse(
+            "custom-order-quote-pdf-job",
+            kwargs={"pk": custom_order.pk, "job_id": job.pk},
+            request=request,
+        )
+        return Response(
+            {"job_id": job.pk, "status": job.status, "status_url": status_url},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+    @action(
+        detail=True,
+        methods=["get"],
+        url_path=r"quote-pdf-jobs/(?P<job_id>[0-9]+)",
+        url_name="quote-pdf-job",
+    )
+    def quote_pdf_job(self, request, pk=None, job_id=None):
+        custom_order = self.get_object()
+        job = get_object_or_404(custom_order.quote_pdf_jobs.all(), pk=job_id)
+        return Response(QuotePdfJobSerializer(job).data)
 
     @action(detail=True, methods=["post"], url_path="approve")
     def approve(self, request, pk=None):
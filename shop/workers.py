@@ -0,0 +1,24 @@
+"""Entry points for process pools.
+
+Pool processes are spawned, so this module must stay importable before Django
+is configured; anything touching models is imported inside the functions.
+"""
+from __future__ import annotations
+
+
+def init_worker() -> None:
+    import django
+
+    django.setup()
+
+
+def run_quote_pdf_job(job_id: int) -> str:
+    from .services import run_quote_pdf_job as run_job
+
+    return run_job(job_id)
+
+
+def render_quote_pdf(html_string: str) -> bytes:
+    from .services import get_quote_renderer
+
+    return get_quote_renderer().render(html_string)
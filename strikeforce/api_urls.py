@@ -1,7 +1,9 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 from shop import views as shop_views
+from shop.async_views import catalog_read_urls
 
 router = DefaultRouter()
 router.register(r"products", shop_views.ProductViewSet, basename="product")
@@ -10,7 +12,18 @@ router.register(r"brands", shop_views.BrandViewSet, basename="brand")
 router.register(r"standard-orders", shop_views.StandardOrderViewSet, basename="standard-order")
 router.register(r"custom-orders", shop_views.CustomOrderViewSet, basename="custom-order")
 
-urlpatterns = [
+urlpatterns = catalog_read_urls(router) if settings.ASYNC_CATALOG_READS else []
+urlpatterns += [
     path("", include(router.urls)),
     path("uploads/image/", shop_views.ProductImageUploadView.as_view(), name="product-image-upload"),
+    path("reports/", shop_views.ReportsRootView.as_view(), name="reports"),
+    path("reports/revenue-by-day/", shop_views.RevenueByDayReportView.as_view(), name="report-revenue-by-day"),
+    path("reports/top-skus/", shop_views.TopSkusReportView.as_view(), name="report-top-skus"),
+    path(
+        "reports/custom-order-funnel/",
+        shop_views.CustomOrderFunnelReportView.as_view(),
+        name="report-custom-order-funnel",
+    ),
+    path("reports/low-stock/", shop_views.LowStockReportView.as_view(), name="report-low-stock"),
+    path("catalog-cache/stats/", shop_views.CatalogCacheStatsView.as_view(), name="catalog-cache-stats"),
 ]
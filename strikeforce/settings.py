@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so its latency covers the whole middleware stack.
+    "shop.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -63,10 +65,35 @@ WSGI_APPLICATION = "strikeforce.wsgi.application"
 ASGI_APPLICATION = "strikeforce.asgi.application"
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
+# Optional read replica; anonymous catalog reads are routed to it (shop.db_routers).
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+# Persistent connections are per thread; under ASGI each request runs its sync code in a
+# fresh thread, so gunicorn.conf.py sets this to 0 for the ASGI workers. Pooled
+# PostgreSQL connections ignore it.
+DB_CONN_MAX_AGE = int(os.environ.get("DB_CONN_MAX_AGE", 600))
+# psycopg 3 connection pool per process and alias; size it so that
+# workers x DB_POOL_MAX_SIZE stays below the server's max_connections.
+DB_POOL = os.environ.get("DB_POOL", "1") == "1"
+DB_POOL_OPTIONS = {
+    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+    "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+    "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+    "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+    "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", 3600)),
+}
+
+
+def database_config(url):
+    config = dj_database_url.parse(url, conn_max_age=DB_CONN_MAX_AGE, ssl_require=False)
+    if DB_POOL and config["ENGINE"] == "django.db.backends.postgresql":
+        # Django refuses persistent connections on a pooled alias.
+        config["CONN_MAX_AGE"] = 0
+        config["OPTIONS"] = {**config.get("OPTIONS", {}), "pool": dict(DB_POOL_OPTIONS)}
+    return config
+
+
 if DATABASE_URL:
-    DATABASES = {
-        "default": dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=False)
-    }
+    DATABASES = {"default": database_config(DATABASE_URL)}
 else:
     DATABASES = {
         "default": {
@@ -74,6 +101,10 @@ else:
             "NAME": BASE_DIR / "db.sqlite3",
         }
     }
+if DATABASE_REPLICA_URL:
+    DATABASES["replica"] = {**database_config(DATABASE_REPLICA_URL), "TEST": {"MIRROR": "default"}}
+CATALOG_READ_DATABASE = "replica" if DATABASE_REPLICA_URL else None
+DATABASE_ROUTERS = ["shop.db_routers.CatalogReplicaRouter"]
 
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -111,7 +142,7 @@ REST_FRAMEWORK = {
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
     ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "shop.pagination.OptInKeysetPagination",
     "PAGE_SIZE": 20,
 }
 
@@ -134,6 +165,7 @@ CORS_ALLOWED_ORIGINS = [
     origin.strip() for origin in os.environ.get("CORS_ALLOWED_ORIGINS", "").split(",") if origin.strip()
 ]
 CORS_ALLOW_ALL_ORIGINS = not CORS_ALLOWED_ORIGINS
+CORS_EXPOSE_HEADERS = ["ETag", "Last-Modified"]
 
 CSRF_TRUSTED_ORIGINS = [
     origin.strip() for origin in os.environ.get("CSRF_TRUSTED_ORIGINS", "").split(",") if origin.strip()
@@ -151,9 +183,14 @@ STORE_INFO = {
     },
 }
 
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
 S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
 if S3_BUCKET_NAME:
-    DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
+    STORAGES["default"] = {"BACKEND": "shop.storage.PooledS3Storage"}
     AWS_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY")
     AWS_STORAGE_BUCKET_NAME = S3_BUCKET_NAME
@@ -161,8 +198,66 @@ if S3_BUCKET_NAME:
     AWS_S3_REGION_NAME = os.environ.get("S3_REGION_NAME")
     AWS_QUERYSTRING_AUTH = False
     AWS_DEFAULT_ACL = None
-    AWS_S3_FILE_OVERWRITE = False
+    # Quote PDFs and product images are stored under content hashes, so a save
+    # can overwrite in one PUT instead of probing for a free name first.
+    AWS_S3_FILE_OVERWRITE = True
+
+# One boto3 client per process serves every thread; size its pool for the
+# concurrent batch uploads plus multipart parts in flight.
+AWS_S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 32))
+AWS_S3_MULTIPART_THRESHOLD = int(os.environ.get("S3_MULTIPART_THRESHOLD", 8 * 1024 * 1024))
+AWS_S3_MULTIPART_CONCURRENCY = int(os.environ.get("S3_MULTIPART_CONCURRENCY", 4))
+STORAGE_UPLOAD_WORKERS = int(os.environ.get("STORAGE_UPLOAD_WORKERS", 8))
 
 PDF_STORAGE_FOLDER = "quotes"
 
+# Uploaded product photos are stored as derivatives under their content hash.
+PRODUCT_IMAGE_FOLDER = "products"
+PRODUCT_IMAGE_WIDTHS = tuple(int(width) for width in os.environ.get("PRODUCT_IMAGE_WIDTHS", "320,640,1280").split(","))
+PRODUCT_IMAGE_FORMATS = ("webp", "jpeg")
+PRODUCT_IMAGE_QUALITY = int(os.environ.get("PRODUCT_IMAGE_QUALITY", 82))
+PRODUCT_IMAGE_WORKERS = int(os.environ.get("PRODUCT_IMAGE_WORKERS", 4))
+PRODUCT_IMAGE_MAX_UPLOAD_BYTES = int(os.environ.get("PRODUCT_IMAGE_MAX_UPLOAD_BYTES", 25 * 1024 * 1024))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "strikeforce",
+    },
+    "catalog": {
+        "BACKEND": os.environ.get("CATALOG_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("CATALOG_CACHE_LOCATION", str(BASE_DIR / ".cache" / "catalog")),
+    },
+}
+
+# Anonymous catalog list/retrieve responses; invalidated by bumping a version key on catalog writes.
+CATALOG_CACHE_ALIAS = "catalog"
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", 600))
+# Request metrics (shop.metrics): share of requests whose queries and serializer time are measured,
+# whether responses carry a Server-Timing header (it shows query counts and DB time to every client,
+# so it is off unless DEBUG), and the bearer token /metrics requires. Without a token /metrics is
+# only served with DEBUG on.
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", 0.1))
+METRICS_SERVER_TIMING = os.environ.get("METRICS_SERVER_TIMING", "1" if DEBUG else "0") == "1"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Answer anonymous catalog cache hits from the async views in shop.async_views (ASGI only).
+# Off until loadtest_catalog shows a gain over the sync views.
+ASYNC_CATALOG_READS = os.environ.get("ASYNC_CATALOG_READS", "0") == "1"
+
+# "png" embeds a base64 image in the quote; "svg" inlines the QR as vector markup.
+QUOTE_QR_FORMAT = os.environ.get("QUOTE_QR_FORMAT", "png")
+
+# Stock held for a NEW standard order before release_expired_reservations frees it.
+STOCK_RESERVATION_TTL_MINUTES = int(os.environ.get("STOCK_RESERVATION_TTL_MINUTES", 30))
+
+# /api/reports/ results are recomputed at most once per bucket of this many seconds.
+REPORTS_CACHE_ALIAS = os.environ.get("REPORTS_CACHE_ALIAS", "default")
+REPORTS_CACHE_SECONDS = int(os.environ.get("REPORTS_CACHE_SECONDS", 300))
+LOW_STOCK_THRESHOLD = int(os.environ.get("LOW_STOCK_THRESHOLD", 5))
+
+# The benchmark_* commands that seed and delete rows only run with DEBUG on or
+# when the default database has this name.
+BENCHMARK_DATABASE_NAME = os.environ.get("BENCHMARK_DATABASE_NAME", "")
+
 WEASYPRINT_BASEURL = str(BASE_DIR / "staticfiles")
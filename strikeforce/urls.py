@@ -4,11 +4,14 @@ from django.contrib import admin
 from django.urls import include, path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from shop.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/auth/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("api/", include("strikeforce.api_urls")),
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 if settings.DEBUG: